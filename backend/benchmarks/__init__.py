@@ -0,0 +1,5 @@
+"""
+Standalone benchmarks, run from the backend directory, eg
+`python -m benchmarks.reorder`
+Each benchmark runs against a throwaway test database
+"""
@@ -0,0 +1,126 @@
+"""
+Times cross-tabulation and filtered results for growing numbers of responses, to check
+that they are aggregated in the database without loading answers into Python
+With NumPy installed, also times both from a snapshot of the closed survey
+"""
+import random
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from importlib.util import find_spec
+
+from .utils import create_user, measure, setup_django, test_database
+
+SIZES = (10_000, 100_000, 250_000)
+QUESTIONS = 3
+OPTIONS = 4
+
+
+def seed(survey, size, questions):
+    from surveys.models import ChoiceAnswer, SurveyParticipation
+
+    rng = random.Random(size)
+    participations = SurveyParticipation.objects.bulk_create(
+        (
+            SurveyParticipation(survey=survey, user_session=uuid.uuid4().hex, is_complete=True)
+            for _ in range(size)
+        ),
+        batch_size=1000,
+    )
+    ChoiceAnswer.objects.bulk_create(
+        (
+            ChoiceAnswer(
+                survey_participation=participation,
+                question=question,
+                answer_option=rng.choice(options),
+            )
+            for participation in participations
+            for question, options in questions
+        ),
+        batch_size=1000,
+    )
+
+
+def main():
+    setup_django()
+    snapshots = tempfile.TemporaryDirectory()
+    with test_database(), snapshots:
+        from django.db import connection
+        from django.test import override_settings
+        from django.utils import timezone
+
+        from surveys import analytics
+        from surveys.models import AnswerOption, Question, Survey, SurveySection
+        from surveys.snapshots import load_snapshot, write_snapshot
+
+        use_snapshots = find_spec("numpy") is not None
+        override_settings(SURVEYS_SNAPSHOT_DIR=snapshots.name).enable()
+
+        creator = create_user()
+        header = (
+            f"{'responses':>10} {'crosstab s':>11} {'filtered s':>11} "
+            f"{'results s':>10} {'queries':>8} {'seed s':>7}"
+        )
+        if use_snapshots:
+            header += f" {'snapshot s':>11} {'snap crosstab s':>16} {'snap results s':>15}"
+        print(header)
+        for size in SIZES:
+            survey = Survey.objects.create(creator=creator)
+            section = SurveySection.objects.create(survey=survey, name="Section")
+            questions = []
+            for q in range(QUESTIONS):
+                question = Question.objects.create(
+                    section=section,
+                    question=f"Question {q}",
+                    question_type=Question.QuestionType.MULTIPLE_CHOICE_SINGLE,
+                )
+                options = [
+                    AnswerOption.objects.create(question=question, text=f"Option {a}")
+                    for a in range(OPTIONS)
+                ]
+                questions.append((question, options))
+            start = time.perf_counter()
+            seed(survey, size, questions)
+            seeded = time.perf_counter() - start
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            survey = Survey.objects.with_tree().get(pk=survey.pk)
+            (rows, _), (columns, _), (other, other_options) = questions
+            with measure() as plain:
+                analytics.crosstab(survey, rows.id, columns.id)
+            with measure() as filtered:
+                analytics.crosstab(survey, rows.id, columns.id, [other_options[0].id])
+            with measure() as results:
+                analytics.filtered_results(survey, [other_options[0].id])
+            line = (
+                f"{size:>10} {plain['seconds']:>11.2f} {filtered['seconds']:>11.2f} "
+                f"{results['seconds']:>10.2f} "
+                f"{plain['queries'] + filtered['queries'] + results['queries']:>8} "
+                f"{seeded:>7.0f}"
+            )
+            if use_snapshots:
+                Survey.objects.filter(pk=survey.pk).update(
+                    is_active=False,
+                    is_open=False,
+                    survey_end_date=timezone.now() - timedelta(days=1),
+                )
+                survey = Survey.objects.with_tree().get(pk=survey.pk)
+                with measure() as written:
+                    write_snapshot(survey)
+                with measure() as snapshot_crosstab:
+                    load_snapshot(survey).crosstab(
+                        survey, rows.id, columns.id, [other_options[0].id]
+                    )
+                with measure() as snapshot_results:
+                    load_snapshot(survey).results(survey, [other_options[0].id])
+                line += (
+                    f" {written['seconds']:>11.2f} {snapshot_crosstab['seconds']:>16.3f}"
+                    f" {snapshot_results['seconds']:>15.3f}"
+                )
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
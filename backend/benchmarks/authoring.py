@@ -0,0 +1,73 @@
+"""
+Creates a 100-question survey one object at a time through the ordered managers,
+and as one document through `create_survey_from_document`
+"""
+from .utils import create_user, measure, setup_django, test_database
+
+SECTIONS = 5
+QUESTIONS = 20
+OPTIONS = 4
+
+
+def document():
+    return {
+        "title": "Benchmark",
+        "sections": [
+            {
+                "name": f"Section {s}",
+                "subheading": "",
+                "questions": [
+                    {
+                        "question": f"Question {q}",
+                        "subheading": "",
+                        "is_required": True,
+                        "question_type": "MCS",
+                        "dependency_question": None,
+                        "dependency_answer_option": None,
+                        "answer_options": [{"text": f"Option {a}"} for a in range(OPTIONS)],
+                    }
+                    for q in range(QUESTIONS)
+                ],
+            }
+            for s in range(SECTIONS)
+        ],
+    }
+
+
+def create_one_by_one(creator, data):
+    from surveys.models import AnswerOption, Question, Survey, SurveySection
+
+    survey = Survey.objects.create(creator=creator, title=data["title"])
+    for section_data in data["sections"]:
+        section = SurveySection.objects.create(
+            survey=survey, name=section_data["name"], subheading=""
+        )
+        for question_data in section_data["questions"]:
+            question = Question.objects.create(
+                section=section,
+                question=question_data["question"],
+                subheading="",
+                question_type=question_data["question_type"],
+            )
+            for option_data in question_data["answer_options"]:
+                AnswerOption.objects.create(question=question, text=option_data["text"])
+
+
+def main():
+    setup_django()
+    with test_database():
+        from surveys.authoring import create_survey_from_document
+
+        creator = create_user()
+        print(f"{'method':<14} {'queries':>8} {'ms':>8}")
+        for name, create in (
+            ("one by one", create_one_by_one),
+            ("document", create_survey_from_document),
+        ):
+            with measure() as result:
+                create(creator, document())
+            print(f"{name:<14} {result['queries']:>8} {result['seconds'] * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
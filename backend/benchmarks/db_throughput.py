@@ -0,0 +1,142 @@
+"""
+Compares request throughput with different database connection settings
+Requests go through Django's WSGI handler in-process, from several threads, so
+connections are opened and closed exactly as under a threaded WSGI server, without
+measuring the HTTP layer. Mostly survey reads, every tenth request a submission
+
+Runs against a throwaway SQLite file by default. With DATABASE_ENGINE=postgres it
+uses the configured database instead, and skips the SQLite PRAGMA setups
+"""
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .utils import create_user, setup_django
+
+THREADS = 8
+REQUESTS_PER_THREAD = 250
+SUBMIT_EVERY = 10
+
+SETUPS = [
+    # name, CONN_MAX_AGE, CONN_HEALTH_CHECKS, SQLite PRAGMAs
+    ("close after each request", 0, False, False),
+    ("persistent", 60, False, False),
+    ("persistent + health checks", 60, True, False),
+    ("persistent + PRAGMAs", 60, True, True),
+]
+
+
+def seed():
+    from django.core.management import call_command
+
+    from surveys.models import AnswerOption, Question, Survey, SurveySection
+
+    call_command("migrate", verbosity=0)
+    survey = Survey.objects.create(creator=create_user(), limit_one_response_per_user=False)
+    section = SurveySection.objects.create(survey=survey, name="Section")
+    questions = Question.objects.bulk_create(
+        Question(
+            section=section,
+            question=f"Question {q}",
+            question_type=Question.QuestionType.MULTIPLE_CHOICE_SINGLE,
+            order=q + 1,
+        )
+        for q in range(10)
+    )
+    options = AnswerOption.objects.bulk_create(
+        AnswerOption(question=question, text="Option", order=1) for question in questions
+    )
+    payload = {
+        "answers": [
+            {"question": str(option.question_id), "answer_option": str(option.id)}
+            for option in options
+        ]
+    }
+    return survey, json.dumps(payload)
+
+
+def configure(max_age, health_checks, pragmas):
+    from django.db import connections
+
+    from core.db import SQLITE_PRAGMAS
+
+    connections.close_all()
+    database = connections.settings["default"]
+    database["CONN_MAX_AGE"] = max_age
+    database["CONN_HEALTH_CHECKS"] = health_checks
+    if database["ENGINE"] == "core.backends.sqlite3":
+        database["OPTIONS"]["pragmas"] = dict(SQLITE_PRAGMAS) if pragmas else {}
+        # journal_mode=WAL sticks to the file, so switch back explicitly
+        database["OPTIONS"]["pragmas"].setdefault("journal_mode", "DELETE")
+
+
+def run(survey, body):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+    from django.test import RequestFactory
+
+    handler = WSGIHandler()
+    factory = RequestFactory(HTTP_HOST="localhost")
+    detail = f"/api/form/{survey.pk}/"
+    submit = f"/api/form/{survey.pk}/submit/"
+    failures = []
+
+    def client():
+        for i in range(1, REQUESTS_PER_THREAD + 1):
+            if i % SUBMIT_EVERY == 0:
+                request = factory.post(submit, body, content_type="application/json")
+                expected = "201"
+            else:
+                request = factory.get(detail)
+                expected = "200"
+            statuses = []
+            response = handler(request.environ, lambda status, headers: statuses.append(status))
+            b"".join(response)
+            response.close()
+            if not statuses[0].startswith(expected):
+                failures.append(statuses[0])
+        connections.close_all()
+
+    threads = [threading.Thread(target=client) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    return THREADS * REQUESTS_PER_THREAD / seconds, len(failures)
+
+
+def main():
+    directory = tempfile.TemporaryDirectory()
+    os.environ.setdefault("DATABASE_NAME", str(Path(directory.name) / "bench.sqlite3"))
+    setup_django()
+    from django.db import connection
+
+    sqlite = connection.vendor == "sqlite"
+    survey, body = seed()
+    print(f"{'setup':<28} {'req/s':>8} {'failed':>7}")
+    try:
+        for name, max_age, health_checks, pragmas in SETUPS:
+            if pragmas and not sqlite:
+                continue
+            configure(max_age, health_checks, pragmas)
+            # median of three runs, the first one also fills the survey cache
+            run_results = [run(survey, body) for _ in range(3)]
+            rps = statistics.median(result[0] for result in run_results)
+            failed = sum(result[1] for result in run_results)
+            print(f"{name:<28} {rps:>8.0f} {failed:>7}")
+    finally:
+        if not sqlite:
+            creator = survey.creator
+            survey.delete()
+            creator.delete()
+        directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Checks that the streaming export uses the same amount of memory no matter how many
+responses a survey has
+Peak memory is measured with tracemalloc around consuming the export only, since the
+process RSS high-water mark would also include seeding the data
+"""
+import time
+import tracemalloc
+import uuid
+
+from .utils import create_user, setup_django, test_database
+
+SIZES = (1_000, 10_000, 40_000)
+QUESTIONS = 5
+
+
+def seed(survey, size, questions):
+    from surveys.models import ChoiceAnswer, SurveyParticipation
+
+    participations = SurveyParticipation.objects.bulk_create(
+        (
+            SurveyParticipation(survey=survey, user_session=uuid.uuid4().hex, is_complete=True)
+            for _ in range(size)
+        ),
+        batch_size=1000,
+    )
+    ChoiceAnswer.objects.bulk_create(
+        (
+            ChoiceAnswer(
+                survey_participation=participation,
+                question=question,
+                answer_option=options[i % len(options)],
+            )
+            for i, participation in enumerate(participations)
+            for question, options in questions
+        ),
+        batch_size=1000,
+    )
+
+
+def main():
+    setup_django()
+    with test_database():
+        from surveys.export import iter_csv
+        from surveys.models import AnswerOption, Question, Survey, SurveySection
+
+        creator = create_user()
+        print(f"{'responses':>10} {'rows':>8} {'peak KiB':>10} {'seconds':>8}")
+        for size in SIZES:
+            survey = Survey.objects.create(creator=creator)
+            section = SurveySection.objects.create(survey=survey, name="Section")
+            questions = []
+            for q in range(QUESTIONS):
+                question = Question.objects.create(
+                    section=section,
+                    question=f"Question {q}",
+                    question_type=Question.QuestionType.MULTIPLE_CHOICE_SINGLE,
+                )
+                options = [
+                    AnswerOption.objects.create(question=question, text=f"Option {a}")
+                    for a in range(4)
+                ]
+                questions.append((question, options))
+            seed(survey, size, questions)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            rows = sum(1 for _ in iter_csv(survey))
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{size:>10} {rows:>8} {peak / 1024:>10.0f} {seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Load-tests the respondent endpoints under WSGI and under ASGI, and compares throughput
+and p99 latency
+Each server is started as a single worker against the configured database (run
+`python manage.py migrate` first), and hit by concurrent clients that mostly read the
+survey and sometimes submit it as new anonymous respondents. The WSGI server serves the
+DRF views, the ASGI server the async views from `surveys_api.async_views`
+
+    python -m benchmarks.load_test --concurrency 64 --duration 20
+
+The server commands can be replaced with --wsgi/--asgi, e.g. to give gunicorn threads
+"""
+import argparse
+import http.client
+import json
+import shlex
+import socket
+import subprocess
+import threading
+import time
+
+from .utils import create_user, setup_django
+
+WSGI_COMMAND = "gunicorn core.wsgi:application --bind 127.0.0.1:{port} --workers 1"
+ASGI_COMMAND = (
+    "uvicorn core.asgi:application --host 127.0.0.1 --port {port} --workers 1 "
+    "--no-access-log"
+)
+PATHS = {
+    "wsgi": ("/api/form/{pk}/", "/api/form/{pk}/submit/"),
+    "asgi": ("/api/async/form/{pk}/", "/api/async/form/{pk}/submit/"),
+}
+
+
+def seed(sections=3, questions=10, options=4):
+    """
+    Creates a single-choice survey and returns it with a complete submission for it
+    """
+    from surveys.models import AnswerOption, Question, Survey, SurveySection
+
+    creator = create_user(f"load-test-{int(time.time())}")
+    survey = Survey.objects.create(creator=creator, title="Load test")
+    section_objs = SurveySection.objects.bulk_create(
+        SurveySection(survey=survey, name=f"Section {s}", order=s + 1)
+        for s in range(sections)
+    )
+    question_objs = Question.objects.bulk_create(
+        Question(
+            section=section,
+            question=f"Question {q}",
+            question_type=Question.QuestionType.MULTIPLE_CHOICE_SINGLE,
+            order=q + 1,
+        )
+        for section in section_objs
+        for q in range(questions)
+    )
+    option_objs = AnswerOption.objects.bulk_create(
+        AnswerOption(question=question, text=f"Option {a}", order=a + 1)
+        for question in question_objs
+        for a in range(options)
+    )
+    payload = {
+        "answers": [
+            {"question": str(option.question_id), "answer_option": str(option.id)}
+            for option in option_objs[::options]
+        ]
+    }
+    return survey, payload
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(command, port, timeout=30):
+    process = subprocess.Popen(
+        shlex.split(command.format(port=port)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{command!r} exited with {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{command!r} did not start listening within {timeout}s")
+
+
+def request(port, method, path, body=None):
+    """
+    Sends one request on a fresh connection, and returns (status, seconds)
+    """
+    headers = {"Content-Type": "application/json"} if body else {}
+    start = time.perf_counter()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        status = response.status
+    except OSError:
+        status = None
+    finally:
+        connection.close()
+    return status, time.perf_counter() - start
+
+
+def run_load(port, detail_path, submit_path, body, concurrency, duration, submit_every):
+    """
+    Runs `concurrency` clients in a closed loop for `duration` seconds, where every
+    `submit_every`th request of a client is a submission
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        own_latencies, own_errors, sent = [], 0, 0
+        while time.monotonic() < deadline:
+            sent += 1
+            if sent % submit_every == 0:
+                status, seconds = request(port, "POST", submit_path, body)
+                ok = status == 201
+            else:
+                status, seconds = request(port, "GET", detail_path)
+                ok = status == 200
+            own_latencies.append(seconds)
+            own_errors += not ok
+        with lock:
+            latencies.extend(own_latencies)
+            errors.append(own_errors)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "rps": len(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--submit-every", type=int, default=10)
+    parser.add_argument("--wsgi", default=WSGI_COMMAND)
+    parser.add_argument("--asgi", default=ASGI_COMMAND)
+    args = parser.parse_args()
+
+    setup_django()
+    survey, payload = seed()
+    body = json.dumps(payload)
+    print(
+        f"{'server':>6} {'requests':>9} {'errors':>7} {'req/s':>8} "
+        f"{'p50 ms':>8} {'p99 ms':>8}"
+    )
+    try:
+        for name, command in (("wsgi", args.wsgi), ("asgi", args.asgi)):
+            port = free_port()
+            try:
+                process = start_server(command, port)
+            except (OSError, RuntimeError) as exc:
+                print(f"{name:>6} skipped: {exc}")
+                continue
+            try:
+                detail_path, submit_path = (p.format(pk=survey.pk) for p in PATHS[name])
+                # fill the survey cache before measuring
+                request(port, "GET", detail_path)
+                result = run_load(
+                    port,
+                    detail_path,
+                    submit_path,
+                    body,
+                    args.concurrency,
+                    args.duration,
+                    args.submit_every,
+                )
+            finally:
+                process.terminate()
+                process.wait()
+            print(
+                f"{name:>6} {result['requests']:>9} {result['errors']:>7} "
+                f"{result['rps']:>8.0f} {result['p50']:>8.1f} {result['p99']:>8.1f}"
+            )
+    finally:
+        creator = survey.creator
+        survey.delete()
+        creator.delete()
+
+
+if __name__ == "__main__":
+    main()
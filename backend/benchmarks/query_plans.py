@@ -0,0 +1,141 @@
+"""
+Seeds a dataset and prints the query plan of every hot lookup, checking that each
+one is served by the index meant for it
+"""
+import time
+import uuid
+
+from .utils import create_user, setup_django, test_database
+
+SURVEYS = 50
+SECTIONS = 4
+QUESTIONS = 10
+OPTIONS = 4
+PARTICIPATIONS = 200
+
+
+def seed():
+    from surveys.models import (
+        AnswerOption,
+        ChoiceAnswer,
+        Question,
+        Survey,
+        SurveyParticipation,
+        SurveySection,
+    )
+
+    creator = create_user()
+    surveys = Survey.objects.bulk_create(Survey(creator=creator) for _ in range(SURVEYS))
+    sections = SurveySection.objects.bulk_create(
+        SurveySection(survey=survey, name=str(s), order=s + 1)
+        for survey in surveys
+        for s in range(SECTIONS)
+    )
+    questions = Question.objects.bulk_create(
+        Question(section=section, question=str(q), question_type="MCS", order=q + 1)
+        for section in sections
+        for q in range(QUESTIONS)
+    )
+    options = AnswerOption.objects.bulk_create(
+        AnswerOption(question=question, text=str(a), order=a + 1)
+        for question in questions
+        for a in range(OPTIONS)
+    )
+    participations = SurveyParticipation.objects.bulk_create(
+        SurveyParticipation(
+            survey=survey, user_session=uuid.uuid4().hex, is_complete=p % 4 != 0
+        )
+        for survey in surveys[:5]
+        for p in range(PARTICIPATIONS)
+    )
+    first_options = options[::OPTIONS]
+    ChoiceAnswer.objects.bulk_create(
+        (
+            ChoiceAnswer(
+                survey_participation=participation,
+                question_id=option.question_id,
+                answer_option=option,
+            )
+            for participation in participations
+            for option in first_options[: SECTIONS * QUESTIONS]
+        ),
+        batch_size=1000,
+    )
+    return creator, surveys[0], sections[0], questions[0], options[0], participations[0]
+
+
+def main():
+    setup_django()
+    with test_database():
+        from django.db import connection
+        from django.utils import timezone
+        from surveys.listing import encode_cursor, filter_participations
+        from surveys.models import (
+            AnswerOption,
+            ChoiceAnswer,
+            Question,
+            SurveyParticipation,
+            SurveySection,
+        )
+        from surveys.scheduling import surveys_to_close, surveys_to_open
+
+        start = time.perf_counter()
+        creator, survey, section, question, option, participation = seed()
+        print(f"seeded in {time.perf_counter() - start:.1f}s")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cursor = encode_cursor(participation)
+        now = timezone.now()
+        without_end_date, with_end_date = surveys_to_open(now)
+
+        lookups = [
+            (
+                "surveys_section_order_idx",
+                SurveySection.objects.filter(survey=survey).order_by("order"),
+            ),
+            (
+                "surveys_question_order_idx",
+                Question.objects.filter(section=section).order_by("order"),
+            ),
+            (
+                "surveys_option_order_idx",
+                AnswerOption.objects.filter(question=question).order_by("order"),
+            ),
+            (
+                "surveys_choice_option_idx",
+                ChoiceAnswer.objects.filter(question=question, answer_option=option),
+            ),
+            (
+                "surveys_part_account_idx",
+                SurveyParticipation.objects.filter(survey=survey, user_account=creator),
+            ),
+            (
+                "surveys_part_session_idx",
+                SurveyParticipation.objects.filter(
+                    survey=participation.survey_id, user_session=participation.user_session
+                ),
+            ),
+            (
+                "surveys_part_recent_idx",
+                filter_participations(participation.survey_id, cursor),
+            ),
+            (
+                "surveys_part_complete_idx",
+                filter_participations(participation.survey_id, cursor, is_complete=True),
+            ),
+            ("surveys_survey_opening_idx", without_end_date),
+            ("surveys_survey_opening_idx", with_end_date),
+            ("surveys_survey_closing_idx", surveys_to_close(now)),
+        ]
+        failures = 0
+        for index, queryset in lookups:
+            plan = queryset.explain()
+            used = index in plan
+            failures += not used
+            print(f"{'ok  ' if used else 'MISS'} {index}\n    {plan.replace(chr(10), chr(10) + '    ')}")
+        if failures:
+            raise SystemExit(f"{failures} lookup(s) did not use their index")
+
+
+if __name__ == "__main__":
+    main()
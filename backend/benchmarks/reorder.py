@@ -0,0 +1,68 @@
+"""
+Compares the old row-by-row `_make_order_consecutive` with the set-based version
+used by `OrderedManager`, for sections with 10, 100 and 1000 questions
+"""
+from django.db import transaction
+
+from .utils import create_user, measure, setup_django, test_database
+
+SIZES = (10, 100, 1000)
+
+
+def legacy_make_order_consecutive(queryset):
+    """
+    The original implementation: one UPDATE per row that is out of order
+    Rows are written with a plain UPDATE, since `save()` now also bumps the Survey version
+    """
+    with transaction.atomic():
+        for index, obj in enumerate(queryset):
+            if obj.order != index + 1:
+                queryset.filter(pk=obj.pk).update(order=index + 1)
+    return queryset
+
+
+def scramble(section):
+    """
+    Spreads the orders out so that every question needs renumbering
+    """
+    from django.db.models import F
+    from surveys.models import Question
+
+    Question.objects.filter(section=section).update(order=F("order") * 2)
+
+
+def main():
+    setup_django()
+    with test_database():
+        from surveys.models import Question, Survey, SurveySection
+
+        survey = Survey.objects.create(creator=create_user())
+        print(f"{'siblings':>8} {'impl':>7} {'queries':>8} {'ms':>10}")
+        for size in SIZES:
+            section = SurveySection.objects.create(survey=survey, name=str(size))
+            Question.objects.bulk_create(
+                Question(
+                    section=section,
+                    question=str(i),
+                    question_type=Question.QuestionType.TEXT_RESPONSE,
+                    order=i + 1,
+                )
+                for i in range(size)
+            )
+            for name, renumber in (
+                ("legacy", lambda: legacy_make_order_consecutive(
+                    Question.objects.filter(section=section).order_by("order")
+                )),
+                ("set", lambda: Question.objects._make_order_consecutive(section)),
+            ):
+                scramble(section)
+                with measure() as result:
+                    renumber()
+                print(
+                    f"{size:>8} {name:>7} {result['queries']:>8} "
+                    f"{result['seconds'] * 1000:>10.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
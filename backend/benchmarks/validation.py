@@ -0,0 +1,74 @@
+"""
+Times validating a 200-answer submission against an in-memory SurveySchema
+The schema is built from plain dicts, so no database is involved at all
+"""
+import timeit
+import uuid
+
+from .utils import setup_django
+
+QUESTIONS = 200
+OPTIONS = 4
+TARGET_MS = 1.0
+
+
+def build_schema():
+    """
+    200 questions, alternating single and multiple choice, where every tenth
+    question depends on the first option of the question before it
+    """
+    from surveys.validation import SurveySchema
+
+    questions, answer_options, answers = [], [], []
+    previous_option = None
+    for q in range(QUESTIONS):
+        question_id = uuid.uuid4()
+        option_ids = [uuid.uuid4() for _ in range(OPTIONS)]
+        questions.append(
+            {
+                "id": question_id,
+                "question_type": "MCS" if q % 2 else "MCM",
+                "is_required": True,
+                "dependency_question": None,
+                "dependency_answer_option": previous_option if q % 10 == 0 else None,
+            }
+        )
+        answer_options.extend({"id": o, "question": question_id} for o in option_ids)
+        answers.append({"question": question_id, "answer_option": option_ids[0]})
+        previous_option = option_ids[0]
+    return SurveySchema(questions, answer_options), answers
+
+
+def main():
+    setup_django()
+    from surveys.serializers import SubmissionSerializer
+
+    schema, answers = build_schema()
+    assert schema.validate(answers) == [], schema.validate(answers)
+
+    runs = 2000
+    seconds = timeit.timeit(lambda: schema.validate(answers), number=runs)
+    per_call_ms = seconds / runs * 1000
+    print(f"SurveySchema.validate, {len(answers)} answers: {per_call_ms:.3f} ms")
+
+    payload = {
+        "answers": [
+            {"question": str(a["question"]), "answer_option": str(a["answer_option"])}
+            for a in answers
+        ]
+    }
+    runs = 50
+    seconds = timeit.timeit(
+        lambda: SubmissionSerializer(data=payload, context={"schema": schema}).is_valid(
+            raise_exception=True
+        ),
+        number=runs,
+    )
+    print(f"SubmissionSerializer incl. parsing: {seconds / runs * 1000:.3f} ms")
+
+    if per_call_ms > TARGET_MS:
+        raise SystemExit(f"validation took longer than the {TARGET_MS} ms target")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Database backends used by `core.db`: the stock Django backends, plus connection health
+checks (see `health.py`) and, for SQLite, PRAGMAs applied to every new connection
+"""
@@ -0,0 +1,7 @@
+from django.db.backends.postgresql import base
+
+from ..health import ConnectionHealthChecksMixin
+
+
+class DatabaseWrapper(ConnectionHealthChecksMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,20 @@
+from django.db.backends.sqlite3 import base
+
+from ..health import ConnectionHealthChecksMixin
+
+
+class DatabaseWrapper(ConnectionHealthChecksMixin, base.DatabaseWrapper):
+    """
+    Runs the PRAGMAs in OPTIONS["pragmas"] ({name: value}) on every new connection
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop("pragmas", {})
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
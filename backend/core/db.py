@@ -0,0 +1,81 @@
+"""
+Builds the default database settings from environment variables
+
+DATABASE_ENGINE                 sqlite (default) or postgres
+DATABASE_NAME                   SQLite file, or Postgres database name
+DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST, DATABASE_PORT
+                                Postgres only
+DATABASE_CONN_MAX_AGE           seconds a connection is kept open between requests,
+                                0 closes it after every request, "none" never
+                                (default 60)
+DATABASE_CONN_HEALTH_CHECKS     ping a kept connection before its first use in a request
+                                (default on)
+DATABASE_POOLER                 "pgbouncer" when Postgres is reached through PgBouncer in
+                                transaction pooling mode
+DATABASE_SQLITE_TUNING          apply SQLITE_PRAGMAS to every SQLite connection
+                                (default on)
+DATABASE_REPLICA_NAME, DATABASE_REPLICA_HOST, DATABASE_REPLICA_PORT
+                                a read replica of the default database, which gets the
+                                same settings apart from these
+"""
+import os
+
+# WAL lets readers and one writer work concurrently, and makes NORMAL syncing safe
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 5000,
+}
+
+
+def _bool(value):
+    return value.strip().lower() not in ("", "0", "false", "no", "off")
+
+
+def _conn_max_age(value):
+    return None if value.strip().lower() == "none" else int(value)
+
+
+def database_from_env(default_name, environ=os.environ):
+    """
+    Returns the DATABASES["default"] dict for the environment, using `default_name`
+    as the SQLite file if DATABASE_NAME is not set
+    """
+    engine = environ.get("DATABASE_ENGINE", "sqlite")
+    database = {
+        "CONN_MAX_AGE": _conn_max_age(environ.get("DATABASE_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": _bool(environ.get("DATABASE_CONN_HEALTH_CHECKS", "1")),
+        "OPTIONS": {},
+    }
+    if engine == "sqlite":
+        database["ENGINE"] = "core.backends.sqlite3"
+        database["NAME"] = environ.get("DATABASE_NAME", default_name)
+        if _bool(environ.get("DATABASE_SQLITE_TUNING", "1")):
+            database["OPTIONS"]["pragmas"] = dict(SQLITE_PRAGMAS)
+    elif engine == "postgres":
+        database["ENGINE"] = "core.backends.postgresql"
+        database["NAME"] = environ.get("DATABASE_NAME", "surveys")
+        for key in ("USER", "PASSWORD", "HOST", "PORT"):
+            database[key] = environ.get(f"DATABASE_{key}", "")
+        if environ.get("DATABASE_POOLER") == "pgbouncer":
+            # server-side cursors (QuerySet.iterator) don't survive transaction pooling
+            database["DISABLE_SERVER_SIDE_CURSORS"] = True
+    else:
+        raise ValueError(f"Unknown DATABASE_ENGINE {engine!r}, use sqlite or postgres")
+    return database
+
+
+def replica_from_env(primary, environ=os.environ):
+    """
+    Returns the settings of the read replica of `primary`, or None if there is none
+    """
+    overrides = {
+        key: environ[f"DATABASE_REPLICA_{key}"]
+        for key in ("NAME", "HOST", "PORT")
+        if environ.get(f"DATABASE_REPLICA_{key}")
+    }
+    if not overrides:
+        return None
+    # tests run against the primary's test database only
+    return {**primary, **overrides, "TEST": {"MIRROR": "default"}}
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 
+from .db import database_from_env, replica_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -53,6 +55,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "surveys.middleware.ReplicaPinningMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -80,11 +83,26 @@ WSGI_APPLICATION = "core.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
+# Configured with DATABASE_* environment variables, see core/db.py
 
 DATABASES = {
+    "default": database_from_env(BASE_DIR / "db.sqlite3"),
+}
+
+replica = replica_from_env(DATABASES["default"])
+if replica:
+    DATABASES["replica"] = replica
+
+# results and exports read from the replica, if there is one, see surveys/replicas.py
+DATABASE_ROUTERS = ["surveys.replicas.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
 }
 
@@ -176,3 +194,35 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 }
+
+# Surveys
+# With sparse ordering, sections, questions and answer options are stored with orders
+# SURVEYS_ORDER_GAP apart, so inserting or moving one of them only writes a single row
+# Run `manage.py rebalance_order` periodically to respace crowded lists
+
+SURVEYS_SPARSE_ORDERING = False
+
+SURVEYS_ORDER_GAP = 1024
+
+# Published survey structure is cached per survey version, see surveys/cache.py
+
+SURVEYS_CACHE_ALIAS = "default"
+
+SURVEYS_CACHE_TIMEOUT = 60 * 60
+
+# Submissions are only validated and queued by the submission endpoint (202 Accepted),
+# and written in batches by `manage.py drain_submissions --watch`, see surveys/ingestion.py
+
+SURVEYS_INGESTION_QUEUE = False
+
+# Analytics reads go to this database alias if it is configured (DATABASE_REPLICA_*),
+# except for users who wrote something in the last SURVEYS_REPLICA_PIN_SECONDS
+
+SURVEYS_REPLICA_ALIAS = "replica"
+
+SURVEYS_REPLICA_PIN_SECONDS = 10
+
+# Results and analytics of closed surveys are served from columnar snapshots written here
+# by `manage.py snapshot_surveys` (needs NumPy), see surveys/snapshots.py
+
+SURVEYS_SNAPSHOT_DIR = BASE_DIR / "snapshots"
@@ -0,0 +1,80 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+from .db import SQLITE_PRAGMAS, database_from_env, replica_from_env
+
+
+class DatabaseFromEnvTest(SimpleTestCase):
+    def test_sqlite_defaults(self):
+        database = database_from_env("db.sqlite3", environ={})
+        self.assertEqual(database["ENGINE"], "core.backends.sqlite3")
+        self.assertEqual(database["NAME"], "db.sqlite3")
+        self.assertEqual(database["CONN_MAX_AGE"], 60)
+        self.assertTrue(database["CONN_HEALTH_CHECKS"])
+        self.assertEqual(database["OPTIONS"]["pragmas"], SQLITE_PRAGMAS)
+
+    def test_sqlite_without_tuning(self):
+        environ = {"DATABASE_SQLITE_TUNING": "0", "DATABASE_CONN_MAX_AGE": "0"}
+        database = database_from_env("db.sqlite3", environ=environ)
+        self.assertEqual(database["OPTIONS"], {})
+        self.assertEqual(database["CONN_MAX_AGE"], 0)
+
+    def test_postgres_behind_pgbouncer(self):
+        environ = {
+            "DATABASE_ENGINE": "postgres",
+            "DATABASE_HOST": "db",
+            "DATABASE_POOLER": "pgbouncer",
+            "DATABASE_CONN_MAX_AGE": "none",
+        }
+        database = database_from_env("db.sqlite3", environ=environ)
+        self.assertEqual(database["ENGINE"], "core.backends.postgresql")
+        self.assertEqual(database["HOST"], "db")
+        self.assertIsNone(database["CONN_MAX_AGE"])
+        self.assertTrue(database["DISABLE_SERVER_SIDE_CURSORS"])
+
+    def test_replica(self):
+        primary = database_from_env("db.sqlite3", environ={})
+        self.assertIsNone(replica_from_env(primary, environ={}))
+        replica = replica_from_env(primary, environ={"DATABASE_REPLICA_NAME": "replica.sqlite3"})
+        self.assertEqual(replica["NAME"], "replica.sqlite3")
+        self.assertEqual(replica["ENGINE"], primary["ENGINE"])
+        self.assertEqual(replica["TEST"], {"MIRROR": "default"})
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            database_from_env("db.sqlite3", environ={"DATABASE_ENGINE": "oracle"})
+
+
+class SQLiteBackendTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        name = Path(directory.name) / "db.sqlite3"
+        connections = ConnectionHandler({"default": database_from_env(name, environ={})})
+        self.connection = connections["default"]
+        self.addCleanup(self.connection.close)
+
+    def pragma(self, name):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_on_connect(self):
+        self.assertEqual(self.pragma("journal_mode"), "wal")
+        self.assertEqual(self.pragma("synchronous"), 1)
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+
+    def test_unusable_connection_is_replaced_once_per_request(self):
+        self.connection.ensure_connection()
+        first = self.connection.connection
+        with mock.patch.object(self.connection, "is_usable", return_value=False) as is_usable:
+            # a new request starts
+            self.connection.close_if_unusable_or_obsolete()
+            self.connection.ensure_connection()
+            self.connection.ensure_connection()
+        self.assertEqual(is_usable.call_count, 1)
+        self.assertIsNot(self.connection.connection, first)
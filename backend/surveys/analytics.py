@@ -0,0 +1,167 @@
+"""
+Results filtered by answers, and cross-tabulation of two questions
+Both are aggregated in SQL over ChoiceAnswer, so no Answer or ChoiceAnswer instances are
+loaded and the result is O(answer options) rows. A filter is a list of answer option ids,
+a participation passes when it picked all of them
+Unlike `surveys.counters`, everything is computed from the stored answers per request
+"""
+from django.db import connections, router
+from django.db.models import Count, Q
+
+from .counters import build_results
+from .models import Answer, ChoiceAnswer, Question, SurveyParticipation
+
+CHOICE_QUESTION_TYPES = (
+    Question.QuestionType.MULTIPLE_CHOICE_SINGLE,
+    Question.QuestionType.MULTIPLE_CHOICE_MULTI,
+)
+
+
+def participations_with(survey, options=()):
+    """
+    Returns the SurveyParticipations of a Survey that picked every answer option in
+    `options`, with one semi-join per option
+    """
+    participations = SurveyParticipation.objects.filter(survey=survey)
+    for option in options:
+        participations = participations.filter(
+            pk__in=ChoiceAnswer.objects.filter(answer_option=option).values(
+                "survey_participation"
+            )
+        )
+    return participations
+
+
+def check_filters(survey, options=(), questions=()):
+    """
+    Returns a list of error strings for filter `options` and crosstab `questions` that
+    are not answer options or choice questions of the Survey, empty if they all are
+    `survey` should come from `Survey.objects.with_tree()`
+    """
+    survey_questions = {
+        question.id: question
+        for section in survey.sections.all()
+        for question in section.questions.all()
+    }
+    survey_options = {
+        option.id
+        for question in survey_questions.values()
+        for option in question.answer_options.all()
+    }
+    errors = [
+        f"Unknown answer option {option}" for option in options if option not in survey_options
+    ]
+    for question_id in questions:
+        question = survey_questions.get(question_id)
+        if question is None:
+            errors.append(f"Unknown question {question_id}")
+        elif question.question_type not in CHOICE_QUESTION_TYPES:
+            errors.append(f"Question {question_id} is not a multiple choice question")
+    return errors
+
+
+def filtered_results(survey, options=()):
+    """
+    Returns the results of a Survey (see `counters.survey_results`) counting only the
+    participations that picked every answer option in `options`
+    `survey` should come from `Survey.objects.with_tree()`
+    """
+    participations = participations_with(survey, options)
+    totals = participations.order_by().aggregate(
+        participations=Count("pk"), completed=Count("pk", filter=Q(is_complete=True))
+    )
+    choices = ChoiceAnswer.objects.filter(survey_participation__in=participations.values("pk"))
+    texts = Answer.objects.filter(survey_participation__in=participations.values("pk"))
+    option_counts = dict(
+        choices.order_by().values("answer_option").annotate(n=Count("pk")).values_list(
+            "answer_option", "n"
+        )
+    )
+    # a question is either answered with choices or with text, never both
+    question_counts = {
+        question_id: count
+        for answers in (choices, texts)
+        for question_id, count in answers.order_by()
+        .values("question")
+        .annotate(n=Count("survey_participation", distinct=True))
+        .values_list("question", "n")
+    }
+    return build_results(
+        survey, totals["participations"], totals["completed"], question_counts, option_counts
+    )
+
+
+def crosstab(survey, row_question, column_question, options=()):
+    """
+    Returns how often each answer option of `row_question` was picked together with each
+    answer option of `column_question`, by the participations that picked every answer
+    option in `options`
+    Counted with one self-join of ChoiceAnswer on the participation, grouped by both
+    answer options. Questions are ids of choice questions of the Survey, and `survey`
+    should come from `Survey.objects.with_tree()`
+    """
+    questions = {
+        question.id: question
+        for section in survey.sections.all()
+        for question in section.questions.all()
+    }
+    rows = questions[row_question]
+    columns = questions[column_question]
+
+    connection = connections[router.db_for_read(ChoiceAnswer)]
+    qn = connection.ops.quote_name
+    table = qn(ChoiceAnswer._meta.db_table)
+    participation = qn(ChoiceAnswer._meta.get_field("survey_participation").column)
+    question = qn(ChoiceAnswer._meta.get_field("question").column)
+    answer_option = qn(ChoiceAnswer._meta.get_field("answer_option").column)
+    where = f"r.{question} = %s AND c.{question} = %s"
+    params = [
+        ChoiceAnswer._meta.get_field("question").get_db_prep_value(value, connection)
+        for value in (rows.id, columns.id)
+    ]
+    if options:
+        filtered_sql, filtered_params = (
+            participations_with(survey, options).values("pk").query.sql_with_params()
+        )
+        where += f" AND r.{participation} IN ({filtered_sql})"
+        params.extend(filtered_params)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT r.{answer_option}, c.{answer_option}, COUNT(*) "
+            f"FROM {table} r INNER JOIN {table} c ON c.{participation} = r.{participation} "
+            f"WHERE {where} "
+            f"GROUP BY r.{answer_option}, c.{answer_option}",
+            params,
+        )
+        counted = cursor.fetchall()
+
+    to_python = ChoiceAnswer._meta.get_field("answer_option").to_python
+    counts = {(to_python(row), to_python(column)): n for row, column, n in counted}
+    return build_crosstab(rows, columns, counts)
+
+
+def build_crosstab(rows, columns, counts):
+    """
+    Returns a crosstab in the format of `crosstab`, from the `rows` and `columns`
+    Questions (with prefetched answer options) and a
+    {(row answer option id, column answer option id): count} dict
+    """
+    column_options = list(columns.answer_options.all())
+    return {
+        "rows": _crosstab_question(rows),
+        "columns": _crosstab_question(columns),
+        "counts": [
+            [counts.get((row.id, column.id), 0) for column in column_options]
+            for row in rows.answer_options.all()
+        ],
+    }
+
+
+def _crosstab_question(question):
+    return {
+        "id": question.id,
+        "question": question.question,
+        "answer_options": [
+            {"id": option.id, "text": option.text} for option in question.answer_options.all()
+        ],
+    }
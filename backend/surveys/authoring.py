@@ -0,0 +1,256 @@
+"""
+Surveys as nested documents (see `SurveyDocumentSerializer`), for creating a whole
+Survey in one request, and for dumping and loading surveys between environments
+Questions and answer options can carry a `temp_id`, which dependencies refer to, since
+their real ids don't exist before they are inserted
+"""
+import json
+from datetime import datetime
+
+from django.db import transaction
+
+from .logic import DependencyCycleError, DependencyGraph
+from .models import AnswerOption, Question, Survey, SurveySection
+
+
+def _question_key(index, question):
+    # questions without a temp id can't be depended on, but still take part in cycle checks
+    temp_id = question.get("temp_id")
+    return temp_id if temp_id is not None else ("question", index)
+
+
+def check_document(sections):
+    """
+    Returns a list of error strings for the temp ids and dependencies of a document's
+    `sections`, empty if they are consistent
+    Applies the same rules as `logic.check_dependency`, without touching the database
+    """
+    questions = [question for section in sections for question in section["questions"]]
+    errors = []
+    seen = set()
+    option_question = {}
+    for index, question in enumerate(questions):
+        items = [question, *question["answer_options"]]
+        for item in items:
+            temp_id = item.get("temp_id")
+            if temp_id is None:
+                continue
+            if temp_id in seen:
+                errors.append(f"temp_id {temp_id} is used more than once")
+            seen.add(temp_id)
+        for option in question["answer_options"]:
+            if option.get("temp_id") is not None:
+                option_question[option["temp_id"]] = _question_key(index, question)
+
+    question_temp_ids = {q["temp_id"] for q in questions if q.get("temp_id") is not None}
+    for question in questions:
+        dependency_question = question["dependency_question"]
+        dependency_option = question["dependency_answer_option"]
+        if dependency_question is not None and dependency_question not in question_temp_ids:
+            errors.append(f"Unknown dependency_question {dependency_question}")
+        if dependency_option is not None:
+            if dependency_option not in option_question:
+                errors.append(f"Unknown dependency_answer_option {dependency_option}")
+            elif dependency_question is not None and (
+                option_question[dependency_option] != dependency_question
+            ):
+                errors.append(
+                    f"Answer option {dependency_option} is not an option of "
+                    f"question {dependency_question}"
+                )
+    if errors:
+        return errors
+
+    try:
+        DependencyGraph(
+            [
+                {
+                    "id": _question_key(index, question),
+                    "is_required": question["is_required"],
+                    "dependency_question": question["dependency_question"],
+                    "dependency_answer_option": question["dependency_answer_option"],
+                }
+                for index, question in enumerate(questions)
+            ],
+            [{"id": option, "question": key} for option, key in option_question.items()],
+        )
+    except DependencyCycleError as exc:
+        errors.extend(exc.messages)
+    return errors
+
+
+def create_survey_from_document(creator, data):
+    """
+    Inserts a Survey with all of its sections, questions and answer options, with one
+    bulk insert per level in a single transaction, and returns the Survey
+    `data` is validated `SurveyDocumentSerializer` data, orders follow the document
+    """
+    return create_surveys_from_documents(creator, [data])[0]
+
+
+def create_surveys_from_documents(creator, documents):
+    """
+    Like `create_survey_from_document`, for many documents at once, still with one
+    bulk insert per level
+    Every object gets a fresh id, and dependencies are remapped to them
+    """
+    survey_objs, section_objs, question_objs, option_objs = [], [], [], []
+    dependencies = []
+    for data in documents:
+        data = dict(data)
+        sections = data.pop("sections")
+        survey = Survey(creator=creator, **data)
+        # bulk_create doesn't call save()
+        survey.is_open = survey.compute_is_open()
+        survey_objs.append(survey)
+        # temp ids are only unique within their document
+        real_ids = {}
+        for section_position, section in enumerate(sections, start=1):
+            section_obj = SurveySection(
+                survey=survey,
+                name=section["name"],
+                subheading=section["subheading"],
+                order=SurveySection.objects.initial_order(section_position),
+            )
+            section_objs.append(section_obj)
+            for question_position, question in enumerate(section["questions"], start=1):
+                question_obj = Question(
+                    section=section_obj,
+                    question=question["question"],
+                    subheading=question["subheading"],
+                    is_required=question["is_required"],
+                    question_type=question["question_type"],
+                    order=Question.objects.initial_order(question_position),
+                )
+                question_objs.append(question_obj)
+                if question.get("temp_id") is not None:
+                    real_ids[question["temp_id"]] = question_obj.pk
+                dependencies.append(
+                    (
+                        question_obj,
+                        real_ids,
+                        question["dependency_question"],
+                        question["dependency_answer_option"],
+                    )
+                )
+                for option_position, option in enumerate(question["answer_options"], start=1):
+                    option_obj = AnswerOption(
+                        question=question_obj,
+                        text=option["text"],
+                        order=AnswerOption.objects.initial_order(option_position),
+                    )
+                    option_objs.append(option_obj)
+                    if option.get("temp_id") is not None:
+                        real_ids[option["temp_id"]] = option_obj.pk
+    for question_obj, real_ids, dependency_question, dependency_option in dependencies:
+        question_obj.dependency_question_id = real_ids.get(dependency_question)
+        question_obj.dependency_answer_option_id = real_ids.get(dependency_option)
+    with transaction.atomic():
+        Survey.objects.bulk_create(survey_objs)
+        # dependencies may point forward, the foreign keys are only checked on commit
+        SurveySection.objects.bulk_create(section_objs)
+        Question.objects.bulk_create(question_objs)
+        AnswerOption.objects.bulk_create(option_objs)
+    return survey_objs
+
+
+def survey_to_document(survey):
+    """
+    Returns a Survey as validated `SurveyDocumentSerializer` data, used for dumps
+    (`manage.py dump_surveys`) and clones
+    Questions and answer options get their current ids as temp ids, so dependencies
+    survive a round trip. `survey` should come from `Survey.objects.with_tree()`
+    """
+
+    def temp_id(obj_id):
+        return str(obj_id) if obj_id is not None else None
+
+    return {
+        "title": survey.title,
+        "description": survey.description,
+        "survey_start_date": survey.survey_start_date,
+        "survey_end_date": survey.survey_end_date,
+        "is_active": survey.is_active,
+        "allow_anonymous_responses": survey.allow_anonymous_responses,
+        "limit_one_response_per_user": survey.limit_one_response_per_user,
+        "allow_edits_after_submit": survey.allow_edits_after_submit,
+        "is_template": survey.is_template,
+        "sections": [
+            {
+                "name": section.name,
+                "subheading": section.subheading,
+                "questions": [
+                    {
+                        "temp_id": temp_id(question.id),
+                        "question": question.question,
+                        "subheading": question.subheading,
+                        "is_required": question.is_required,
+                        "question_type": question.question_type,
+                        "dependency_question": temp_id(question.dependency_question_id),
+                        "dependency_answer_option": temp_id(
+                            question.dependency_answer_option_id
+                        ),
+                        "answer_options": [
+                            {"temp_id": temp_id(option.id), "text": option.text}
+                            for option in question.answer_options.all()
+                        ],
+                    }
+                    for question in section.questions.all()
+                ],
+            }
+            for section in survey.sections.all()
+        ],
+    }
+
+
+def clone_survey(survey, creator=None, **fields):
+    """
+    Copies a Survey with all of its sections, questions and answer options, remapping
+    dependencies to the copies, and returns the copy
+    Costs one query per level to read the tree and one bulk insert per level to write it
+    `creator` defaults to the original's, `fields` override Survey fields of the copy
+    """
+    source = Survey.objects.with_tree().get(pk=survey.pk)
+    document = {**survey_to_document(source), **fields}
+    return create_survey_from_document(creator or source.creator, document)
+
+
+DUMP_FORMAT = "surveys"
+DUMP_VERSION = 1
+
+
+def _encode_value(value):
+    # full precision, unlike DjangoJSONEncoder which cuts datetimes to milliseconds
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Can't encode {type(value).__name__}")
+
+
+def encode_dump(documents, output="json"):
+    """
+    Encodes documents as a dump, canonical JSON (sorted keys) or msgpack
+    """
+    dump = {"format": DUMP_FORMAT, "version": DUMP_VERSION, "surveys": documents}
+    if output == "msgpack":
+        import msgpack
+
+        return msgpack.packb(dump, default=_encode_value)
+    content = json.dumps(
+        dump, default=_encode_value, sort_keys=True, indent=2, ensure_ascii=False
+    )
+    return content.encode() + b"\n"
+
+
+def decode_dump(content, output="json"):
+    """
+    Returns the documents of a dump made by `encode_dump`
+    """
+    if output == "msgpack":
+        import msgpack
+
+        dump = msgpack.unpackb(content)
+    else:
+        dump = json.loads(content)
+    if dump.get("format") != DUMP_FORMAT or dump.get("version") != DUMP_VERSION:
+        raise ValueError(f"Not a version {DUMP_VERSION} surveys dump")
+    return dump["surveys"]
@@ -0,0 +1,75 @@
+"""
+Read-through cache of published survey structure
+Entries are keyed by survey id and `Survey.version`, which is bumped in the same transaction
+as every change to a survey's structure. A changed survey is therefore looked up under a
+new key and never served stale, and old entries simply expire
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Survey
+
+
+def _cache():
+    return caches[getattr(settings, "SURVEYS_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "SURVEYS_CACHE_TIMEOUT", 60 * 60)
+
+
+def survey_cache_key(kind, survey_id, version):
+    return f"surveys:{kind}:{survey_id}:{version}"
+
+
+def get_or_build(kind, survey, build):
+    """
+    Returns the cached `kind` entry for the current version of `survey`,
+    calling `build(survey)` and caching its result on a miss
+    """
+    key = survey_cache_key(kind, survey.pk, survey.version)
+    cache = _cache()
+    value = cache.get(key)
+    if value is None:
+        value = build(survey)
+        cache.set(key, value, _timeout())
+    return value
+
+
+def _build_tree(survey):
+    from .serializers import SurveySerializer
+
+    return SurveySerializer(Survey.objects.with_tree().get(pk=survey.pk)).data
+
+
+def _build_schema(survey):
+    from .validation import SurveySchema
+
+    return SurveySchema.load(survey.pk)
+
+
+def _build_dependency_graph(survey):
+    from .logic import DependencyGraph
+
+    return DependencyGraph.load(survey.pk)
+
+
+def get_survey_tree(survey):
+    """
+    Returns the `SurveySerializer` output for a Survey
+    """
+    return get_or_build("tree", survey, _build_tree)
+
+
+def get_survey_schema(survey):
+    """
+    Returns the `SurveySchema` used to validate submissions to a Survey
+    """
+    return get_or_build("schema", survey, _build_schema)
+
+
+def get_dependency_graph(survey):
+    """
+    Returns the compiled `DependencyGraph` of a Survey's conditional logic
+    """
+    return get_or_build("dependency_graph", survey, _build_dependency_graph)
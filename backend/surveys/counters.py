@@ -0,0 +1,172 @@
+"""
+Incrementally maintained response counters for results dashboards
+Every write path for answers reports what it added and removed here, so reading
+the results costs O(answer options) rows instead of counting all answers
+New and completed participations are also counted over time, see `surveys.rates`
+Writes that bypass these functions (eg queryset deletes) are reconciled by
+`manage.py rebuild_response_counts`
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import (
+    Answer,
+    AnswerOptionResponseCount,
+    ChoiceAnswer,
+    QuestionResponseCount,
+    SurveyParticipation,
+    SurveyResponseCount,
+)
+from .rates import record_response_rates
+
+
+def _count_answers(answers):
+    """
+    Takes (question_id, answer_option_id) pairs of one participation
+    Returns the per answer option and per question counts they contribute
+    """
+    options = Counter()
+    questions = Counter()
+    for question_id, answer_option_id in answers:
+        questions[question_id] = 1
+        if answer_option_id is not None:
+            options[answer_option_id] += 1
+    return options, questions
+
+
+def record_response_counts(survey_id, added=(), removed=(), participations=0, completed=0):
+    """
+    Updates the counters for one participation's answers
+    `added` and `removed` are (question_id, answer_option_id) pairs, so an edit can pass
+    both the old and the new answers and only the difference is written
+    """
+    added_options, added_questions = _count_answers(added)
+    removed_options, removed_questions = _count_answers(removed)
+    added_options.subtract(removed_options)
+    added_questions.subtract(removed_questions)
+    with transaction.atomic():
+        AnswerOptionResponseCount.objects.add(added_options)
+        QuestionResponseCount.objects.add(added_questions)
+        SurveyResponseCount.objects.add({survey_id: participations})
+        SurveyResponseCount.objects.add({survey_id: completed}, field="completed")
+        record_response_rates({survey_id: (participations, completed)})
+
+
+def record_new_participations(participations):
+    """
+    Updates the counters for many new participations at once
+    Takes (survey_id, answers, is_complete) per participation, where `answers` are its
+    (question_id, answer_option_id) pairs
+    """
+    options, questions = Counter(), Counter()
+    surveys, completed = Counter(), Counter()
+    for survey_id, answers, is_complete in participations:
+        participation_options, participation_questions = _count_answers(answers)
+        options.update(participation_options)
+        questions.update(participation_questions)
+        surveys[survey_id] += 1
+        completed[survey_id] += int(is_complete)
+    with transaction.atomic():
+        AnswerOptionResponseCount.objects.add(options)
+        QuestionResponseCount.objects.add(questions)
+        SurveyResponseCount.objects.add(surveys)
+        SurveyResponseCount.objects.add(completed, field="completed")
+        record_response_rates(
+            {survey_id: (surveys[survey_id], completed[survey_id]) for survey_id in surveys}
+        )
+
+
+def build_results(survey, participations, completed, question_counts, option_counts):
+    """
+    Returns results in the format of `survey_results`, from the participation counts and
+    {question id: count} and {answer option id: count} dicts
+    `survey` should come from `Survey.objects.with_tree()`
+    """
+    return {
+        "id": survey.id,
+        "participations": participations,
+        "completed": completed,
+        "questions": [
+            {
+                "id": question.id,
+                "question": question.question,
+                "question_type": question.question_type,
+                "responses": question_counts.get(question.id, 0),
+                "answer_options": [
+                    {
+                        "id": option.id,
+                        "text": option.text,
+                        "count": option_counts.get(option.id, 0),
+                    }
+                    for option in question.answer_options.all()
+                ],
+            }
+            for section in survey.sections.all()
+            for question in section.questions.all()
+        ],
+    }
+
+
+def survey_results(survey):
+    """
+    Returns the response counts of a Survey, for every question and answer option
+    `survey` should come from `Survey.objects.with_tree()`
+    """
+    option_counts = dict(
+        AnswerOptionResponseCount.objects.filter(
+            answer_option__question__section__survey=survey
+        ).values_list("answer_option_id", "count")
+    )
+    question_counts = dict(
+        QuestionResponseCount.objects.filter(
+            question__section__survey=survey
+        ).values_list("question_id", "count")
+    )
+    survey_count = SurveyResponseCount.objects.filter(survey=survey).first()
+    return build_results(
+        survey,
+        survey_count.count if survey_count else 0,
+        survey_count.completed if survey_count else 0,
+        question_counts,
+        option_counts,
+    )
+
+
+def rebuild_response_counts(surveys):
+    """
+    Recomputes all counters of the given Surveys (a queryset) from the stored answers
+    """
+    with transaction.atomic():
+        AnswerOptionResponseCount.objects.filter(
+            answer_option__question__section__survey__in=surveys
+        ).delete()
+        QuestionResponseCount.objects.filter(
+            question__section__survey__in=surveys
+        ).delete()
+        SurveyResponseCount.objects.filter(survey__in=surveys).delete()
+
+        choices = ChoiceAnswer.objects.filter(question__section__survey__in=surveys).order_by()
+        texts = Answer.objects.filter(question__section__survey__in=surveys).order_by()
+        AnswerOptionResponseCount.objects.bulk_create(
+            AnswerOptionResponseCount(answer_option_id=row["answer_option"], count=row["n"])
+            for row in choices.values("answer_option").annotate(n=Count("id"))
+        )
+        # a question is either answered with choices or with text, never both
+        QuestionResponseCount.objects.bulk_create(
+            QuestionResponseCount(question_id=row["question"], count=row["n"])
+            for answers in (choices, texts)
+            for row in answers.values("question").annotate(
+                n=Count("survey_participation", distinct=True)
+            )
+        )
+        SurveyResponseCount.objects.bulk_create(
+            SurveyResponseCount(
+                survey_id=row["survey"], count=row["n"], completed=row["completed"]
+            )
+            for row in SurveyParticipation.objects.filter(survey__in=surveys)
+            .order_by()
+            .values("survey")
+            .annotate(n=Count("id"), completed=Count("id", filter=Q(is_complete=True)))
+        )
@@ -0,0 +1,130 @@
+"""
+Streaming export of a Survey's responses, one row per SurveyParticipation
+Rows are produced from server-side cursors, so memory use doesn't grow with
+the number of responses
+"""
+import csv
+import json
+from itertools import groupby
+
+from .models import Answer, ChoiceAnswer, Question, SurveyParticipation
+
+EXPORT_CHUNK_SIZE = 2000
+
+PARTICIPATION_COLUMNS = [
+    "participation",
+    "user_account",
+    "user_session",
+    "is_complete",
+    "last_interaction",
+]
+
+
+class Echo:
+    """
+    A file-like object that returns what is written to it, for streaming csv.writer output
+    """
+
+    def write(self, value):
+        return value
+
+
+def get_export_questions(survey):
+    """
+    Returns (id, question, question_type) of all Questions of a Survey, in display order
+    """
+    return list(
+        Question.objects.filter(section__survey=survey)
+        .order_by("section__order", "order")
+        .values_list("id", "question", "question_type")
+    )
+
+
+def _grouped(queryset, chunk_size):
+    """
+    Yields (participation id, rows) of a queryset whose rows start with the participation id
+    and that is ordered by it
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    for participation_id, group in groupby(rows, key=lambda row: row[0]):
+        yield participation_id, [row[1:] for row in group]
+
+
+def iter_participations(
+    survey, chunk_size=EXPORT_CHUNK_SIZE, choice_value="answer_option__text"
+):
+    """
+    Yields (participation values, {question id: [answer values]}) per SurveyParticipation
+    Participations, choice answers and text answers are read from three cursors that are
+    all ordered by participation and merged as they go, so only one participation's
+    answers are held in memory at a time
+    Choice answers are given as their `choice_value` field, the answer option's text by
+    default
+    """
+    participations = (
+        SurveyParticipation.objects.filter(survey=survey)
+        .order_by("pk")
+        .values_list(
+            "id", "user_account_id", "user_session", "is_complete", "last_interaction"
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    answer_streams = [
+        _grouped(
+            ChoiceAnswer.objects.filter(survey_participation__survey=survey)
+            .order_by("survey_participation_id", "answer_option__order")
+            .values_list("survey_participation_id", "question_id", choice_value),
+            chunk_size,
+        ),
+        _grouped(
+            Answer.objects.filter(survey_participation__survey=survey)
+            .order_by("survey_participation_id")
+            .values_list("survey_participation_id", "question_id", "answer_text"),
+            chunk_size,
+        ),
+    ]
+    # the next (participation id, rows) group of each answer stream
+    pending = [next(stream, None) for stream in answer_streams]
+    for participation in participations:
+        answers = {}
+        for index, stream in enumerate(answer_streams):
+            # answers are only ever stored for existing participations, and come in the
+            # same order, so a group either belongs to this participation or a later one
+            group = pending[index]
+            if group is not None and group[0] == participation[0]:
+                for question_id, value in group[1]:
+                    answers.setdefault(question_id, []).append(value)
+                pending[index] = next(stream, None)
+        yield participation, answers
+
+
+def iter_csv(survey, chunk_size=EXPORT_CHUNK_SIZE):
+    questions = get_export_questions(survey)
+    writer = csv.writer(Echo())
+    yield writer.writerow(PARTICIPATION_COLUMNS + [question for _, question, _ in questions])
+    for participation, answers in iter_participations(survey, chunk_size):
+        yield writer.writerow(
+            [*participation[:4], participation[4].isoformat()]
+            + ["; ".join(answers.get(question_id, [])) for question_id, _, _ in questions]
+        )
+
+
+def iter_ndjson(survey, chunk_size=EXPORT_CHUNK_SIZE):
+    questions = get_export_questions(survey)
+    for participation, answers in iter_participations(survey, chunk_size):
+        row = dict(zip(PARTICIPATION_COLUMNS, participation))
+        row["answers"] = {}
+        for question_id, _, question_type in questions:
+            values = answers.get(question_id)
+            if values is None:
+                continue
+            if question_type != Question.QuestionType.MULTIPLE_CHOICE_MULTI:
+                values = values[0]
+            row["answers"][str(question_id)] = values
+        yield json.dumps(row, default=str) + "\n"
+
+
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv"),
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+}
@@ -0,0 +1,261 @@
+"""
+Write-behind ingestion of submissions, enabled with SURVEYS_INGESTION_QUEUE
+The submission endpoint validates a submission and only appends it to the
+QueuedSubmission table, and `manage.py drain_submissions` writes the queue in batches
+Each queued submission has an idempotency key, scoped to the Survey and respondent: a
+retried request with the same key is queued once, and a queued submission is marked
+processed in the same transaction that writes it, so an interrupted drain never writes
+it twice. Submissions are validated again when drained, and the ones that don't fit the
+survey anymore (eg an answer option was deleted) are marked processed with an error
+"""
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import get_survey_schema
+from .counters import record_new_participations
+from .logic import DependencyCycleError
+from .models import Answer, ChoiceAnswer, QueuedSubmission, SurveyParticipation
+from .submissions import check_accepts_response, split_answers, store_participation
+
+# keeps `pk IN (...)` below SQLite's limit on query parameters
+MARK_BATCH_SIZE = 900
+ERROR_LENGTH = QueuedSubmission._meta.get_field("error").max_length
+
+
+def is_enabled():
+    return getattr(settings, "SURVEYS_INGESTION_QUEUE", False)
+
+
+def _answers_to_json(answers):
+    return [
+        {
+            "question": str(answer["question"]),
+            "answer_option": (
+                str(answer["answer_option"]) if answer.get("answer_option") else None
+            ),
+            "answer_text": answer.get("answer_text", ""),
+        }
+        for answer in answers
+    ]
+
+
+def _answers_from_json(answers):
+    return [
+        {
+            "question": uuid.UUID(answer["question"]),
+            "answer_option": (
+                uuid.UUID(answer["answer_option"]) if answer["answer_option"] else None
+            ),
+            "answer_text": answer["answer_text"],
+        }
+        for answer in answers
+    ]
+
+
+class IdempotencyKeyReused(Exception):
+    """
+    Raised when a respondent queues a different submission under a key they used before
+    """
+
+
+def enqueue_submission(
+    survey, answers, user=None, session_key=None, is_complete=True, idempotency_key=None
+):
+    """
+    Queues a validated submission, after the same checks as `submit_participation`
+    Returns its idempotency key, which is generated if none is given
+    Keys are scoped to the Survey and respondent. A key the respondent queued before is
+    not queued again, and raises IdempotencyKeyReused if the submission differs
+    """
+    check_accepts_response(survey, user)
+    idempotency_key = idempotency_key or uuid.uuid4().hex
+    submission = QueuedSubmission(
+        idempotency_key=idempotency_key,
+        survey=survey,
+        user_account=user,
+        user_session=session_key if user is None else None,
+        is_complete=is_complete,
+        answers=_answers_to_json(answers),
+    )
+    QueuedSubmission.objects.bulk_create([submission], ignore_conflicts=True)
+    # either the row just inserted, or the one queued earlier under the same key
+    queued = QueuedSubmission.objects.filter(
+        survey=survey,
+        user_account=user,
+        user_session=submission.user_session,
+        idempotency_key=idempotency_key,
+    ).values_list("is_complete", "answers")
+    if list(queued) != [(submission.is_complete, submission.answers)]:
+        raise IdempotencyKeyReused(
+            "This Idempotency-Key was already used for a different submission."
+        )
+    return idempotency_key
+
+
+def _check_current(entries):
+    """
+    Validates queued submissions again against the current version of their Survey,
+    which may have changed since they were queued (eg an answer option was deleted)
+    Returns the valid ones, the others get their `error` set and are not written
+    """
+    schemas, valid = {}, []
+    for entry in entries:
+        if entry.survey_id not in schemas:
+            try:
+                schemas[entry.survey_id] = get_survey_schema(entry.survey)
+            except DependencyCycleError as exc:
+                schemas[entry.survey_id] = exc
+        schema = schemas[entry.survey_id]
+        if isinstance(schema, DependencyCycleError):
+            errors = schema.messages
+        else:
+            errors = schema.validate(_answers_from_json(entry.answers), entry.is_complete)
+        if errors:
+            entry.error = "; ".join(errors)[:ERROR_LENGTH]
+            QueuedSubmission.objects.filter(pk=entry.pk).update(error=entry.error)
+        else:
+            valid.append(entry)
+    return valid
+
+
+def _partition(entries):
+    """
+    Splits queued submissions into new participations, which can be bulk inserted,
+    and repeated responses to single-response surveys, which replace an earlier
+    participation and go through `store_participation` one at a time
+    """
+    single = [entry for entry in entries if entry.survey.limit_one_response_per_user]
+    seen = set()
+    if single:
+        seen.update(
+            SurveyParticipation.objects.filter(
+                is_single_response=True,
+                survey_id__in={entry.survey_id for entry in single},
+            )
+            .filter(
+                Q(user_account_id__in={e.user_account_id for e in single if e.user_account_id})
+                | Q(user_session__in={e.user_session for e in single if e.user_session})
+            )
+            .values_list("survey_id", "user_account_id", "user_session")
+        )
+    new, repeated = [], []
+    for entry in entries:
+        respondent = (entry.survey_id, entry.user_account_id, entry.user_session)
+        if not entry.survey.limit_one_response_per_user or respondent not in seen:
+            seen.add(respondent)
+            new.append(entry)
+        else:
+            repeated.append(entry)
+    return new, repeated
+
+
+def _write_new(entries):
+    participations, choices, texts, counts = [], [], [], []
+    for entry in entries:
+        participation = SurveyParticipation(
+            survey_id=entry.survey_id,
+            is_complete=entry.is_complete,
+            is_single_response=entry.survey.limit_one_response_per_user,
+            user_account_id=entry.user_account_id,
+            user_session=entry.user_session,
+        )
+        participations.append(participation)
+        entry_choices, entry_texts = split_answers(_answers_from_json(entry.answers))
+        choices.extend(
+            ChoiceAnswer(
+                survey_participation_id=participation.pk,
+                question_id=answer["question"],
+                answer_option_id=answer["answer_option"],
+            )
+            for answer in entry_choices
+        )
+        texts.extend(
+            Answer(
+                survey_participation_id=participation.pk,
+                question_id=answer["question"],
+                answer_text=answer["answer_text"],
+            )
+            for answer in entry_texts
+        )
+        keys = [
+            *((answer["question"], answer["answer_option"]) for answer in entry_choices),
+            *((answer["question"], None) for answer in entry_texts),
+        ]
+        counts.append((entry.survey_id, keys, entry.is_complete))
+    SurveyParticipation.objects.bulk_create(participations)
+    ChoiceAnswer.objects.bulk_create(choices, touch=False)
+    Answer.objects.bulk_create(texts, touch=False)
+    record_new_participations(counts)
+
+
+def drain_batch(batch_size=500):
+    """
+    Writes up to `batch_size` pending queued submissions, oldest first, in one transaction
+    Returns how many were processed
+    """
+    with transaction.atomic():
+        entries = list(
+            QueuedSubmission.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("survey", "user_account")
+            .filter(processed__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        if not entries:
+            return 0
+        valid = _check_current(entries)
+        new, repeated = _partition(valid)
+        try:
+            with transaction.atomic():
+                _write_new(new)
+        except IntegrityError:
+            # a respondent answered through the synchronous endpoint in the meantime,
+            # write this batch one submission at a time instead
+            new, repeated = [], valid
+        for entry in repeated:
+            try:
+                with transaction.atomic():
+                    store_participation(
+                        entry.survey,
+                        _answers_from_json(entry.answers),
+                        user=entry.user_account,
+                        session_key=entry.user_session,
+                        is_complete=entry.is_complete,
+                    )
+            except PermissionDenied as exc:
+                entry.error = str(exc)
+                QueuedSubmission.objects.filter(pk=entry.pk).update(error=entry.error)
+        now = timezone.now()
+        pks = [entry.pk for entry in entries]
+        for start in range(0, len(pks), MARK_BATCH_SIZE):
+            QueuedSubmission.objects.filter(pk__in=pks[start : start + MARK_BATCH_SIZE]).update(
+                processed=now
+            )
+    return len(entries)
+
+
+def drain_queue(batch_size=500):
+    """
+    Writes all pending queued submissions, and returns how many were processed
+    """
+    processed = 0
+    while True:
+        count = drain_batch(batch_size)
+        if not count:
+            return processed
+        processed += count
+
+
+def purge_processed(older_than):
+    """
+    Deletes queued submissions processed more than `older_than` (a timedelta) ago,
+    after which their idempotency keys can be queued again
+    """
+    deleted, _ = QueuedSubmission.objects.filter(
+        processed__lt=timezone.now() - older_than
+    ).delete()
+    return deleted
@@ -0,0 +1,98 @@
+"""
+Keyset pagination of a Survey's SurveyParticipations, ordered by (last_interaction, id)
+A page continues after the last row of the previous one (`WHERE (last_interaction, id) >
+cursor`) instead of skipping rows with OFFSET, so with the matching indexes on
+SurveyParticipation every page costs the same, however deep it is
+Participations are touched when they are edited, so an edited one moves to the end of
+the listing, and can be seen twice by someone paging through it at that moment
+"""
+import base64
+import json
+import uuid
+
+from django.db.models import Prefetch, Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Answer, ChoiceAnswer, SurveyParticipation
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(participation):
+    """
+    Returns the opaque cursor of the page that starts after `participation`
+    """
+    position = [participation.last_interaction.isoformat(), str(participation.pk)]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Returns (last_interaction, id) of a cursor made by `encode_cursor`, raises
+    ValueError for anything else
+    """
+    try:
+        last_interaction, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        last_interaction = parse_datetime(last_interaction)
+        # the id is compared with `pk__gt`, which would only fail at query time
+        pk = uuid.UUID(pk) if isinstance(pk, str) else None
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if last_interaction is None or pk is None:
+        raise ValueError("Invalid cursor")
+    return last_interaction, pk
+
+
+def filter_participations(survey, cursor=None, is_complete=None, since=None, until=None):
+    """
+    Returns a Survey's SurveyParticipations after `cursor`, ordered by
+    (last_interaction, id)
+    `is_complete`, `since` and `until` (inclusive, on last_interaction) filter them
+    """
+    participations = SurveyParticipation.objects.filter(survey=survey)
+    if is_complete is not None:
+        # `is_complete=...` is rendered as a bare `WHERE is_complete`, which SQLite can't
+        # match to the column of surveys_part_complete_idx, unlike `IN`
+        participations = participations.filter(is_complete__in=[is_complete])
+    if since is not None:
+        participations = participations.filter(last_interaction__gte=since)
+    if until is not None:
+        participations = participations.filter(last_interaction__lte=until)
+    if cursor is not None:
+        last_interaction, pk = decode_cursor(cursor)
+        # (last_interaction, id) > cursor, the first condition alone lets the index seek
+        # to the cursor, where the OR doesn't
+        participations = participations.filter(last_interaction__gte=last_interaction).filter(
+            Q(last_interaction__gt=last_interaction) | Q(pk__gt=pk)
+        )
+    return participations.order_by("last_interaction", "pk")
+
+
+def participation_page(
+    survey, cursor=None, page_size=DEFAULT_PAGE_SIZE, include_answers=False, **filters
+):
+    """
+    Returns (participations, next cursor) of one page of a Survey's SurveyParticipations,
+    the next cursor is None on the last page
+    `filters` are those of `filter_participations`, `include_answers` prefetches the
+    choice and text answers of the page, with one query each
+    """
+    participations = filter_participations(survey, cursor, **filters)
+    if include_answers:
+        participations = participations.prefetch_related(
+            Prefetch(
+                "choice_answers",
+                queryset=ChoiceAnswer.objects.order_by("question_id", "answer_option_id"),
+            ),
+            Prefetch(
+                "answers_of_survey_participation",
+                queryset=Answer.objects.order_by("question_id"),
+            ),
+        )
+    # one row more than the page tells whether there is a next page, without a COUNT
+    page = list(participations[: page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, encode_cursor(page[-1])
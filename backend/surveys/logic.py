@@ -0,0 +1,163 @@
+"""
+Conditional logic: which questions are shown, depending on the answers given so far
+A Question depends on at most one parent question, either on a specific answer option
+of it (`dependency_answer_option`) or on it being answered at all (`dependency_question`)
+"""
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .models import AnswerOption, Question
+
+
+class DependencyCycleError(ValidationError):
+    pass
+
+
+class DependencyGraph:
+    """
+    The dependencies of one Survey's questions, compiled into a topologically sorted list
+    so that visibility can be evaluated in a single pass
+    """
+
+    def __init__(self, questions, answer_options):
+        """
+        `questions` are dicts with `id`, `is_required`, `dependency_question` and
+        `dependency_answer_option`, `answer_options` are dicts with `id` and `question`
+        """
+        self.option_question = {a["id"]: a["question"] for a in answer_options}
+        question_ids = [q["id"] for q in questions]
+        known = set(question_ids)
+        # question id => (parent question id, answer option id or None)
+        self.parents = {}
+        self.required = set()
+        children = {}
+        for q in questions:
+            if q["is_required"]:
+                self.required.add(q["id"])
+            option = q["dependency_answer_option"]
+            parent = self.option_question.get(option, q["dependency_question"])
+            # dependencies outside of the survey are ignored, see `check_dependency`
+            if parent in known:
+                self.parents[q["id"]] = (parent, option)
+                children.setdefault(parent, []).append(q["id"])
+
+        # Kahn's algorithm, every question has at most one parent so the
+        # questions without one are the only starting points
+        self.order = [q for q in question_ids if q not in self.parents]
+        for question in self.order:
+            self.order.extend(children.get(question, []))
+        if len(self.order) != len(question_ids):
+            cyclic = known - set(self.order)
+            raise DependencyCycleError(
+                f"Questions {', '.join(sorted(map(str, cyclic)))} depend on each other in a cycle"
+            )
+
+    @classmethod
+    def load(cls, survey_id):
+        questions = Question.objects.filter(section__survey_id=survey_id).values(
+            "id", "is_required", "dependency_question", "dependency_answer_option"
+        )
+        answer_options = AnswerOption.objects.filter(
+            question__section__survey_id=survey_id
+        ).values("id", "question")
+        return cls(list(questions), list(answer_options))
+
+    def visible(self, chosen_options, answered_questions=()):
+        """
+        Returns the set of visible question ids, given the chosen answer option ids and
+        the ids of any other answered (eg text) questions
+        """
+        answered = set(answered_questions)
+        for option in chosen_options:
+            question = self.option_question.get(option)
+            if question is not None:
+                answered.add(question)
+        visible = set()
+        for question in self.order:
+            dependency = self.parents.get(question)
+            if dependency is None:
+                visible.add(question)
+                continue
+            parent, option = dependency
+            if parent in visible and (
+                option in chosen_options if option is not None else parent in answered
+            ):
+                visible.add(question)
+        return visible
+
+    def required_questions(self, chosen_options, answered_questions=()):
+        """
+        Returns the set of question ids that are visible and have to be answered
+        """
+        return self.visible(chosen_options, answered_questions) & self.required
+
+
+def check_dependency(question):
+    """
+    Raises a ValidationError if a Question's dependency points outside of its Survey,
+    at an answer option of a different question, or would create a cycle
+    Called whenever a Question with a dependency is saved
+    """
+    parent = question.dependency_question_id
+    if question.dependency_answer_option_id is not None:
+        option_question = (
+            AnswerOption.objects.filter(pk=question.dependency_answer_option_id)
+            .values_list("question_id", flat=True)
+            .first()
+        )
+        if parent is not None and parent != option_question:
+            raise ValidationError(
+                "The answer option dependency has to belong to the question dependency."
+            )
+        parent = option_question
+
+    survey_id = None
+    seen = {question.pk}
+    while parent is not None:
+        if parent in seen:
+            raise DependencyCycleError(
+                f"Question {question.pk} would depend on itself through question {parent}."
+            )
+        seen.add(parent)
+        row = (
+            Question.objects.filter(pk=parent)
+            .values_list(
+                "section__survey_id",
+                "dependency_question_id",
+                "dependency_answer_option__question_id",
+            )
+            .first()
+        )
+        if row is None:
+            break
+        parent_survey, dependency_question, dependency_option_question = row
+        if survey_id is None:
+            survey_id = parent_survey
+            own_survey = (
+                question.section.survey_id if question.section_id is not None else None
+            )
+            if own_survey != survey_id:
+                raise ValidationError("A question can only depend on questions of its own survey.")
+        parent = dependency_option_question or dependency_question
+
+
+def check_moved_questions(questions):
+    """
+    Runs `check_dependency` on the dependencies of `questions` (ids or a queryset of
+    them) and of every question depending on them
+    Saving a Question only checks its own dependency, so this is called when questions,
+    or the sections and answer options they depend through, move to another parent
+    """
+    affected = (
+        Question.objects.filter(
+            Q(pk__in=questions)
+            | Q(dependency_question__in=questions)
+            | Q(dependency_answer_option__question__in=questions)
+        )
+        .filter(
+            Q(dependency_question__isnull=False) | Q(dependency_answer_option__isnull=False)
+        )
+        .select_related("section")
+    )
+    for question in affected:
+        check_dependency(question)
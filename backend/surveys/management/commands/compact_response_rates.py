@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from surveys.rates import KEEP_HOURS, KEEP_MINUTES, compact_response_rates
+
+
+class Command(BaseCommand):
+    help = (
+        "Merges old per-minute response rate buckets into hours, and old hours into days, "
+        "so response rate charts stay cheap to read"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-minutes",
+            type=float,
+            default=KEEP_MINUTES / timedelta(hours=1),
+            help="Hours to keep per-minute buckets for (default: 24)",
+        )
+        parser.add_argument(
+            "--keep-hours",
+            type=float,
+            default=KEEP_HOURS / timedelta(days=1),
+            help="Days to keep per-hour buckets for (default: 30)",
+        )
+
+    def handle(self, *args, **options):
+        merged = compact_response_rates(
+            keep_minutes=timedelta(hours=options["keep_minutes"]),
+            keep_hours=timedelta(days=options["keep_hours"]),
+        )
+        self.stdout.write(f"Merged {merged} bucket(s)")
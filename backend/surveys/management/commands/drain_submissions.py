@@ -0,0 +1,46 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from surveys.ingestion import drain_queue, purge_processed
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes submissions queued by the submission endpoint in batches "
+        "(see SURVEYS_INGESTION_QUEUE)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep draining the queue until interrupted",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between drains with --watch",
+        )
+        parser.add_argument(
+            "--keep-hours",
+            type=float,
+            default=24,
+            help="How long processed submissions (and their idempotency keys) are kept",
+        )
+
+    def handle(self, *args, **options):
+        keep = timedelta(hours=options["keep_hours"])
+        while True:
+            processed = drain_queue(options["batch_size"])
+            purged = purge_processed(keep)
+            if processed or purged or not options["watch"]:
+                self.stdout.write(
+                    f"Processed {processed} submission(s), purged {purged} old one(s)"
+                )
+            if not options["watch"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from surveys.authoring import encode_dump, survey_to_document
+from surveys.models import Survey
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the structure of surveys (not their responses) as a canonical JSON "
+        "or msgpack dump, for load_surveys"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "survey_ids", nargs="*", help="Surveys to dump (default: all surveys)"
+        )
+        parser.add_argument("-o", "--output", help="File to write (default: stdout)")
+        parser.add_argument("--format", choices=["json", "msgpack"], default="json")
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.with_tree().order_by("creation_date", "id")
+        if options["survey_ids"]:
+            surveys = surveys.filter(pk__in=options["survey_ids"])
+        documents = [survey_to_document(survey) for survey in surveys]
+        try:
+            content = encode_dump(documents, options["format"])
+        except ImportError:
+            raise CommandError("msgpack is not installed")
+        if options["output"]:
+            with open(options["output"], "wb") as file:
+                file.write(content)
+            self.stderr.write(f"Dumped {len(documents)} survey(s)")
+        elif options["format"] == "json":
+            self.stdout.write(content.decode(), ending="")
+        else:
+            sys.stdout.buffer.write(content)
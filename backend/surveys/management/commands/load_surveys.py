@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from surveys.authoring import create_surveys_from_documents, decode_dump
+from surveys.serializers import SurveyDocumentSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the surveys of a dump_surveys dump, with fresh ids, using bulk inserts "
+        "(all or nothing)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Dump to load")
+        parser.add_argument(
+            "--creator", required=True, help="Email of the user who will own the surveys"
+        )
+        parser.add_argument(
+            "--format",
+            choices=["json", "msgpack"],
+            help="Format of the dump (default: msgpack for .msgpack files, otherwise json)",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            creator = User.objects.get_by_natural_key(options["creator"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['creator']}")
+        output = options["format"] or (
+            "msgpack" if options["path"].endswith(".msgpack") else "json"
+        )
+        with open(options["path"], "rb") as file:
+            content = file.read()
+        try:
+            documents = decode_dump(content, output)
+        except ImportError:
+            raise CommandError("msgpack is not installed")
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        validated = []
+        for index, document in enumerate(documents):
+            serializer = SurveyDocumentSerializer(data=document)
+            if not serializer.is_valid():
+                raise CommandError(f"Survey {index} is invalid: {serializer.errors}")
+            validated.append(serializer.validated_data)
+
+        batch_size = options["batch_size"]
+        with transaction.atomic():
+            for start in range(0, len(validated), batch_size):
+                create_surveys_from_documents(creator, validated[start : start + batch_size])
+        self.stdout.write(f"Loaded {len(validated)} survey(s)")
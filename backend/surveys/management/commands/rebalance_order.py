@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from surveys.models import AnswerOption, OrderedManager, Question, SurveySection
+
+
+class Command(BaseCommand):
+    help = (
+        "Respaces the orders of sections, questions and answer options that are running "
+        "out of room for sparse ordering (see SURVEYS_SPARSE_ORDERING)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-gap",
+            type=int,
+            default=2,
+            help="Rebalance parents where two neighbours are closer than this",
+        )
+
+    def handle(self, *args, **options):
+        if not OrderedManager._is_sparse():
+            raise CommandError("SURVEYS_SPARSE_ORDERING is turned off")
+        for model in (SurveySection, Question, AnswerOption):
+            manager = model.objects
+            parents = self.find_crowded_parents(manager, options["min_gap"])
+            for parent in parents:
+                manager.rebalance(parent)
+            self.stdout.write(
+                f"{model.__name__}: rebalanced {len(parents)} parent(s)"
+            )
+
+    @staticmethod
+    def find_crowded_parents(manager, min_gap):
+        """
+        Streams (parent, order) pairs in order and returns the parents that have
+        two neighbours less than `min_gap` apart
+        """
+        crowded = set()
+        previous_parent, previous_order = None, None
+        rows = (
+            manager.order_by(manager.parent_field, "order")
+            .values_list(manager.parent_field, "order")
+            .iterator()
+        )
+        for parent, order in rows:
+            if parent in crowded:
+                continue
+            if parent != previous_parent:
+                previous_parent, previous_order = parent, 0
+            if order is None or order - previous_order < min_gap:
+                crowded.add(parent)
+            previous_order = order
+        return crowded
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from surveys.counters import rebuild_response_counts
+from surveys.models import Survey
+
+
+class Command(BaseCommand):
+    help = "Recomputes the response counters of surveys from their answers, fixing any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "survey_ids", nargs="*", help="Surveys to rebuild (default: all surveys)"
+        )
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.all()
+        if options["survey_ids"]:
+            surveys = surveys.filter(pk__in=options["survey_ids"])
+        rebuild_response_counts(surveys)
+        self.stdout.write(f"Rebuilt response counts of {surveys.count()} survey(s)")
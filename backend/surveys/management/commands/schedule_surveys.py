@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from surveys.scheduling import close_due_surveys, open_due_surveys
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens surveys whose start date has passed (warming their cache) and closes "
+        "surveys whose end date has passed (snapshotting their responses). Run it from "
+        "cron, or with --watch as a worker"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep scheduling until interrupted",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=10.0,
+            help="Seconds to wait between runs with --watch, surveys open and close up "
+            "to this late",
+        )
+        parser.add_argument(
+            "--no-snapshots",
+            action="store_false",
+            dest="snapshots",
+            help="Don't snapshot the responses of closed surveys",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            opened = open_due_surveys()
+            closed = close_due_surveys(snapshot=options["snapshots"])
+            if opened or closed or not options["watch"]:
+                self.stdout.write(f"Opened {len(opened)} survey(s), closed {len(closed)}")
+            if not options["watch"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from surveys.snapshots import closed_surveys, load_snapshot, write_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes columnar snapshots of the responses of closed surveys, which their "
+        "results and analytics are then served from"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "survey_ids",
+            nargs="*",
+            help="Surveys to snapshot (default: all closed surveys without a current snapshot, "
+            "skipping those with queued submissions still to be written)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rewrite snapshots that are current, eg after responses were deleted",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            raise CommandError("numpy is not installed")
+        surveys = closed_surveys().with_tree().order_by("survey_end_date", "id")
+        if options["survey_ids"]:
+            surveys = surveys.filter(pk__in=options["survey_ids"])
+            not_closed = len(set(options["survey_ids"])) - surveys.count()
+            if not_closed:
+                self.stderr.write(f"Skipping {not_closed} survey(s) that are not closed")
+        written = 0
+        for survey in surveys:
+            if not options["force"] and load_snapshot(survey) is not None:
+                continue
+            count = write_snapshot(survey)
+            written += 1
+            self.stdout.write(f"Snapshot of {survey.pk}: {count} participation(s)")
+        self.stdout.write(f"Wrote {written} snapshot(s)")
@@ -0,0 +1,24 @@
+from django.utils.deprecation import MiddlewareMixin
+
+from .replicas import pin_to_primary
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+
+class ReplicaPinningMiddleware(MiddlewareMixin):
+    """
+    Pins users to the primary database for a few seconds after each successful write
+    request, so that their next analytics reads see it (see `surveys.replicas`)
+    Runs on the response, after DRF has authenticated the user (by session or JWT)
+    """
+
+    def process_response(self, request, response):
+        user = getattr(request, "user", None)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            pin_to_primary(user)
+        return response
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('surveys', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='answer',
+            name='answer_boolean',
+            field=models.BooleanField(blank=True, default=None, null=True, verbose_name='Answer Boolean'),
+        ),
+        migrations.AlterField(
+            model_name='answer',
+            name='answer_text',
+            field=models.CharField(blank=True, default='', max_length=1000, verbose_name='Answer Text'),
+        ),
+        migrations.AlterField(
+            model_name='surveyparticipation',
+            name='user_account',
+            field=models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='survey_participations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='surveyparticipation',
+            name='user_session',
+            field=models.CharField(blank=True, default=None, max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0003_answer_write_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerOptionResponseCount',
+            fields=[
+                ('answer_option', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='response_count', serialize=False, to='surveys.answeroption')),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuestionResponseCount',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='response_count', serialize=False, to='surveys.question')),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SurveyResponseCount',
+            fields=[
+                ('survey', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='response_count', serialize=False, to='surveys.survey')),
+                ('count', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
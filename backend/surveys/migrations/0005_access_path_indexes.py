@@ -0,0 +1,80 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:12
+
+from django.db import migrations, models
+
+
+def flag_single_responses(apps, schema_editor):
+    """
+    Marks the latest participation of each respondent on surveys limited to one
+    response per user, older duplicates stay unflagged so the constraint can be added
+    """
+    SurveyParticipation = apps.get_model("surveys", "SurveyParticipation")
+    seen = set()
+    flagged = []
+    participations = (
+        SurveyParticipation.objects.filter(survey__limit_one_response_per_user=True)
+        .order_by("-last_interaction")
+        .values_list("pk", "survey_id", "user_account_id", "user_session")
+        .iterator()
+    )
+    for pk, survey_id, user_account_id, user_session in participations:
+        respondent = (survey_id, user_account_id, user_session)
+        if respondent not in seen:
+            seen.add(respondent)
+            flagged.append(pk)
+    for start in range(0, len(flagged), 900):
+        SurveyParticipation.objects.filter(pk__in=flagged[start : start + 900]).update(
+            is_single_response=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0004_response_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surveyparticipation',
+            name='is_single_response',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(flag_single_responses, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', 'answer_option'], name='surveys_answer_option_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answeroption',
+            index=models.Index(fields=['question', 'order'], name='surveys_option_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['section', 'order'], name='surveys_question_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surveyparticipation',
+            index=models.Index(fields=['survey', 'user_account'], name='surveys_part_account_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surveyparticipation',
+            index=models.Index(fields=['survey', 'user_session'], name='surveys_part_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surveysection',
+            index=models.Index(fields=['survey', 'order'], name='surveys_section_order_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='answer',
+            constraint=models.UniqueConstraint(fields=('survey_participation', 'question', 'answer_option'), name='surveys_answer_unique_option'),
+        ),
+        migrations.AddConstraint(
+            model_name='surveyparticipation',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_single_response', True), ('user_account__isnull', False)), fields=('survey', 'user_account'), name='surveys_participation_single_account'),
+        ),
+        migrations.AddConstraint(
+            model_name='surveyparticipation',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_single_response', True), ('user_session__isnull', False)), fields=('survey', 'user_session'), name='surveys_participation_single_session'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_choice_answers(apps, schema_editor):
+    """
+    Copies every Answer that picked an answer option into ChoiceAnswer, and deletes it
+    from Answer, which only keeps text answers from now on
+    """
+    Answer = apps.get_model("surveys", "Answer")
+    ChoiceAnswer = apps.get_model("surveys", "ChoiceAnswer")
+    choices = Answer.objects.filter(answer_option__isnull=False)
+    batch = []
+    for survey_participation_id, question_id, answer_option_id in choices.values_list(
+        "survey_participation_id", "question_id", "answer_option_id"
+    ).iterator():
+        batch.append(
+            ChoiceAnswer(
+                survey_participation_id=survey_participation_id,
+                question_id=question_id,
+                answer_option_id=answer_option_id,
+            )
+        )
+        if len(batch) >= 1000:
+            ChoiceAnswer.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    ChoiceAnswer.objects.bulk_create(batch, ignore_conflicts=True)
+    choices.delete()
+
+
+def move_choice_answers_back(apps, schema_editor):
+    Answer = apps.get_model("surveys", "Answer")
+    ChoiceAnswer = apps.get_model("surveys", "ChoiceAnswer")
+    Answer.objects.bulk_create(
+        (
+            Answer(
+                survey_participation_id=choice.survey_participation_id,
+                question_id=choice.question_id,
+                answer_option_id=choice.answer_option_id,
+            )
+            for choice in ChoiceAnswer.objects.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0007_modified_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChoiceAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer_option', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='choice_answers', to='surveys.answeroption')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='choice_answers', to='surveys.question')),
+                ('survey_participation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='choice_answers', to='surveys.surveyparticipation')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='choiceanswer',
+            index=models.Index(fields=['question', 'answer_option'], name='surveys_choice_option_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='choiceanswer',
+            constraint=models.UniqueConstraint(fields=('survey_participation', 'answer_option'), name='surveys_choice_unique_option'),
+        ),
+        migrations.RunPython(move_choice_answers, move_choice_answers_back),
+        migrations.RemoveConstraint(
+            model_name='answer',
+            name='surveys_answer_unique_option',
+        ),
+        migrations.RemoveIndex(
+            model_name='answer',
+            name='surveys_answer_option_idx',
+        ),
+        migrations.RemoveField(
+            model_name='answer',
+            name='answer_option',
+        ),
+        migrations.AddConstraint(
+            model_name='answer',
+            constraint=models.UniqueConstraint(fields=('survey_participation', 'question'), name='surveys_answer_unique_question'),
+        ),
+    ]
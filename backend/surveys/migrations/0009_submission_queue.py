@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('surveys', '0008_choice_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedSubmission',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('idempotency_key', models.CharField(max_length=100, unique=True)),
+                ('user_session', models.CharField(blank=True, default=None, max_length=100, null=True)),
+                ('is_complete', models.BooleanField(default=True)),
+                ('answers', models.JSONField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('processed', models.DateTimeField(blank=True, default=None, null=True)),
+                ('error', models.CharField(blank=True, default='', max_length=1000)),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_submissions', to='surveys.survey')),
+                ('user_account', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='queued_submissions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='queuedsubmission',
+            index=models.Index(condition=models.Q(('processed__isnull', True)), fields=['id'], name='surveys_queue_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queuedsubmission',
+            index=models.Index(fields=['processed'], name='surveys_queue_processed_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0009_submission_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='survey',
+            name='is_template',
+            field=models.BooleanField(default=False, verbose_name='Is Template'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0010_survey_templates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='surveyparticipation',
+            index=models.Index(fields=['survey', 'last_interaction', 'id'], name='surveys_part_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surveyparticipation',
+            index=models.Index(fields=['survey', 'is_complete', 'last_interaction', 'id'], name='surveys_part_complete_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0011_participation_listing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseRateBucket',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('granularity', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('start', models.DateTimeField()),
+                ('started', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('survey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='response_rates', to='surveys.survey')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='responseratebucket',
+            index=models.Index(fields=['granularity', 'start'], name='surveys_rate_compact_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='responseratebucket',
+            constraint=models.UniqueConstraint(fields=('survey', 'granularity', 'start'), name='surveys_rate_bucket_unique'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:00
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def compute_is_open(apps, schema_editor):
+    Survey = apps.get_model("surveys", "Survey")
+    now = timezone.now()
+    Survey.objects.filter(
+        Q(survey_end_date__isnull=True) | Q(survey_end_date__gt=now),
+        is_active=True,
+        survey_start_date__lte=now,
+    ).update(is_open=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0012_response_rates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='survey',
+            name='is_open',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Is Open'),
+        ),
+        migrations.RunPython(compute_is_open, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_open', False)), fields=['survey_end_date', 'survey_start_date'], name='surveys_survey_opening_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(condition=models.Q(('is_open', True)), fields=['survey_end_date'], name='surveys_survey_closing_idx'),
+        ),
+    ]
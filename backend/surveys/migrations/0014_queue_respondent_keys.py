@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0013_survey_is_open'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='queuedsubmission',
+            name='idempotency_key',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='queuedsubmission',
+            constraint=models.UniqueConstraint(condition=models.Q(('user_account__isnull', False)), fields=('survey', 'user_account', 'idempotency_key'), name='surveys_queue_unique_account_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='queuedsubmission',
+            constraint=models.UniqueConstraint(condition=models.Q(('user_account__isnull', True)), fields=('survey', 'user_session', 'idempotency_key'), name='surveys_queue_unique_session_key'),
+        ),
+    ]
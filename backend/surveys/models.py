@@ -1,14 +1,38 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models, transaction
-from django.db.models import F, Max
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, models, transaction
+from django.db.models import F, Max, Prefetch, Window
+from django.db.models.functions import RowNumber
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import uuid
 from django.conf import settings
 
 
+class SurveyQuerySet(models.QuerySet):
+    def with_tree(self):
+        """
+        Prefetches the whole Survey -> SurveySection -> Question -> AnswerOption tree,
+        each level in its display order
+        This costs one query per level, no matter how many sections, questions or
+        answer options a Survey has
+        """
+        answer_options = AnswerOption.objects.order_by("order")
+        questions = Question.objects.order_by("order").prefetch_related(
+            Prefetch("answer_options", queryset=answer_options)
+        )
+        sections = SurveySection.objects.order_by("order").prefetch_related(
+            Prefetch("questions", queryset=questions)
+        )
+        return self.prefetch_related(Prefetch("sections", queryset=sections))
+
+    def bump_version(self):
+        """
+        Marks the structure of these Surveys as changed, invalidating cached copies
+        """
+        return self.update(version=F("version") + 1, modified=timezone.now())
+
+
 class Survey(models.Model):
 
     id = models.UUIDField(
@@ -79,25 +103,159 @@ class Survey(models.Model):
         verbose_name="Allow Edits after Logged In User has submitted a response",
     )
 
+    # precomputed `compute_is_open()`, so that respondent requests only check this flag
+    # kept up to date by `save()` and, at the start and end dates, `manage.py schedule_surveys`
+    is_open = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="Is Open",
+    )
+
+    # templates can be cloned by anyone, other surveys only by their creator
+    is_template = models.BooleanField(
+        default=False,
+        verbose_name="Is Template",
+    )
+
+    # bumped on every change to the Survey or its sections, questions and answer options
+    # cached copies of the survey are keyed by it (see `surveys.cache`)
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+    )
+
+    # last change to the Survey or its structure, moves together with `version`
+    modified = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Modified",
+    )
+
+    objects = SurveyQuerySet.as_manager()
+
     def __str__(self):
         return f"Survey {self.id} - {self.title}"
 
+    def clone(self, creator=None, **fields):
+        """
+        Copies the Survey with its whole tree, see `authoring.clone_survey`
+        """
+        from .authoring import clone_survey
 
-class SurveySectionManager(models.Manager):
+        return clone_survey(self, creator, **fields)
+
+    def compute_is_open(self, now=None):
+        """
+        Returns whether the Survey takes responses at `now`, which `is_open` caches
+        """
+        now = now or timezone.now()
+        return (
+            self.is_active
+            and self.survey_start_date <= now
+            and (self.survey_end_date is None or self.survey_end_date > now)
+        )
+
+    def save(self, *args, **kwargs):
+        self.is_open = self.compute_is_open()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            # derived fields that change together with any other field
+            kwargs["update_fields"] = {*update_fields, "is_open", "version", "modified"}
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            self.version = F("version") + 1
+            super().save(*args, **kwargs)
+            self.refresh_from_db(fields=["version"])
+
+    class Meta:
+        indexes = [
+            # `schedule_surveys` only looks at closed active surveys that haven't ended
+            # (by end and start date), and at open surveys by end date
+            models.Index(
+                fields=["survey_end_date", "survey_start_date"],
+                condition=models.Q(is_open=False, is_active=True),
+                name="surveys_survey_opening_idx",
+            ),
+            models.Index(
+                fields=["survey_end_date"],
+                condition=models.Q(is_open=True),
+                name="surveys_survey_closing_idx",
+            ),
+        ]
+
+
+class OrderedManager(models.Manager):
     """
+    Manager for creating, moving, and fixing the order of objects that are ordered
+    relative to a parent object (eg SurveySections within a Survey)
+    Subclasses set `parent_field` to the name of the ForeignKey to the parent, and
+    `survey_lookup` to the lookup from Survey to that parent
+
+    By default orders are kept consecutive (1, 2, 3, ...), so inserting or moving an object
+    shifts all objects after it. With `SURVEYS_SPARSE_ORDERING` turned on, orders are spaced
+    `SURVEYS_ORDER_GAP` apart instead and an insert or move only writes the one object,
+    taking the midpoint between its new neighbours. The siblings only get respaced
+    (see `rebalance`) when there is no gap left at that position
     Manager code derived from https://www.reddit.com/r/django/comments/bfx9n0/best_way_to_create_ordered_lists_with_models/elhhy1h/
-    TODO: make the three functions generic to improve DRY
     """
 
+    parent_field = None
+    survey_lookup = None
+
+    def _parent_value(self, obj):
+        """
+        Returns the parent's pk of an object without fetching the parent from the db
+        """
+        return getattr(obj, self.model._meta.get_field(self.parent_field).attname)
+
+    def _siblings(self, parent):
+        return self.filter(**{self.parent_field: parent})
+
+    def changed(self, obj, previous_parent=None):
+        """
+        Bumps the version of the Survey an object belongs to, called whenever one is
+        saved or deleted (see `OrderedModel`)
+        If the object was moved from `previous_parent`, that parent's Survey is bumped too
+        """
+        parents = {self._parent_value(obj), previous_parent} - {None}
+        Survey.objects.filter(**{f"{self.survey_lookup}__in": parents}).bump_version()
+
+    @staticmethod
+    def _is_sparse():
+        return getattr(settings, "SURVEYS_SPARSE_ORDERING", False)
+
+    @staticmethod
+    def _gap():
+        gap = getattr(settings, "SURVEYS_ORDER_GAP", 1024)
+        # with a gap below 2 there is never room between neighbours, and respacing loops
+        if isinstance(gap, bool) or not isinstance(gap, int) or gap < 2:
+            raise ImproperlyConfigured("SURVEYS_ORDER_GAP must be an integer of at least 2")
+        return gap
+
+    def initial_order(self, position):
+        """
+        Returns the order to store for the object at 1-based `position` of a new list,
+        so that whole lists can be bulk created without renumbering
+        """
+        return position * (self._gap() if self._is_sparse() else 1)
+
     def create(self, *args, **kwargs):
         """
-        Creates a new SurveySection
+        Creates a new object
         If an `order` is given, it is inserted in the correct location
         Otherwise it is inserted at the end
         """
         instance = self.model(**kwargs)
+        parent = self._parent_value(instance)
         with transaction.atomic():
-            queryset = self._make_order_consecutive(instance.survey)
+            if self._is_sparse():
+                instance.order = self._sparse_order(
+                    self._siblings(parent), kwargs.get("order"), parent
+                )
+                instance.save()
+                return instance
+
+            queryset = self._make_order_consecutive(parent)
             current_order = queryset.aggregate(Max("order"))["order__max"]
             if current_order is None:
                 current_order = 0
@@ -105,7 +263,7 @@ class SurveySectionManager(models.Manager):
             if not "order" in kwargs or kwargs["order"] > current_order + 1:
                 instance.order = current_order + 1
             else:
-                self.filter(order__gte=kwargs["order"]).update(order=F("order") + 1)
+                queryset.filter(order__gte=kwargs["order"]).update(order=F("order") + 1)
 
             instance.save()
             return instance
@@ -115,8 +273,18 @@ class SurveySectionManager(models.Manager):
         Move an object and fix the relative position of all other objects
         This returns nothing, so all vars that represent objects from the queryset might be outdated after running this function
         """
-        queryset = self._make_order_consecutive(obj.survey)
         with transaction.atomic():
+            if self._is_sparse():
+                parent = self._parent_value(obj)
+                obj.order = self._sparse_order(
+                    self._siblings(parent).exclude(pk=obj.pk), int(new_order), parent
+                )
+                obj.save(update_fields=["order"])
+                return obj
+
+            queryset = self._make_order_consecutive(self._parent_value(obj))
+            # the object's own order may have been changed by the renumbering
+            obj.order = queryset.get(pk=obj.pk).order
             if obj.order > int(new_order):
                 # Move other objects up (because we're moving the current object back)
                 queryset.filter(order__lt=obj.order, order__gte=new_order,).exclude(
@@ -129,26 +297,160 @@ class SurveySectionManager(models.Manager):
                 ).update(order=F("order") - 1)
             # Move the object itself
             obj.order = new_order
-            obj.save()
+            obj.save(update_fields=["order"])
             return obj  # TODO are we actually going to use this?
 
-    def _make_order_consecutive(self, survey):
+    def _sparse_order(self, siblings, position, parent):
+        """
+        Returns the order value for an object placed at the 1-based `position` among `siblings`
+        (or at the end if no position is given), ie the midpoint between its new neighbours
+        Respaces the siblings if the neighbours are already adjacent
+        """
+        gap = self._gap()
+        ordered = siblings.order_by("order").values_list("order", flat=True)
+        if position is None:
+            last = ordered.aggregate(Max("order"))["order__max"]
+            return (last or 0) + gap
+
+        position = max(int(position), 1)
+        neighbours = list(ordered[max(position - 2, 0) : position])
+        if position == 1:
+            before, after = 0, (neighbours[0] if neighbours else None)
+        else:
+            before = neighbours[0] if neighbours else None
+            after = neighbours[1] if len(neighbours) > 1 else None
+        if after is None:
+            last = ordered.aggregate(Max("order"))["order__max"]
+            return (last or 0) + gap
+        if after - (before or 0) > 1:
+            return ((before or 0) + after) // 2
+
+        # no room left between the neighbours, respace everything and try again
+        self.rebalance(parent)
+        return self._sparse_order(siblings, position, parent)
+
+    def rebalance(self, parent):
+        """
+        Respaces all children of a parent `SURVEYS_ORDER_GAP` apart, keeping their relative order
+        Used by sparse ordering when two neighbours run out of room, and by the
+        `rebalance_order` management command
+        """
+        return self._make_order_consecutive(parent, step=self._gap())
+
+    def _make_order_consecutive(self, parent, step=1):
         """
-        Takes a Survey, and puts all SurveySections of that Survey in correct sequential order
+        Takes a parent object (or its pk), and puts all of its children in correct sequential order
         ie for 4 items with orders (5, 9, 1, 3) their new orders would be (1 => 1, 3 => 2, 5 => 3, 9 => 4)
-        Returns that queryset of ordered and sequential SurveySections
+        With a `step` other than 1 the orders are spaced out, ie (step, 2 * step, ...)
+        The renumbering is done with a single set-based UPDATE, instead of saving every row
+        Returns that queryset of ordered and sequential objects
         """
-        queryset = self.filter(survey=survey).order_by("order")
-        with transaction.atomic():
-            for index, section in enumerate(queryset):
-                if section.order != index + 1:
-                    section.order = index + 1
-                    section.save()
+        queryset = self._siblings(parent).order_by("order")
+        connection = connections[self.db]
+        if self._supports_update_from(connection):
+            self._renumber_with_window(queryset, connection, step)
+        else:
+            self._renumber_with_bulk_update(queryset, step)
         return queryset  # can choose not to use this, but it's nice
         # if we want to keep working with the data
 
+    @staticmethod
+    def _supports_update_from(connection):
+        if connection.vendor == "postgresql":
+            return True
+        if connection.vendor == "sqlite":
+            return connection.Database.sqlite_version_info >= (3, 33, 0)
+        return False
+
+    def _renumber_with_window(self, queryset, connection, step=1):
+        """
+        UPDATE ... FROM (SELECT pk, ROW_NUMBER() OVER (ORDER BY order) ...)
+        Only the rows whose order actually changes are written
+        """
+        ranked = (
+            queryset.order_by()
+            .annotate(
+                new_order=Window(RowNumber(), order_by=[F("order").asc(), F("pk").asc()])
+            )
+            .values("pk", "new_order")
+        )
+        ranked_sql, params = ranked.query.sql_with_params()
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        pk = qn(self.model._meta.pk.column)
+        order = qn(self.model._meta.get_field("order").column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {order} = ranked.new_order * %s "
+                f"FROM ({ranked_sql}) AS ranked "
+                f"WHERE {table}.{pk} = ranked.{pk} "
+                f"AND ({table}.{order} IS NULL OR {table}.{order} <> ranked.new_order * %s)",
+                (step, *params, step),
+            )
+
+    def _renumber_with_bulk_update(self, queryset, step=1):
+        changed = [
+            self.model(pk=pk, order=(index + 1) * step)
+            for index, (pk, order) in enumerate(queryset.values_list("pk", "order"))
+            if order != (index + 1) * step
+        ]
+        self.bulk_update(changed, ["order"])
+
 
-class SurveySection(models.Model):
+class OrderedModel(models.Model):
+    """
+    Base for models that are ordered through an OrderedManager
+    Keeps the owning Survey's version up to date, and closes the gap left by deleted objects
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the parent it was loaded with, to also bump the old Survey when it is moved away
+        parent = cls._meta.get_field(cls._default_manager.parent_field)
+        instance._loaded_parent = instance.__dict__.get(parent.attname)
+        return instance
+
+    def save(self, *args, **kwargs):
+        manager = type(self)._default_manager
+        previous_parent = getattr(self, "_loaded_parent", None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous_parent not in (None, manager._parent_value(self)):
+                self.moved()
+            manager.changed(self, previous_parent)
+        self._loaded_parent = manager._parent_value(self)
+
+    def moved(self):
+        """
+        Called after an object was saved under another parent, in the same transaction
+        Raising rolls the move back
+        """
+
+    def delete(self, *args, **kwargs):
+        manager = type(self)._default_manager
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if not manager._is_sparse():
+                manager._make_order_consecutive(manager._parent_value(self))
+            manager.changed(self)
+        return result
+
+    class Meta:
+        abstract = True
+
+
+class SurveySectionManager(OrderedManager):
+    """
+    Manager for creating, moving, and fixing the order of SurveySection objects
+    Refer to OrderedManager for more documentation
+    """
+
+    parent_field = "survey"
+    survey_lookup = "pk"
+
+
+class SurveySection(OrderedModel):
     """
     Only create SurveySection items by using `SurveySection.objects.create()`!
     (ie not `SurveySection()`)
@@ -183,63 +485,38 @@ class SurveySection(models.Model):
         blank=True,
     )
 
+    modified = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Modified",
+    )
+
     objects = SurveySectionManager()
 
     def __str__(self):
         return f"Survey Section {self.id} - {self.name}"
 
+    def moved(self):
+        from .logic import check_moved_questions
 
-class QuestionManager(models.Manager):
-    """
-    Manager for creating, moving, and fixing the order of Question objects
-    Refer to SurveySectionManager for more documentation and possible improvements
-    """
-
-    def create(self, **kwargs):
-        instance = self.model(**kwargs)
-        with transaction.atomic():
-            queryset = self._make_order_consecutive(instance.section)
-            current_order = queryset.aggregate(Max("order"))["order__max"]
-            if current_order is None:
-                current_order = 0
+        check_moved_questions(self.questions.values("pk"))
 
-            if not "order" in kwargs or kwargs["order"] > current_order + 1:
-                instance.order = current_order + 1
-            else:
-                self.filter(order__gte=kwargs["order"]).update(order=F("order") + 1)
+    class Meta:
+        indexes = [
+            models.Index(fields=["survey", "order"], name="surveys_section_order_idx"),
+        ]
 
-            instance.save()
-            return instance
 
-    def move(self, obj, new_order):
-        queryset = self._make_order_consecutive(obj.section)
-        with transaction.atomic():
-            if obj.order > int(new_order):
-                # Move other objects up (because we're moving the current object back)
-                queryset.filter(order__lt=obj.order, order__gte=new_order,).exclude(
-                    pk=obj.pk
-                ).update(order=F("order") + 1)
-            elif obj.order < int(new_order):
-                # Move other objects down (because we're moving the current object forward)
-                queryset.filter(order__lte=new_order, order__gt=obj.order,).exclude(
-                    pk=obj.pk
-                ).update(order=F("order") - 1)
-            # move the object itself
-            obj.order = new_order
-            obj.save()
-            return obj
+class QuestionManager(OrderedManager):
+    """
+    Manager for creating, moving, and fixing the order of Question objects
+    Refer to OrderedManager for more documentation
+    """
 
-    def _make_order_consecutive(self, section):
-        queryset = self.filter(section=section).order_by("order")
-        with transaction.atomic():
-            for index, question in enumerate(queryset):
-                if question.order != index + 1:
-                    question.order = index + 1
-                    question.save()
-        return queryset
+    parent_field = "section"
+    survey_lookup = "sections"
 
 
-class Question(models.Model):
+class Question(OrderedModel):
 
     id = models.UUIDField(
         primary_key=True,
@@ -302,63 +579,51 @@ class Question(models.Model):
 
     order = models.PositiveIntegerField()
 
+    modified = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Modified",
+    )
+
     objects = QuestionManager()
 
     def __str__(self):
         return f"Question {self.id} - {self.question}"
 
+    def clean(self):
+        from .logic import check_dependency
 
-class AnswerOptionManager(models.Manager):
-    """
-    Manager for creating, moving, and fixing the order of AnswerOption objects
-    Refer to SurveySectionManager for more documentation and possible improvements
-    """
+        check_dependency(self)
 
-    def create(self, *args, **kwargs):
-        instance = self.model(**kwargs)
-        with transaction.atomic():
-            queryset = self._make_order_consecutive(instance.question)
-            current_order = queryset.aggregate(Max("order"))["order__max"]
-            if current_order is None:
-                current_order = 0
+    def save(self, *args, **kwargs):
+        # dependency cycles are rejected here, so that rendering never has to deal with them
+        if self.dependency_question_id is not None or self.dependency_answer_option_id is not None:
+            from .logic import check_dependency
 
-            if not "order" in kwargs or kwargs["order"] > current_order + 1:
-                instance.order = current_order + 1
-            else:
-                self.filter(order__gte=kwargs["order"]).update(order=F("order") + 1)
+            check_dependency(self)
+        return super().save(*args, **kwargs)
 
-            instance.save()
-            return instance
+    def moved(self):
+        from .logic import check_moved_questions
 
-    def move(self, obj, new_order):
-        queryset = self._make_order_consecutive(obj.question)
-        with transaction.atomic():
-            if obj.order > int(new_order):
-                # Move other objects up (because we're moving the current object back)
-                queryset.filter(order__lt=obj.order, order__gte=new_order,).exclude(
-                    pk=obj.pk
-                ).update(order=F("order") + 1)
-            elif obj.order < int(new_order):
-                # Move other objects down (because we're moving the current object forward)
-                queryset.filter(order__lte=new_order, order__gt=obj.order,).exclude(
-                    pk=obj.pk
-                ).update(order=F("order") - 1)
-            # Move the object itself
-            obj.order = new_order
-            obj.save()
-            return obj
+        check_moved_questions([self.pk])
 
-    def _make_order_consecutive(self, question):
-        queryset = self.filter(question=question).order_by("order")
-        with transaction.atomic():
-            for index, answer_option in enumerate(queryset):
-                if answer_option.order != index + 1:
-                    answer_option.order = index + 1
-                    answer_option.save()
-        return queryset
+    class Meta:
+        indexes = [
+            models.Index(fields=["section", "order"], name="surveys_question_order_idx"),
+        ]
+
+
+class AnswerOptionManager(OrderedManager):
+    """
+    Manager for creating, moving, and fixing the order of AnswerOption objects
+    Refer to OrderedManager for more documentation
+    """
 
+    parent_field = "question"
+    survey_lookup = "sections__questions"
 
-class AnswerOption(models.Model):
+
+class AnswerOption(OrderedModel):
 
     id = models.UUIDField(
         primary_key=True,
@@ -379,10 +644,47 @@ class AnswerOption(models.Model):
 
     order = models.PositiveIntegerField()
 
+    modified = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Modified",
+    )
+
     objects = AnswerOptionManager()
 
+    def moved(self):
+        from .logic import check_moved_questions
+
+        # the questions depending on this option now depend on its new question
+        check_moved_questions([self.question_id])
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["question", "order"], name="surveys_option_order_idx"),
+        ]
+
+
+class AnswerManager(models.Manager):
+    """
+    Keeps `SurveyParticipation.last_interaction` up to date for answers written with
+    `bulk_create`, which doesn't send `post_save` signals
+    Pass `touch=False` when several bulk inserts belong to one submission, and touch
+    the participation once afterwards
+    """
+
+    def bulk_create(self, objs, *args, touch=True, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if touch:
+            SurveyParticipation.objects.touch(
+                {answer.survey_participation_id for answer in objs}
+            )
+        return objs
+
 
 class Answer(models.Model):
+    """
+    The answer to a text response question
+    Answers to multiple choice questions are stored as ChoiceAnswers
+    """
 
     id = models.UUIDField(
         primary_key=True,
@@ -397,21 +699,18 @@ class Answer(models.Model):
     )
 
     answer_text = models.CharField(
+        default="",
+        blank=True,
         max_length=1000,
         verbose_name="Answer Text",
     )
 
     answer_boolean = models.BooleanField(
-        editable=True,
-        verbose_name="Answer Boolean",
-    )
-
-    answer_option = models.ForeignKey(
-        "AnswerOption",
+        default=None,
         null=True,
         blank=True,
-        on_delete=models.SET_NULL,
-        related_name="have_chosen_this_option",
+        editable=True,
+        verbose_name="Answer Boolean",
     )
 
     survey_participation = models.ForeignKey(
@@ -420,14 +719,89 @@ class Answer(models.Model):
         related_name="answers_of_survey_participation",
     )
 
+    objects = AnswerManager()
+
     def __str__(self):
         return f"Answer {self.id} to {self.question}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            SurveyParticipation.objects.touch([self.survey_participation_id])
 
-@receiver(post_save, sender=Answer)
-def hear_signal(sender, instance, **kwargs):
-    # TODO update this to work if no survey participation exists yet?
-    instance.survey_participation.last_interaction = timezone.now()
+    class Meta:
+        constraints = [
+            # text questions take a single answer per participation
+            models.UniqueConstraint(
+                fields=["survey_participation", "question"],
+                name="surveys_answer_unique_question",
+            ),
+        ]
+
+
+class ChoiceAnswer(models.Model):
+    """
+    An answer option picked in a multiple choice question, one row per picked option
+    Only holds the three keys, so that results queries over many responses scan little data
+    """
+
+    survey_participation = models.ForeignKey(
+        "SurveyParticipation",
+        on_delete=models.CASCADE,
+        related_name="choice_answers",
+    )
+
+    question = models.ForeignKey(
+        "Question",
+        on_delete=models.CASCADE,
+        related_name="choice_answers",
+    )
+
+    answer_option = models.ForeignKey(
+        "AnswerOption",
+        on_delete=models.CASCADE,
+        related_name="choice_answers",
+    )
+
+    objects = AnswerManager()
+
+    def __str__(self):
+        return f"Choice {self.answer_option_id} of {self.survey_participation_id}"
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            SurveyParticipation.objects.touch([self.survey_participation_id])
+
+    class Meta:
+        indexes = [
+            # results: how many participations picked each option of a question
+            models.Index(fields=["question", "answer_option"], name="surveys_choice_option_idx"),
+        ]
+        constraints = [
+            # an answer option can only be picked once per participation
+            models.UniqueConstraint(
+                fields=["survey_participation", "answer_option"],
+                name="surveys_choice_unique_option",
+            ),
+        ]
+
+
+class SurveyParticipationManager(models.Manager):
+    # keeps `pk IN (...)` below SQLite's limit on query parameters
+    touch_batch_size = 900
+
+    def touch(self, pks):
+        """
+        Sets `last_interaction` of the given SurveyParticipations to now, with a single UPDATE
+        (or one per `touch_batch_size` participations for very large batches)
+        """
+        pks = [pk for pk in pks if pk is not None]
+        now = timezone.now()
+        for start in range(0, len(pks), self.touch_batch_size):
+            self.filter(pk__in=pks[start : start + self.touch_batch_size]).update(
+                last_interaction=now
+            )
 
 
 class SurveyParticipation(models.Model):
@@ -447,23 +821,61 @@ class SurveyParticipation(models.Model):
         default=False,
     )
 
+    # copy of the Survey's `limit_one_response_per_user` at the time of participating,
+    # so that the database can enforce it with a conditional unique constraint
+    is_single_response = models.BooleanField(
+        default=False,
+        editable=False,
+    )
+
     last_interaction = models.DateTimeField(
         auto_now_add=True,
     )
 
     user_account = models.ForeignKey(
         settings.AUTH_USER_MODEL,
+        default=None,
+        null=True,
+        blank=True,
         on_delete=models.CASCADE,
         related_name="survey_participations",
     )
 
     user_session = models.CharField(
+        default=None,
+        null=True,
+        blank=True,
         max_length=100,
     )
 
+    objects = SurveyParticipationManager()
+
     def __str__(self):
         return f"Survey Participation {self.id} of {self.survey}"
 
+    def get_answer_keys(self):
+        """
+        Returns (question_id, answer_option_id) of all answers, answer_option_id is None
+        for text answers
+        """
+        text_answers = self.answers_of_survey_participation.values_list("question_id", flat=True)
+        return [
+            *self.choice_answers.values_list("question_id", "answer_option_id"),
+            *((question_id, None) for question_id in text_answers),
+        ]
+
+    def delete(self, *args, **kwargs):
+        from .counters import record_response_counts
+
+        with transaction.atomic():
+            record_response_counts(
+                self.survey_id,
+                removed=self.get_answer_keys(),
+                participations=-1,
+                completed=-1 if self.is_complete else 0,
+            )
+            return super().delete(*args, **kwargs)
+
     class Meta:
         constraints = [
             # ensure that either user_account or user_session contains data
@@ -475,4 +887,278 @@ class SurveyParticipation(models.Model):
                     | models.Q(user_account__isnull=False, user_session__isnull=True)
                 ),
             ),
+            # one response per user (or session) on surveys with `limit_one_response_per_user`
+            models.UniqueConstraint(
+                fields=["survey", "user_account"],
+                condition=models.Q(is_single_response=True, user_account__isnull=False),
+                name="surveys_participation_single_account",
+            ),
+            models.UniqueConstraint(
+                fields=["survey", "user_session"],
+                condition=models.Q(is_single_response=True, user_session__isnull=False),
+                name="surveys_participation_single_session",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["survey", "user_account"], name="surveys_part_account_idx"),
+            models.Index(fields=["survey", "user_session"], name="surveys_part_session_idx"),
+            # keyset pagination of the participation listing, see `surveys.listing`
+            models.Index(
+                fields=["survey", "last_interaction", "id"], name="surveys_part_recent_idx"
+            ),
+            models.Index(
+                fields=["survey", "is_complete", "last_interaction", "id"],
+                name="surveys_part_complete_idx",
+            ),
+        ]
+
+
+class QueuedSubmission(models.Model):
+    """
+    A validated submission waiting to be written by the `drain_submissions` command
+    (see `surveys.ingestion`)
+    Rows are kept for a while after they are processed, so that a retried request with
+    the same idempotency key is recognised and not queued again
+    """
+
+    id = models.BigAutoField(
+        primary_key=True,
+    )
+
+    # unique per survey and respondent (see Meta), so respondents can't claim each other's keys
+    idempotency_key = models.CharField(
+        max_length=100,
+    )
+
+    survey = models.ForeignKey(
+        "Survey",
+        on_delete=models.CASCADE,
+        related_name="queued_submissions",
+    )
+
+    user_account = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        default=None,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="queued_submissions",
+    )
+
+    user_session = models.CharField(
+        default=None,
+        null=True,
+        blank=True,
+        max_length=100,
+    )
+
+    is_complete = models.BooleanField(
+        default=True,
+    )
+
+    # [{"question": id, "answer_option": id or None, "answer_text": str}, ...]
+    answers = models.JSONField()
+
+    created = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    processed = models.DateTimeField(
+        default=None,
+        null=True,
+        blank=True,
+    )
+
+    # why the submission was dropped when it was processed, e.g. a repeated response
+    error = models.CharField(
+        default="",
+        blank=True,
+        max_length=1000,
+    )
+
+    def __str__(self):
+        return f"Queued Submission {self.idempotency_key} to {self.survey_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["survey", "user_account", "idempotency_key"],
+                condition=models.Q(user_account__isnull=False),
+                name="surveys_queue_unique_account_key",
+            ),
+            models.UniqueConstraint(
+                fields=["survey", "user_session", "idempotency_key"],
+                condition=models.Q(user_account__isnull=True),
+                name="surveys_queue_unique_session_key",
+            ),
+        ]
+        indexes = [
+            # the drain worker only ever reads the pending rows, in order
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed__isnull=True),
+                name="surveys_queue_pending_idx",
+            ),
+            models.Index(fields=["processed"], name="surveys_queue_processed_idx"),
+        ]
+
+
+class ResponseCountManager(models.Manager):
+    def add(self, deltas, field="count"):
+        """
+        Takes a dict of {pk: delta} and adds each delta to the counter row with that pk,
+        creating missing rows first
+        Rows that change by the same amount are updated together, so this usually
+        costs one INSERT and one UPDATE no matter how many counters change
+        """
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        self.bulk_create(
+            [self.model(pk=pk) for pk in deltas], ignore_conflicts=True
+        )
+        pks_by_delta = {}
+        for pk, delta in deltas.items():
+            pks_by_delta.setdefault(delta, []).append(pk)
+        for delta, pks in pks_by_delta.items():
+            self.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+class AnswerOptionResponseCount(models.Model):
+    """
+    How many answers chose an AnswerOption
+    Maintained by `surveys.counters`, rebuilt with `manage.py rebuild_response_counts`
+    """
+
+    answer_option = models.OneToOneField(
+        "AnswerOption",
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="response_count",
+    )
+
+    count = models.IntegerField(
+        default=0,
+    )
+
+    objects = ResponseCountManager()
+
+
+class QuestionResponseCount(models.Model):
+    """
+    How many SurveyParticipations answered a Question
+    """
+
+    question = models.OneToOneField(
+        "Question",
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="response_count",
+    )
+
+    count = models.IntegerField(
+        default=0,
+    )
+
+    objects = ResponseCountManager()
+
+
+class SurveyResponseCount(models.Model):
+    """
+    How many SurveyParticipations a Survey has, and how many of those are complete
+    """
+
+    survey = models.OneToOneField(
+        "Survey",
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="response_count",
+    )
+
+    count = models.IntegerField(
+        default=0,
+    )
+
+    completed = models.IntegerField(
+        default=0,
+    )
+
+    objects = ResponseCountManager()
+
+
+class ResponseRateManager(models.Manager):
+    def add(self, deltas, start):
+        """
+        Takes a dict of {survey id: (started, completed)} and adds them to the minute
+        buckets of those Surveys that begin at `start`, creating missing buckets first
+        Buckets that change by the same amounts are updated together
+        """
+        deltas = {pk: delta for pk, delta in deltas.items() if any(delta)}
+        if not deltas:
+            return
+        minute = ResponseRateBucket.Granularity.MINUTE
+        self.bulk_create(
+            [self.model(survey_id=pk, granularity=minute, start=start) for pk in deltas],
+            ignore_conflicts=True,
+        )
+        pks_by_delta = {}
+        for pk, delta in deltas.items():
+            pks_by_delta.setdefault(delta, []).append(pk)
+        for (started, completed), pks in pks_by_delta.items():
+            self.filter(survey_id__in=pks, granularity=minute, start=start).update(
+                started=F("started") + started, completed=F("completed") + completed
+            )
+
+
+class ResponseRateBucket(models.Model):
+    """
+    How many SurveyParticipations of a Survey were started and completed in a minute,
+    hour or day
+    Maintained by `surveys.rates`, old buckets are merged into coarser ones by
+    `manage.py compact_response_rates`
+    """
+
+    class Granularity(models.TextChoices):
+        MINUTE = "minute", _("Minute")
+        HOUR = "hour", _("Hour")
+        DAY = "day", _("Day")
+
+    id = models.BigAutoField(
+        primary_key=True,
+    )
+
+    survey = models.ForeignKey(
+        "Survey",
+        on_delete=models.CASCADE,
+        related_name="response_rates",
+    )
+
+    granularity = models.CharField(
+        max_length=6,
+        choices=Granularity.choices,
+    )
+
+    start = models.DateTimeField()
+
+    started = models.IntegerField(
+        default=0,
+    )
+
+    completed = models.IntegerField(
+        default=0,
+    )
+
+    objects = ResponseRateManager()
+
+    class Meta:
+        constraints = [
+            # also serves the chart, which reads a Survey's buckets by start
+            models.UniqueConstraint(
+                fields=["survey", "granularity", "start"],
+                name="surveys_rate_bucket_unique",
+            ),
+        ]
+        indexes = [
+            # compaction reads the old buckets of one granularity across all surveys
+            models.Index(fields=["granularity", "start"], name="surveys_rate_compact_idx"),
         ]
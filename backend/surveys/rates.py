@@ -0,0 +1,134 @@
+"""
+Incrementally maintained response rates for "responses over time" charts
+Every new SurveyParticipation is counted as started, and every participation that
+becomes complete as completed, in the bucket of the current minute. Recent activity is
+kept per minute, and `manage.py compact_response_rates` merges older minute buckets into
+hour buckets and older hour buckets into day buckets, so a chart reads a few hundred
+rows however many responses a Survey has
+Buckets count events, so deleting a participation or un-completing it doesn't change them
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import DateTimeField, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import ResponseRateBucket
+
+Granularity = ResponseRateBucket.Granularity
+
+# how long buckets are kept before they are merged into the next coarser granularity
+KEEP_MINUTES = timedelta(days=1)
+KEEP_HOURS = timedelta(days=30)
+
+
+def truncate(value, granularity):
+    """
+    Returns the start of the minute, hour or day (in the current time zone) of `value`
+    """
+    value = timezone.localtime(value).replace(second=0, microsecond=0)
+    if granularity != Granularity.MINUTE:
+        value = value.replace(minute=0)
+    if granularity == Granularity.DAY:
+        value = value.replace(hour=0)
+    return value
+
+
+def record_response_rates(deltas, now=None):
+    """
+    Counts participations as started or completed now
+    Takes {survey id: (started, completed)}, negative deltas (deletions, edits back to
+    incomplete) are ignored
+    """
+    deltas = {
+        survey_id: (max(started, 0), max(completed, 0))
+        for survey_id, (started, completed) in deltas.items()
+    }
+    start = truncate(now or timezone.now(), Granularity.MINUTE)
+    ResponseRateBucket.objects.add(deltas, start)
+
+
+def _merge(source, target, cutoff):
+    """
+    Merges the `source` buckets that begin before `cutoff` into `target` buckets
+    Returns how many `source` buckets were merged
+    """
+    cutoff = truncate(cutoff, target)
+    old = ResponseRateBucket.objects.filter(granularity=source, start__lt=cutoff)
+    merged = list(
+        old.order_by()
+        .annotate(bucket=Trunc("start", target, output_field=DateTimeField()))
+        .values("survey_id", "bucket")
+        .annotate(started=Sum("started"), completed=Sum("completed"))
+    )
+    if not merged:
+        return 0
+    # target buckets normally don't exist yet, unless a clock was behind when writing
+    existing = {
+        (bucket.survey_id, bucket.start): bucket
+        for bucket in ResponseRateBucket.objects.filter(
+            granularity=target,
+            survey_id__in={row["survey_id"] for row in merged},
+            start__gte=min(row["bucket"] for row in merged),
+            start__lt=cutoff,
+        )
+    }
+    created, changed = [], []
+    for row in merged:
+        bucket = existing.get((row["survey_id"], row["bucket"]))
+        if bucket is None:
+            created.append(
+                ResponseRateBucket(
+                    survey_id=row["survey_id"],
+                    granularity=target,
+                    start=row["bucket"],
+                    started=row["started"],
+                    completed=row["completed"],
+                )
+            )
+        else:
+            bucket.started += row["started"]
+            bucket.completed += row["completed"]
+            changed.append(bucket)
+    ResponseRateBucket.objects.bulk_create(created)
+    ResponseRateBucket.objects.bulk_update(changed, ["started", "completed"])
+    deleted, _ = old.delete()
+    return deleted
+
+
+def compact_response_rates(now=None, keep_minutes=KEEP_MINUTES, keep_hours=KEEP_HOURS):
+    """
+    Merges minute buckets older than `keep_minutes` into hour buckets, and hour buckets
+    older than `keep_hours` into day buckets, in one transaction
+    Returns how many buckets were merged
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        merged = _merge(Granularity.MINUTE, Granularity.HOUR, now - keep_minutes)
+        merged += _merge(Granularity.HOUR, Granularity.DAY, now - keep_hours)
+    return merged
+
+
+def response_rates(survey, granularity=Granularity.HOUR, since=None, until=None):
+    """
+    Returns [{"start", "started", "completed"}] of a Survey per `granularity`, in order
+    Finer buckets are summed up to `granularity`, buckets that are already compacted to
+    a coarser one are returned at that coarser granularity
+    """
+    buckets = ResponseRateBucket.objects.filter(survey=survey)
+    if since is not None:
+        buckets = buckets.filter(start__gte=truncate(since, granularity))
+    if until is not None:
+        buckets = buckets.filter(start__lte=until)
+    rows = (
+        buckets.order_by()
+        .annotate(bucket=Trunc("start", granularity, output_field=DateTimeField()))
+        .values("bucket")
+        .annotate(started=Sum("started"), completed=Sum("completed"))
+        .order_by("bucket")
+    )
+    return [
+        {"start": row["bucket"], "started": row["started"], "completed": row["completed"]}
+        for row in rows
+    ]
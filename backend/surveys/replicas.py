@@ -0,0 +1,77 @@
+"""
+Routing of analytics reads (results, exports) to a read replica
+Reads only go to the replica inside `replica_reads()`, everything else keeps using the
+primary. A user who just wrote something is pinned to the primary for
+SURVEYS_REPLICA_PIN_SECONDS (see `ReplicaPinningMiddleware`), so that a survey owner
+always sees their own edits, whatever the replication lag
+"""
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+_state = Local()
+
+
+def _replica_alias():
+    return getattr(settings, "SURVEYS_REPLICA_ALIAS", "replica")
+
+
+def _cache():
+    return caches[getattr(settings, "SURVEYS_CACHE_ALIAS", "default")]
+
+
+def _pin_key(user):
+    return f"surveys:pin:{user.pk}"
+
+
+def pin_to_primary(user):
+    """
+    Keeps `user`'s analytics reads on the primary for SURVEYS_REPLICA_PIN_SECONDS
+    """
+    _cache().set(_pin_key(user), True, getattr(settings, "SURVEYS_REPLICA_PIN_SECONDS", 10))
+
+
+def is_pinned(user):
+    return bool(user.is_authenticated and _cache().get(_pin_key(user)))
+
+
+@contextmanager
+def replica_reads(user=None):
+    """
+    Sends the reads made inside the block to the replica, if one is configured and
+    `user` isn't pinned to the primary
+    """
+    alias = _replica_alias()
+    use_replica = alias in connections and not (user is not None and is_pinned(user))
+    previous = getattr(_state, "alias", None)
+    _state.alias = alias if use_replica else None
+    try:
+        yield
+    finally:
+        _state.alias = previous
+
+
+def iter_on_replica(rows, user=None):
+    """
+    Wraps a (streamed) iterator, so that the queries it makes while being consumed
+    are routed like in `replica_reads(user)`
+    """
+    with replica_reads(user):
+        yield from rows
+
+
+class ReplicaRouter:
+    """
+    Routes reads inside `replica_reads()` to the replica, and leaves everything else
+    to the default database
+    """
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, "alias", None)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        return True
@@ -0,0 +1,98 @@
+"""
+Opening and closing of surveys at their start and end dates
+Respondent requests only check the precomputed `Survey.is_open`. `Survey.save()` keeps it
+up to date when a survey is edited, and `manage.py schedule_surveys` flips it when a
+start or end date passes, so a survey opens or closes at most one scheduler interval late
+The scheduler only looks at closed surveys by start date and at open surveys by end date,
+each through a partial index, so a run costs the same however many surveys there are
+"""
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import get_dependency_graph, get_survey_schema, get_survey_tree
+from .logic import DependencyCycleError
+from .models import Survey
+from .snapshots import closed_surveys, write_snapshot
+
+
+def surveys_to_open(now):
+    """
+    Returns the surveys to open as two querysets, without and with an end date, since
+    each is a range of surveys_survey_opening_idx, where their union is a scan of it
+    """
+    closed = Survey.objects.filter(is_open=False, is_active=True, survey_start_date__lte=now)
+    return (
+        closed.filter(survey_end_date__isnull=True),
+        closed.filter(survey_end_date__gt=now),
+    )
+
+
+def surveys_to_close(now):
+    return Survey.objects.filter(is_open=True, survey_end_date__lte=now)
+
+
+def _flip(surveys, is_open, now):
+    """
+    Sets `is_open` of `surveys` and returns the ids of those that changed
+    The version is bumped like on any change, since cached copies of a Survey show it
+    """
+    pks = list(surveys.values_list("pk", flat=True))
+    if pks:
+        # filtered again, in case a survey was edited in between
+        surveys.filter(pk__in=pks).update(
+            is_open=is_open, version=F("version") + 1, modified=now
+        )
+    return pks
+
+
+def warm_survey_cache(survey):
+    """
+    Builds the cached structure of a Survey, so its first respondents don't have to
+    """
+    get_survey_tree(survey)
+    try:
+        get_survey_schema(survey)
+        get_dependency_graph(survey)
+    except DependencyCycleError:
+        # submissions to it are rejected until its conditional logic is fixed
+        pass
+
+
+def open_due_surveys(now=None):
+    """
+    Opens the surveys whose start date has passed and warms their cache
+    Returns the opened Surveys
+    """
+    now = now or timezone.now()
+    pks = [pk for surveys in surveys_to_open(now) for pk in _flip(surveys, True, now)]
+    opened = list(Survey.objects.filter(pk__in=pks))
+    for survey in opened:
+        warm_survey_cache(survey)
+    return opened
+
+
+def close_due_surveys(now=None, snapshot=True):
+    """
+    Closes the surveys whose end date has passed, and with `snapshot` (and NumPy
+    installed) writes the snapshot of their responses (see `surveys.snapshots`)
+    Surveys with queued submissions still to be written are not snapshotted, that is left
+    to `manage.py snapshot_surveys` once the queue is drained
+    Returns the closed Surveys
+    """
+    now = now or timezone.now()
+    closed = list(
+        Survey.objects.with_tree().filter(pk__in=_flip(surveys_to_close(now), False, now))
+    )
+    if snapshot and closed:
+        ready = set(
+            closed_surveys(now)
+            .filter(pk__in=[survey.pk for survey in closed])
+            .values_list("pk", flat=True)
+        )
+        try:
+            for survey in closed:
+                if survey.pk in ready:
+                    write_snapshot(survey)
+        except ImportError:
+            pass
+    return closed
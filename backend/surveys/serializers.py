@@ -1,12 +1,32 @@
+from django.db import models
 from rest_framework import serializers
 
+from .listing import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor
 from .models import *
 
 
+class OrderedListSerializer(serializers.ListSerializer):
+    """
+    Serializes ordered children (sections, questions, answer options) with consecutive
+    1..n `order` values, no matter how the orders are stored (see OrderedManager)
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        items = sorted(
+            iterable, key=lambda item: (item.order is None, item.order or 0)
+        )
+        representation = super().to_representation(items)
+        for position, item in enumerate(representation, start=1):
+            item["order"] = position
+        return representation
+
+
 class AnswerOptionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = AnswerOption
+        list_serializer_class = OrderedListSerializer
         fields = [
             "id",
             "text",
@@ -18,6 +38,7 @@ class QuestionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Question
+        list_serializer_class = OrderedListSerializer
         fields = [
             "id",
             "question",
@@ -36,6 +57,7 @@ class SurveySectionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SurveySection
+        list_serializer_class = OrderedListSerializer
         fields = [
             "id",
             "name",
@@ -62,5 +84,196 @@ class SurveySerializer(serializers.ModelSerializer):
             "allow_anonymous_responses",
             "limit_one_response_per_user",
             "allow_edits_after_submit",
+            "is_template",
+            "is_open",
+            "sections",
+        ]
+
+
+class AnswerOptionDocumentSerializer(serializers.ModelSerializer):
+    temp_id = serializers.CharField(required=False, max_length=100)
+
+    class Meta:
+        model = AnswerOption
+        fields = [
+            "temp_id",
+            "text",
+        ]
+
+
+class QuestionDocumentSerializer(serializers.ModelSerializer):
+    temp_id = serializers.CharField(required=False, max_length=100)
+    # temp ids of other questions and answer options in the same document
+    dependency_question = serializers.CharField(required=False, allow_null=True, default=None)
+    dependency_answer_option = serializers.CharField(
+        required=False, allow_null=True, default=None
+    )
+    answer_options = AnswerOptionDocumentSerializer(many=True, default=list)
+
+    class Meta:
+        model = Question
+        fields = [
+            "temp_id",
+            "question",
+            "subheading",
+            "is_required",
+            "question_type",
+            "dependency_question",
+            "dependency_answer_option",
+            "answer_options",
+        ]
+        extra_kwargs = {
+            "subheading": {"default": "", "allow_blank": True},
+            "is_required": {"default": True},
+        }
+
+
+class SurveySectionDocumentSerializer(serializers.ModelSerializer):
+    questions = QuestionDocumentSerializer(many=True, default=list)
+
+    class Meta:
+        model = SurveySection
+        fields = [
+            "name",
+            "subheading",
+            "questions",
+        ]
+        extra_kwargs = {"subheading": {"default": "", "allow_blank": True}}
+
+
+class SurveyDocumentSerializer(serializers.ModelSerializer):
+    """
+    A whole Survey as one nested document, for creating it in a single request
+    Sections, questions and answer options are ordered as in the document
+    Dependencies refer to the `temp_id`s of questions and answer options
+    """
+
+    sections = SurveySectionDocumentSerializer(many=True, default=list)
+
+    class Meta:
+        model = Survey
+        fields = [
+            "title",
+            "description",
+            "survey_start_date",
+            "survey_end_date",
+            "is_active",
+            "allow_anonymous_responses",
+            "limit_one_response_per_user",
+            "allow_edits_after_submit",
+            "is_template",
             "sections",
         ]
+
+    def validate(self, attrs):
+        from .authoring import check_document
+
+        errors = check_document(attrs["sections"])
+        if errors:
+            raise serializers.ValidationError({"sections": errors})
+        return attrs
+
+    def create(self, validated_data):
+        from .authoring import create_survey_from_document
+
+        creator = validated_data.pop("creator")
+        return create_survey_from_document(creator, validated_data)
+
+
+class AnswerSubmissionSerializer(serializers.Serializer):
+    question = serializers.UUIDField()
+    answer_option = serializers.UUIDField(required=False, allow_null=True, default=None)
+    answer_text = serializers.CharField(
+        required=False, allow_blank=True, max_length=1000, default=""
+    )
+
+
+class SubmissionSerializer(serializers.Serializer):
+    """
+    All answers of one SurveyParticipation
+    Needs the Survey's `SurveySchema` as `schema` in its context
+    """
+
+    is_complete = serializers.BooleanField(default=True)
+    answers = AnswerSubmissionSerializer(many=True)
+
+    def validate(self, attrs):
+        errors = self.context["schema"].validate(attrs["answers"], attrs["is_complete"])
+        if errors:
+            raise serializers.ValidationError({"answers": errors})
+        return attrs
+
+
+class ParticipationListQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of a SurveyParticipation listing, see `listing.participation_page`
+    """
+
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(
+        min_value=1, max_value=MAX_PAGE_SIZE, default=DEFAULT_PAGE_SIZE
+    )
+    is_complete = serializers.BooleanField(required=False, allow_null=True, default=None)
+    since = serializers.DateTimeField(required=False, default=None)
+    until = serializers.DateTimeField(required=False, default=None)
+    answers = serializers.BooleanField(default=False)
+
+    def validate_cursor(self, value):
+        try:
+            decode_cursor(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
+
+class ParticipationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SurveyParticipation
+        fields = ["id", "user_account", "user_session", "is_complete", "last_interaction"]
+
+
+class ParticipationWithAnswersSerializer(ParticipationSerializer):
+    """
+    A SurveyParticipation with its answers in the format they are submitted in
+    Needs the participation's choice and text answers to be prefetched
+    """
+
+    answers = serializers.SerializerMethodField()
+
+    class Meta(ParticipationSerializer.Meta):
+        fields = [*ParticipationSerializer.Meta.fields, "answers"]
+
+    def get_answers(self, participation):
+        return [
+            *(
+                {"question": answer.question_id, "answer_option": answer.answer_option_id}
+                for answer in participation.choice_answers.all()
+            ),
+            *(
+                {"question": answer.question_id, "answer_text": answer.answer_text}
+                for answer in participation.answers_of_survey_participation.all()
+            ),
+        ]
+
+
+class ResultsQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of results, `option` can be repeated to only count the
+    participations that picked all of those answer options
+    """
+
+    option = serializers.ListField(child=serializers.UUIDField(), default=list)
+
+
+class CrosstabQuerySerializer(ResultsQuerySerializer):
+    rows = serializers.UUIDField()
+    columns = serializers.UUIDField()
+
+
+class ResponseRatesQuerySerializer(serializers.Serializer):
+    granularity = serializers.ChoiceField(
+        choices=ResponseRateBucket.Granularity.choices,
+        default=ResponseRateBucket.Granularity.HOUR,
+    )
+    since = serializers.DateTimeField(required=False, default=None)
+    until = serializers.DateTimeField(required=False, default=None)
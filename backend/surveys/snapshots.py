@@ -0,0 +1,275 @@
+"""
+Columnar snapshots of the responses of closed surveys
+A closed Survey that is past its end date gets no more responses, so `manage.py
+snapshot_surveys` (or `schedule_surveys`, when it closes the Survey) writes its responses
+once to SURVEYS_SNAPSHOT_DIR as NumPy arrays, and results and analytics are then computed
+from memory-mapped reads of those instead of the answer tables:
+
+<survey id>/answers.npy     participations × columns indicator matrix (bool), with a
+                            column per answer option and one per text question
+<survey id>/complete.npy    is_complete of every participation
+<survey id>/texts.json      text answers, as [participation row, question id, text]
+<survey id>/meta.json       the Survey version, its response counters and the column of
+                            every answer option and text question, written last
+
+A snapshot is only used while its Survey is closed, at the version it was taken at and
+with the response counters (see `surveys.counters`) it was taken with, so a response
+written after it (e.g. drained from the ingestion queue) is never missed
+NumPy is optional, without it everything is read from the database
+"""
+import json
+import os
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .analytics import build_crosstab
+from .counters import build_results
+from .export import iter_participations
+from .models import QueuedSubmission, Question, Survey, SurveyResponseCount
+
+SNAPSHOT_FORMAT = 2
+
+
+def snapshot_dir():
+    return Path(
+        getattr(settings, "SURVEYS_SNAPSHOT_DIR", Path(settings.BASE_DIR) / "snapshots")
+    )
+
+
+def snapshot_path(survey):
+    return snapshot_dir() / str(survey.pk)
+
+
+def closed_surveys(now=None):
+    """
+    Returns the Surveys that can't get any more responses: closed (see
+    `surveys.scheduling`), past their end date, and without queued submissions that are
+    still to be written
+    """
+    pending = QueuedSubmission.objects.filter(processed__isnull=True).values("survey")
+    return Survey.objects.filter(
+        is_open=False, survey_end_date__lt=now or timezone.now()
+    ).exclude(pk__in=pending)
+
+
+def is_closed(survey, now=None):
+    # unlike `closed_surveys` this doesn't check the queue, submissions drained after a
+    # snapshot change the response counters it was taken with
+    return (
+        not survey.is_open
+        and survey.survey_end_date is not None
+        and survey.survey_end_date < (now or timezone.now())
+    )
+
+
+def _columns(survey):
+    """
+    Returns [question id, answer option id] of every column of a Survey's snapshot, the
+    answer option id is None for text questions
+    """
+    return [
+        [str(question.id), str(option.id)]
+        for section in survey.sections.all()
+        for question in section.questions.all()
+        if question.question_type != Question.QuestionType.TEXT_RESPONSE
+        for option in question.answer_options.all()
+    ] + [
+        [str(question.id), None]
+        for section in survey.sections.all()
+        for question in section.questions.all()
+        if question.question_type == Question.QuestionType.TEXT_RESPONSE
+    ]
+
+
+def _save(path, write):
+    # written next to the target and renamed, so readers never see a partial file
+    partial = path.with_name(f".{path.name}.partial")
+    write(partial)
+    os.replace(partial, path)
+
+
+def write_snapshot(survey):
+    """
+    Writes the snapshot of a closed Survey, replacing any previous one, and returns the
+    number of participations in it
+    `survey` should come from `Survey.objects.with_tree()`. Raises ImportError without
+    NumPy
+    """
+    import numpy as np
+
+    columns = _columns(survey)
+    option_columns = {option: index for index, (_, option) in enumerate(columns) if option}
+    text_columns = {
+        question: index for index, (question, option) in enumerate(columns) if not option
+    }
+    # read before the answers, so a response written in between makes the snapshot stale
+    # instead of missing from it
+    counts = _response_counts(survey)
+    # the (row, column) of every True cell of the indicator matrix
+    complete, cell_rows, cell_columns, texts = [], [], [], []
+    participations = iter_participations(survey, choice_value="answer_option_id")
+    for row, (participation, participation_answers) in enumerate(participations):
+        complete.append(participation[3])
+        for question_id, values in participation_answers.items():
+            question_id = str(question_id)
+            if question_id in text_columns:
+                cell_rows.append(row)
+                cell_columns.append(text_columns[question_id])
+                texts.extend([row, question_id, text] for text in values)
+            else:
+                for option_id in values:
+                    cell_rows.append(row)
+                    cell_columns.append(option_columns[str(option_id)])
+    # sized from the rows actually read, which may differ from a count taken before
+    answers = np.zeros((len(complete), len(columns)), dtype=bool)
+    cells = np.array(cell_rows, dtype=np.intp), np.array(cell_columns, dtype=np.intp)
+    answers[cells] = True
+    complete = np.array(complete, dtype=bool)
+
+    path = snapshot_path(survey)
+    path.mkdir(parents=True, exist_ok=True)
+    # np.save adds .npy to names without it, so write through file objects
+    for name, array in (("answers.npy", answers), ("complete.npy", complete)):
+        _save(path / name, lambda partial: _write_array(partial, array))
+    _save(
+        path / "texts.json",
+        lambda partial: partial.write_text(json.dumps(texts, ensure_ascii=False)),
+    )
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "survey_version": survey.version,
+        "response_counts": counts,
+        "participations": len(complete),
+        "columns": columns,
+    }
+    _save(path / "meta.json", lambda partial: partial.write_text(json.dumps(meta)))
+    return len(complete)
+
+
+def _response_counts(survey):
+    """
+    Returns the [participations, completed] counters of a Survey, which change with every
+    response written to it
+    """
+    counts = SurveyResponseCount.objects.filter(survey=survey).values_list(
+        "count", "completed"
+    )
+    return list(next(iter(counts), [0, 0]))
+
+
+def _write_array(path, array):
+    import numpy as np
+
+    with open(path, "wb") as file:
+        np.save(file, array)
+
+
+def load_snapshot(survey):
+    """
+    Returns the Snapshot of a Survey, or None if it has no usable one (not closed,
+    changed since, or NumPy is not installed)
+    """
+    if not is_closed(survey):
+        return None
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    path = snapshot_path(survey)
+    try:
+        meta = json.loads((path / "meta.json").read_text())
+        if meta["format"] != SNAPSHOT_FORMAT or meta["survey_version"] != survey.version:
+            return None
+        if meta["response_counts"] != _response_counts(survey):
+            # responses were written after the snapshot, e.g. from the ingestion queue
+            return None
+        answers = np.load(path / "answers.npy", mmap_mode="r")
+        complete = np.load(path / "complete.npy", mmap_mode="r")
+    except FileNotFoundError:
+        return None
+    if answers.shape != (meta["participations"], len(meta["columns"])):
+        # arrays of a newer snapshot that is still being written
+        return None
+    return Snapshot(meta["columns"], answers, complete)
+
+
+class Snapshot:
+    """
+    The memory-mapped responses of a closed Survey, with the same results and crosstab
+    computations as `surveys.counters` and `surveys.analytics`
+    """
+
+    def __init__(self, columns, answers, complete):
+        self.answers = answers
+        self.complete = complete
+        self.option_columns = {}
+        self.question_columns = {}
+        for index, (question, option) in enumerate(columns):
+            self.question_columns.setdefault(question, []).append(index)
+            if option is not None:
+                self.option_columns[option] = index
+
+    def _rows(self, options):
+        """
+        Returns the rows of the participations that picked all `options`
+        """
+        if not options:
+            return self.answers, self.complete
+        import numpy as np
+
+        mask = np.ones(len(self.complete), dtype=bool)
+        for option in options:
+            column = self.option_columns.get(str(option))
+            if column is None:
+                # options of text questions have no column, and are never picked
+                mask[:] = False
+            else:
+                mask &= self.answers[:, column]
+        return self.answers[mask], self.complete[mask]
+
+    def results(self, survey, options=()):
+        """
+        Returns the results of `analytics.filtered_results`
+        `survey` should come from `Survey.objects.with_tree()`
+        """
+        answers, complete = self._rows(options)
+        column_sums = answers.sum(axis=0)
+        option_counts = {
+            uuid.UUID(option): int(column_sums[index])
+            for option, index in self.option_columns.items()
+        }
+        question_counts = {
+            uuid.UUID(question): int(answers[:, columns].any(axis=1).sum())
+            for question, columns in self.question_columns.items()
+        }
+        return build_results(
+            survey, len(complete), int(complete.sum()), question_counts, option_counts
+        )
+
+    def crosstab(self, survey, row_question, column_question, options=()):
+        """
+        Returns the crosstab of `analytics.crosstab`, as a product of the indicator
+        columns of both questions
+        `survey` should come from `Survey.objects.with_tree()`
+        """
+        questions = {
+            question.id: question
+            for section in survey.sections.all()
+            for question in section.questions.all()
+        }
+        rows, columns = questions[row_question], questions[column_question]
+        row_options = list(rows.answer_options.all())
+        column_options = list(columns.answer_options.all())
+        answers, _ = self._rows(options)
+        row_values = answers[:, [self.option_columns[str(o.id)] for o in row_options]]
+        column_values = answers[:, [self.option_columns[str(o.id)] for o in column_options]]
+        product = row_values.astype("int64").T @ column_values.astype("int64")
+        counts = {
+            (row.id, column.id): int(product[i, j])
+            for i, row in enumerate(row_options)
+            for j, column in enumerate(column_options)
+        }
+        return build_crosstab(rows, columns, counts)
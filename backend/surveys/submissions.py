@@ -0,0 +1,130 @@
+"""
+Write path for survey responses: one SurveyParticipation and all of its Answers per submission
+"""
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
+
+from .counters import record_response_counts
+from .models import Answer, ChoiceAnswer, SurveyParticipation
+
+
+def _get_single_response(survey, respondent):
+    return (
+        SurveyParticipation.objects.select_for_update()
+        .filter(survey=survey, is_single_response=True, **respondent)
+        .first()
+    )
+
+
+def check_accepts_response(survey, user=None):
+    """
+    Raises PermissionDenied if the survey doesn't take a response from `user`
+    (None for anonymous respondents) right now
+    Only checks the precomputed `Survey.is_open`, see `surveys.scheduling`
+    """
+    if not survey.is_open:
+        raise PermissionDenied("This survey is not accepting responses.")
+    if user is None and not survey.allow_anonymous_responses:
+        raise PermissionDenied("This survey does not accept anonymous responses.")
+
+
+def split_answers(answers):
+    """
+    Splits validated answer dicts into choice answers and (non-blank) text answers
+    """
+    choices = [answer for answer in answers if answer.get("answer_option") is not None]
+    texts = [
+        answer
+        for answer in answers
+        if answer.get("answer_option") is None and answer.get("answer_text")
+    ]
+    return choices, texts
+
+
+def submit_participation(survey, answers, user=None, session_key=None, is_complete=True):
+    """
+    Stores a whole submission (a list of already validated answer dicts) in one transaction
+    Respondents are identified by `user` if they are logged in, otherwise by `session_key`
+    If the survey is limited to one response per user, a previous participation is
+    replaced, as long as the survey allows edits or that participation wasn't completed yet
+    Returns the SurveyParticipation
+    """
+    check_accepts_response(survey, user)
+    return store_participation(
+        survey, answers, user=user, session_key=session_key, is_complete=is_complete
+    )
+
+
+def store_participation(survey, answers, user=None, session_key=None, is_complete=True):
+    """
+    Does the writing for `submit_participation`, without checking whether the survey
+    takes responses
+    """
+    respondent = {"user_account": user} if user is not None else {"user_session": session_key}
+    with transaction.atomic():
+        participation = None
+        previous_answers = []
+        participations = completed = 0
+        if survey.limit_one_response_per_user:
+            participation = _get_single_response(survey, respondent)
+        if participation is None:
+            try:
+                with transaction.atomic():
+                    participation = SurveyParticipation.objects.create(
+                        survey=survey,
+                        is_complete=is_complete,
+                        is_single_response=survey.limit_one_response_per_user,
+                        **respondent,
+                    )
+                participations = 1
+                completed = int(is_complete)
+            except IntegrityError:
+                # a concurrent submission of the same respondent created it first
+                participation = _get_single_response(survey, respondent)
+                if participation is None:
+                    raise
+        if not participations:
+            if participation.is_complete and not survey.allow_edits_after_submit:
+                raise PermissionDenied("You have already responded to this survey.")
+            previous_answers = participation.get_answer_keys()
+            participation.choice_answers.all().delete()
+            participation.answers_of_survey_participation.all().delete()
+            completed = int(is_complete) - int(participation.is_complete)
+            participation.is_complete = is_complete
+            participation.save(update_fields=["is_complete"])
+
+        choices, texts = split_answers(answers)
+        ChoiceAnswer.objects.bulk_create(
+            (
+                ChoiceAnswer(
+                    survey_participation=participation,
+                    question_id=answer["question"],
+                    answer_option_id=answer["answer_option"],
+                )
+                for answer in choices
+            ),
+            touch=False,
+        )
+        Answer.objects.bulk_create(
+            (
+                Answer(
+                    survey_participation=participation,
+                    question_id=answer["question"],
+                    answer_text=answer["answer_text"],
+                )
+                for answer in texts
+            ),
+            touch=False,
+        )
+        SurveyParticipation.objects.touch([participation.pk])
+        record_response_counts(
+            survey.pk,
+            added=[
+                *((answer["question"], answer["answer_option"]) for answer in choices),
+                *((answer["question"], None) for answer in texts),
+            ],
+            removed=previous_answers,
+            participations=participations,
+            completed=completed,
+        )
+    return participation
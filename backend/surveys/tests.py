@@ -1,3 +1,551 @@
-from django.test import TestCase
+import json
+import tempfile
+import uuid
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+
+from .logic import DependencyCycleError, DependencyGraph
+from .models import (
+    Answer,
+    AnswerOption,
+    Question,
+    Survey,
+    SurveyParticipation,
+    SurveySection,
+)
+from .serializers import SurveySerializer
+from .validation import SurveySchema
+from user.models import User
+
+
+def create_user(username="creator"):
+    return User.objects.create_user(
+        f"{username}@example.com", username, "First", "Last", "password"
+    )
+
+
+class OrderedManagerTest(TestCase):
+    def setUp(self):
+        self.survey = Survey.objects.create(creator=create_user())
+        self.section = SurveySection.objects.create(survey=self.survey, name="Section")
+
+    def create_questions(self, count, section=None):
+        return [
+            Question.objects.create(
+                section=section or self.section,
+                question=str(i),
+                question_type=Question.QuestionType.TEXT_RESPONSE,
+            )
+            for i in range(count)
+        ]
+
+    def get_texts(self, section=None):
+        return list(
+            Question.objects.filter(section=section or self.section)
+            .order_by("order")
+            .values_list("question", flat=True)
+        )
+
+    def test_create_appends(self):
+        self.create_questions(3)
+        self.assertEqual(self.get_texts(), ["0", "1", "2"])
+        self.assertEqual(
+            list(Question.objects.order_by("order").values_list("order", flat=True)),
+            [1, 2, 3],
+        )
+
+    def test_create_inserts_at_order(self):
+        self.create_questions(3)
+        Question.objects.create(
+            section=self.section,
+            question="new",
+            question_type=Question.QuestionType.TEXT_RESPONSE,
+            order=2,
+        )
+        self.assertEqual(self.get_texts(), ["0", "new", "1", "2"])
+
+    def test_create_only_shifts_siblings(self):
+        other_section = SurveySection.objects.create(survey=self.survey, name="Other")
+        self.create_questions(2, section=other_section)
+        self.create_questions(2)
+        other_orders = Question.objects.filter(section=other_section).order_by("order")
+        before = list(other_orders.values_list("order", flat=True))
+        Question.objects.create(
+            section=self.section,
+            question="new",
+            question_type=Question.QuestionType.TEXT_RESPONSE,
+            order=1,
+        )
+        self.assertEqual(list(other_orders.values_list("order", flat=True)), before)
+
+    def test_move(self):
+        questions = self.create_questions(4)
+        Question.objects.move(questions[0], 3)
+        self.assertEqual(self.get_texts(), ["1", "2", "0", "3"])
+        Question.objects.move(questions[3], 1)
+        self.assertEqual(self.get_texts(), ["3", "1", "2", "0"])
+
+    def test_make_order_consecutive(self):
+        self.create_questions(4)
+        Question.objects.update(order=F("order") * 3)
+        Question.objects._make_order_consecutive(self.section)
+        self.assertEqual(
+            list(Question.objects.order_by("order").values_list("order", flat=True)),
+            [1, 2, 3, 4],
+        )
+        self.assertEqual(self.get_texts(), ["0", "1", "2", "3"])
+
+    def test_make_order_consecutive_uses_one_statement(self):
+        self.create_questions(50)
+        Question.objects.update(order=F("order") * 2)
+        with CaptureQueriesContext(connection) as queries:
+            Question.objects._make_order_consecutive(self.section)
+        self.assertEqual(len(queries), 1)
+
+    def test_bulk_update_fallback(self):
+        self.create_questions(3)
+        Question.objects.update(order=F("order") + 5)
+        queryset = Question.objects.filter(section=self.section).order_by("order")
+        Question.objects._renumber_with_bulk_update(queryset)
+        self.assertEqual(list(queryset.values_list("order", flat=True)), [1, 2, 3])
+
+    def test_answer_options_and_sections(self):
+        question = self.create_questions(1)[0]
+        for text in ("a", "b", "c"):
+            AnswerOption.objects.create(question=question, text=text)
+        AnswerOption.objects.move(AnswerOption.objects.get(text="c"), 1)
+        self.assertEqual(
+            list(question.answer_options.order_by("order").values_list("text", flat=True)),
+            ["c", "a", "b"],
+        )
+        SurveySection.objects.create(survey=self.survey, name="First", order=1)
+        self.assertEqual(
+            list(self.survey.sections.order_by("order").values_list("name", flat=True)),
+            ["First", "Section"],
+        )
+
+
+@override_settings(SURVEYS_SPARSE_ORDERING=True, SURVEYS_ORDER_GAP=4)
+class SparseOrderingTest(OrderedManagerTest):
+    """
+    Runs all OrderedManagerTest cases with sparse ordering, plus the sparse specifics
+    """
+
+    def get_orders(self):
+        return list(
+            Question.objects.filter(section=self.section)
+            .order_by("order")
+            .values_list("order", flat=True)
+        )
+
+    @staticmethod
+    def get_question_writes(queries):
+        """
+        INSERTs and UPDATEs of Question rows (ie not the Survey version bump)
+        """
+        return [
+            q
+            for q in queries
+            if q["sql"].startswith(("UPDATE", "INSERT"))
+            and '"surveys_question"' in q["sql"].split()[1:3]
+        ]
+
+    def test_create_appends(self):
+        self.create_questions(3)
+        self.assertEqual(self.get_texts(), ["0", "1", "2"])
+        self.assertEqual(self.get_orders(), [4, 8, 12])
+
+    def test_gap_must_leave_room(self):
+        self.create_questions(2)
+        for gap in (1, 0, "4"):
+            with self.subTest(gap=gap), self.settings(SURVEYS_ORDER_GAP=gap):
+                with self.assertRaises(ImproperlyConfigured):
+                    Question.objects.create(
+                        section=self.section,
+                        question="new",
+                        question_type=Question.QuestionType.TEXT_RESPONSE,
+                        order=2,
+                    )
+
+    def test_insert_writes_one_row(self):
+        self.create_questions(3)
+        with CaptureQueriesContext(connection) as queries:
+            Question.objects.create(
+                section=self.section,
+                question="new",
+                question_type=Question.QuestionType.TEXT_RESPONSE,
+                order=2,
+            )
+        writes = self.get_question_writes(queries)
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.get_texts(), ["0", "new", "1", "2"])
+        self.assertEqual(self.get_orders(), [4, 6, 8, 12])
+
+    def test_move_writes_one_row(self):
+        questions = self.create_questions(4)
+        with CaptureQueriesContext(connection) as queries:
+            Question.objects.move(questions[3], 2)
+        writes = self.get_question_writes(queries)
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.get_texts(), ["0", "3", "1", "2"])
+
+    def test_rebalances_when_out_of_room(self):
+        self.create_questions(2)
+        for i in range(3):
+            Question.objects.create(
+                section=self.section,
+                question=f"new{i}",
+                question_type=Question.QuestionType.TEXT_RESPONSE,
+                order=2,
+            )
+        self.assertEqual(self.get_texts(), ["0", "new2", "new1", "new0", "1"])
+        orders = self.get_orders()
+        self.assertEqual(len(set(orders)), 5)
+
+    def test_rebalance_command(self):
+        self.create_questions(3)
+        Question.objects.update(order=F("order") / 4)
+        call_command("rebalance_order", stdout=StringIO())
+        self.assertEqual(self.get_orders(), [4, 8, 12])
+
+    def test_serializer_returns_consecutive_orders(self):
+        self.create_questions(3)
+        data = SurveySerializer(Survey.objects.with_tree().get()).data
+        questions = data["sections"][0]["questions"]
+        self.assertEqual([q["order"] for q in questions], [1, 2, 3])
+        self.assertEqual([q["question"] for q in questions], ["0", "1", "2"])
+
+
+class LastInteractionTest(TestCase):
+    def setUp(self):
+        creator = create_user()
+        survey = Survey.objects.create(creator=creator)
+        section = SurveySection.objects.create(survey=survey, name="Section")
+        self.questions = Question.objects.bulk_create(
+            Question(
+                section=section,
+                question=str(i),
+                question_type=Question.QuestionType.TEXT_RESPONSE,
+                order=i + 1,
+            )
+            for i in range(101)
+        )
+        self.participation = SurveyParticipation.objects.create(
+            survey=survey, user_session="session"
+        )
+        self.long_ago = timezone.now() - timezone.timedelta(days=1)
+        SurveyParticipation.objects.update(last_interaction=self.long_ago)
+
+    def make_answers(self, questions):
+        return [
+            Answer(
+                question=question,
+                survey_participation=self.participation,
+                answer_text=question.question,
+            )
+            for question in questions
+        ]
+
+    def assert_touched(self):
+        self.participation.refresh_from_db()
+        self.assertGreater(self.participation.last_interaction, self.long_ago)
+
+    def test_bulk_create_touches_once(self):
+        for questions in (self.questions[:1], self.questions[1:]):
+            with CaptureQueriesContext(connection) as queries:
+                Answer.objects.bulk_create(self.make_answers(questions))
+            # one INSERT and one UPDATE, however many answers there are
+            self.assertEqual(len(queries), 2)
+        self.assert_touched()
+
+    def test_save_touches_without_fetching_participation(self):
+        answer = self.make_answers(self.questions[:1])[0]
+        answer.survey_participation = SurveyParticipation(pk=self.participation.pk)
+        with CaptureQueriesContext(connection) as queries:
+            answer.save()
+        statements = [q["sql"].split()[0] for q in queries]
+        self.assertEqual(statements.count("SELECT"), 0)
+        self.assert_touched()
+
+
+class SingleResponseConstraintTest(TestCase):
+    def setUp(self):
+        self.respondent = create_user("respondent")
+        self.survey = Survey.objects.create(creator=create_user())
+
+    def test_one_flagged_participation_per_user(self):
+        SurveyParticipation.objects.create(
+            survey=self.survey, user_account=self.respondent, is_single_response=True
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SurveyParticipation.objects.create(
+                survey=self.survey, user_account=self.respondent, is_single_response=True
+            )
+
+    def test_one_flagged_participation_per_session(self):
+        SurveyParticipation.objects.create(
+            survey=self.survey, user_session="session", is_single_response=True
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SurveyParticipation.objects.create(
+                survey=self.survey, user_session="session", is_single_response=True
+            )
+
+    def test_unflagged_participations_are_not_limited(self):
+        for _ in range(2):
+            SurveyParticipation.objects.create(
+                survey=self.survey, user_account=self.respondent
+            )
+        self.assertEqual(SurveyParticipation.objects.count(), 2)
+
+
+class DependencySurveyMixin:
+    """
+    A survey with conditional logic: q1 (yes/no) -> q2 if yes -> q3 if q2 was answered
+    """
+
+    def setUp(self):
+        self.survey = Survey.objects.create(creator=create_user())
+        self.section = SurveySection.objects.create(survey=self.survey, name="Section")
+        self.q1 = self.create_question("q1")
+        self.yes = AnswerOption.objects.create(question=self.q1, text="yes")
+        self.no = AnswerOption.objects.create(question=self.q1, text="no")
+        # q2 is shown if q1 was answered with yes, q3 if q2 was answered at all
+        self.q2 = self.create_question("q2", dependency_answer_option=self.yes)
+        self.q2_option = AnswerOption.objects.create(question=self.q2, text="any")
+        self.q3 = self.create_question("q3", dependency_question=self.q2, is_required=False)
+
+    def create_question(self, text, **kwargs):
+        return Question.objects.create(
+            section=self.section,
+            question=text,
+            question_type=Question.QuestionType.MULTIPLE_CHOICE_SINGLE,
+            **kwargs,
+        )
+
+
+class DependencyGraphTest(DependencySurveyMixin, TestCase):
+    def test_visibility(self):
+        graph = DependencyGraph.load(self.survey.pk)
+        self.assertEqual(graph.visible(set()), {self.q1.pk})
+        self.assertEqual(graph.visible({self.no.pk}), {self.q1.pk})
+        self.assertEqual(graph.visible({self.yes.pk}), {self.q1.pk, self.q2.pk})
+        self.assertEqual(
+            graph.visible({self.yes.pk, self.q2_option.pk}),
+            {self.q1.pk, self.q2.pk, self.q3.pk},
+        )
+        # answers below a hidden question don't make anything visible
+        self.assertEqual(graph.visible({self.no.pk, self.q2_option.pk}), {self.q1.pk})
+
+    def test_required_questions(self):
+        graph = DependencyGraph.load(self.survey.pk)
+        self.assertEqual(
+            graph.required_questions({self.yes.pk, self.q2_option.pk}),
+            {self.q1.pk, self.q2.pk},
+        )
+
+    def test_order_is_topological(self):
+        graph = DependencyGraph.load(self.survey.pk)
+        self.assertEqual(graph.order, [self.q1.pk, self.q2.pk, self.q3.pk])
+
+    def test_cycle_rejected_on_save(self):
+        self.q1.dependency_question = self.q3
+        with self.assertRaises(DependencyCycleError):
+            self.q1.save()
+
+    def test_self_dependency_rejected(self):
+        self.q1.dependency_question = self.q1
+        with self.assertRaises(DependencyCycleError):
+            self.q1.save()
+
+    def test_option_must_belong_to_question_dependency(self):
+        self.q3.dependency_answer_option = self.yes
+        with self.assertRaises(ValidationError):
+            self.q3.save()
+
+    def test_other_survey_rejected(self):
+        other_survey = Survey.objects.create(creator=self.survey.creator)
+        other_section = SurveySection.objects.create(survey=other_survey, name="Other")
+        question = Question(
+            section=other_section,
+            question="x",
+            question_type=Question.QuestionType.TEXT_RESPONSE,
+            order=1,
+            dependency_question=self.q1,
+        )
+        with self.assertRaises(ValidationError):
+            question.save()
+
+    def test_option_moved_into_cycle_rejected(self):
+        # q2 depends on "yes", which would then be one of q2's own options
+        self.yes.question = self.q2
+        with self.assertRaises(DependencyCycleError):
+            self.yes.save()
+        self.assertEqual(AnswerOption.objects.get(pk=self.yes.pk).question, self.q1)
+        DependencyGraph.load(self.survey.pk)
+
+    def test_question_with_dependents_moved_to_other_survey_rejected(self):
+        other_survey = Survey.objects.create(creator=self.survey.creator)
+        other_section = SurveySection.objects.create(survey=other_survey, name="Other")
+        self.q1.section = other_section
+        with self.assertRaises(ValidationError):
+            self.q1.save()
+        self.assertEqual(Question.objects.get(pk=self.q1.pk).section, self.section)
+        # the whole section can move, its questions still share a survey
+        self.section.survey = other_survey
+        self.section.save()
+        self.assertEqual(DependencyGraph.load(other_survey.pk).order[0], self.q1.pk)
+
+    def test_graph_detects_cycles(self):
+        questions = [
+            {"id": 1, "is_required": True, "dependency_question": 2, "dependency_answer_option": None},
+            {"id": 2, "is_required": True, "dependency_question": 1, "dependency_answer_option": None},
+            {"id": 3, "is_required": True, "dependency_question": None, "dependency_answer_option": None},
+        ]
+        with self.assertRaises(DependencyCycleError):
+            DependencyGraph(questions, [])
+
+
+class SurveySchemaTest(DependencySurveyMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.text_question = self.create_question("text", is_required=False)
+        Question.objects.filter(pk=self.text_question.pk).update(
+            question_type=Question.QuestionType.TEXT_RESPONSE
+        )
+        self.schema = SurveySchema.load(self.survey.pk)
+
+    def validate(self, answers, is_complete=True):
+        with self.assertNumQueries(0):
+            return self.schema.validate(answers, is_complete)
+
+    def option(self, option):
+        return {"question": option.question_id, "answer_option": option.pk}
+
+    def test_valid_submission(self):
+        answers = [self.option(self.yes), self.option(self.q2_option)]
+        self.assertEqual(self.validate(answers), [])
+
+    def test_hidden_question_is_not_required(self):
+        self.assertEqual(self.validate([self.option(self.no)]), [])
+
+    def test_visible_required_question_is_required(self):
+        errors = self.validate([self.option(self.yes)])
+        self.assertEqual(errors, [f"Question {self.q2.pk} is required"])
+        self.assertEqual(self.validate([self.option(self.yes)], is_complete=False), [])
+
+    def test_answer_to_hidden_question(self):
+        errors = self.validate([self.option(self.no), self.option(self.q2_option)])
+        self.assertEqual(errors, [f"Question {self.q2.pk} is not shown for the given answers"])
+
+    def test_single_choice_takes_one_option(self):
+        errors = self.validate([self.option(self.yes), self.option(self.no)])
+        self.assertIn(f"Question {self.q1.pk} only takes a single answer", errors)
+
+    def test_text_length(self):
+        answers = [
+            self.option(self.no),
+            {"question": self.text_question.pk, "answer_text": "x" * 1001},
+        ]
+        self.assertEqual(len(self.validate(answers)), 1)
+        answers[1]["answer_text"] = "x" * 1000
+        self.assertEqual(self.validate(answers), [])
+
+    def test_text_question_takes_no_option(self):
+        answers = [
+            self.option(self.no),
+            {"question": self.text_question.pk, "answer_option": self.no.pk},
+        ]
+        self.assertEqual(len(self.validate(answers)), 1)
+
+    def test_unknown_question_and_option(self):
+        other = AnswerOption(pk=uuid.uuid4(), question_id=self.q1.pk)
+        errors = self.validate(
+            [{"question": uuid.uuid4(), "answer_option": None}, self.option(other)]
+        )
+        # the unknown option also leaves the required q1 unanswered
+        self.assertEqual(len(errors), 3)
+
+
+class SurveyDumpLoadTest(DependencySurveyMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = str(Path(directory.name) / "surveys.json")
+
+    def dump(self, *survey_ids):
+        call_command("dump_surveys", *map(str, survey_ids), output=self.path, stderr=StringIO())
+        return Path(self.path).read_bytes()
+
+    def load(self):
+        call_command("load_surveys", self.path, creator="creator@example.com", stdout=StringIO())
+
+    def get_tree(self, survey):
+        """
+        The serialized tree, with dependencies as texts instead of ids
+        """
+        tree = SurveySerializer(Survey.objects.with_tree().get(pk=survey.pk)).data
+        names = {
+            **dict(Question.objects.values_list("id", "question")),
+            **dict(AnswerOption.objects.values_list("id", "text")),
+        }
+        for section in tree["sections"]:
+            del section["id"]
+            for question in section["questions"]:
+                for key in ("id", "section"):
+                    del question[key]
+                for key in ("dependency_question", "dependency_answer_option"):
+                    question[key] = names.get(question[key])
+                for option in question["answer_options"]:
+                    del option["id"]
+        for key in ("id", "creation_date"):
+            del tree[key]
+        return tree
+
+    def test_round_trip(self):
+        self.dump(self.survey.pk)
+        self.load()
+        copy = Survey.objects.exclude(pk=self.survey.pk).get()
+        self.assertEqual(self.get_tree(copy), self.get_tree(self.survey))
+        q2 = Question.objects.get(section__survey=copy, question="q2")
+        self.assertEqual(q2.dependency_answer_option.question.section.survey, copy)
+        self.assertNotEqual(q2.dependency_answer_option, self.yes)
+
+    def test_dump_is_canonical(self):
+        first = self.dump()
+        self.assertEqual(self.dump(), first)
+        dump = json.loads(first)
+        self.assertEqual(dump["version"], 1)
+        self.assertEqual(len(dump["surveys"]), 1)
+
+    def test_load_query_count_does_not_depend_on_survey_count(self):
+        counts = []
+        for copies in (1, 20):
+            dump = json.loads(self.dump(self.survey.pk))
+            dump["surveys"] *= copies
+            Path(self.path).write_text(json.dumps(dump))
+            with CaptureQueriesContext(connection) as queries:
+                self.load()
+            counts.append(len(queries))
+        self.assertEqual(Survey.objects.count(), 22)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_dump_loads_nothing(self):
+        dump = json.loads(self.dump())
+        dump["surveys"].append(dict(dump["surveys"][0], sections=[{"questions": []}]))
+        Path(self.path).write_text(json.dumps(dump))
+        with self.assertRaises(CommandError):
+            self.load()
+        Path(self.path).write_text(json.dumps({"surveys": []}))
+        with self.assertRaises(CommandError):
+            self.load()
+        self.assertEqual(Survey.objects.count(), 1)
@@ -0,0 +1,115 @@
+"""
+Validation of survey submissions against a Survey's questions and answer options
+The schema is loaded once per survey version (see `surveys.cache.get_survey_schema`),
+after which whole submissions are validated in memory without any queries
+"""
+from .logic import DependencyGraph
+from .models import AnswerOption, Question
+
+MAX_ANSWER_TEXT_LENGTH = 1000
+
+
+class SurveySchema:
+    """
+    In-memory lookup tables for one Survey's questions, answer options and conditional
+    logic
+    """
+
+    def __init__(self, questions, answer_options):
+        # question id => question_type
+        self.question_types = {q["id"]: q["question_type"] for q in questions}
+        # answer option id => question id
+        self.answer_options = {a["id"]: a["question"] for a in answer_options}
+        self.graph = DependencyGraph(questions, answer_options)
+
+    @classmethod
+    def load(cls, survey_id):
+        questions = Question.objects.filter(section__survey_id=survey_id).values(
+            "id",
+            "question_type",
+            "is_required",
+            "dependency_question",
+            "dependency_answer_option",
+        )
+        answer_options = AnswerOption.objects.filter(
+            question__section__survey_id=survey_id
+        ).values("id", "question")
+        return cls(list(questions), list(answer_options))
+
+    def validate(self, answers, is_complete=True):
+        """
+        Checks a list of answer dicts (`question`, `answer_option`, `answer_text`)
+        Returns a list of error messages, which is empty if the answers are valid
+
+        - every question and answer option has to belong to the survey, and every answer
+          option to the question it answers
+        - text questions take a text of at most MAX_ANSWER_TEXT_LENGTH characters and no
+          answer option, single choice questions exactly one answer option, multiple
+          choice questions any number of distinct answer options
+        - questions that are hidden by the conditional logic can't be answered
+        - if the submission is complete, every visible required question has to be
+          answered
+        """
+        errors = []
+        question_types = self.question_types
+        option_questions = self.answer_options
+        text_response = Question.QuestionType.TEXT_RESPONSE
+        multiple_choice_multi = Question.QuestionType.MULTIPLE_CHOICE_MULTI
+
+        answer_counts = {}
+        chosen_options = set()
+        for index, answer in enumerate(answers):
+            question = answer["question"]
+            question_type = question_types.get(question)
+            if question_type is None:
+                errors.append(
+                    f"Answer {index}: question {question} is not part of this survey"
+                )
+                continue
+            answer_option = answer.get("answer_option")
+            if question_type == text_response:
+                if answer_option is not None:
+                    errors.append(
+                        f"Answer {index}: text questions don't take answer options"
+                    )
+                    continue
+                text = answer.get("answer_text") or ""
+                if len(text) > MAX_ANSWER_TEXT_LENGTH:
+                    errors.append(
+                        f"Answer {index}: text is longer than "
+                        f"{MAX_ANSWER_TEXT_LENGTH} characters"
+                    )
+                    continue
+                if not text:
+                    continue
+            else:
+                if answer_option is None:
+                    errors.append(f"Answer {index}: an answer option is required")
+                    continue
+                if option_questions.get(answer_option) != question:
+                    errors.append(
+                        f"Answer {index}: answer option {answer_option} does not "
+                        f"belong to question {question}"
+                    )
+                    continue
+                if answer_option in chosen_options:
+                    errors.append(
+                        f"Answer {index}: answer option {answer_option} was already "
+                        "chosen"
+                    )
+                    continue
+                chosen_options.add(answer_option)
+            answer_counts[question] = answer_counts.get(question, 0) + 1
+
+        for question, count in answer_counts.items():
+            if count > 1 and question_types[question] != multiple_choice_multi:
+                errors.append(f"Question {question} only takes a single answer")
+
+        visible = self.graph.visible(chosen_options, answer_counts)
+        for question in answer_counts.keys() - visible:
+            errors.append(f"Question {question} is not shown for the given answers")
+
+        if is_complete:
+            for question in (self.graph.required & visible) - answer_counts.keys():
+                errors.append(f"Question {question} is required")
+        return errors
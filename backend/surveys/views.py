@@ -1,7 +1,8 @@
 from django.shortcuts import render
 from rest_framework import generics
 
-# from .models import Form
+from .models import Survey
+from .serializers import SurveySerializer
 
 from rest_framework.permissions import (
     SAFE_METHODS,
@@ -12,4 +13,5 @@ from rest_framework.permissions import (
 
 
 class SurveyDetail(generics.RetrieveUpdateDestroyAPIView):
-    pass
+    queryset = Survey.objects.with_tree()
+    serializer_class = SurveySerializer
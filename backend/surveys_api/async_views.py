@@ -0,0 +1,99 @@
+"""
+Async versions of the survey detail and submission endpoints, for deployments that
+serve the API through `core.asgi`
+A single ASGI worker can keep many respondents' requests in flight; the ORM calls
+themselves still run through `sync_to_async`, one at a time on the worker's sync thread,
+since Django 3.2 has no async query methods
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import get_conditional_response
+from rest_framework import exceptions
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from surveys.cache import get_survey_tree
+from surveys.models import Survey
+from surveys.serializers import SubmissionSerializer
+
+from .views import (
+    add_survey_validators,
+    get_submission_schema,
+    get_survey_validators,
+    save_submission,
+)
+
+
+@sync_to_async
+def _get_survey(pk):
+    survey = Survey.objects.filter(pk=pk).first()
+    if survey is None:
+        raise Http404("No Survey matches the given query.")
+    return survey
+
+
+@sync_to_async
+def _read_submission(request, survey):
+    """
+    Authenticates the request like the DRF views do, and returns it as a DRF request
+    with the survey's schema
+    """
+    request = Request(
+        request,
+        parsers=[JSONParser()],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    # both are lazy, and authenticating may query the database
+    request.user, request.data
+    return request, get_submission_schema(survey)
+
+
+def _error_response(exc):
+    if isinstance(exc, PermissionDenied):
+        exc = exceptions.PermissionDenied(*exc.args)
+    if isinstance(exc, exceptions.ValidationError):
+        data = exc.detail
+    else:
+        data = {"detail": exc.detail}
+    return JsonResponse(data, status=exc.status_code, safe=False)
+
+
+async def form_detail(request, pk):
+    """
+    Async counterpart of `FormDetail` GET, with the same conditional responses
+    """
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    survey = await _get_survey(pk)
+    etag, last_modified = get_survey_validators(survey)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(await sync_to_async(get_survey_tree)(survey))
+    return add_survey_validators(response, etag, last_modified)
+
+
+async def form_submit(request, pk):
+    """
+    Async counterpart of `FormSubmit`
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    survey = await _get_survey(pk)
+    try:
+        request, schema = await _read_submission(request, survey)
+        # validation runs against the cached schema and makes no queries
+        serializer = SubmissionSerializer(data=request.data, context={"schema": schema})
+        serializer.is_valid(raise_exception=True)
+        data, status_code = await sync_to_async(save_submission)(
+            request, survey, serializer.validated_data
+        )
+    except (exceptions.APIException, PermissionDenied) as exc:
+        return _error_response(exc)
+    return JsonResponse(data, status=status_code)
+
+
+# like DRF's APIView, CSRF is only enforced for session-authenticated users,
+# by SessionAuthentication in `_read_submission`
+form_submit.csrf_exempt = True
@@ -1,3 +1,1532 @@
-from django.test import TestCase
+import base64
+import csv
+import json
+import tempfile
+from datetime import timedelta
+from importlib.util import find_spec
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from surveys.models import (
+    Answer,
+    AnswerOption,
+    AnswerOptionResponseCount,
+    ChoiceAnswer,
+    Question,
+    QueuedSubmission,
+    ResponseRateBucket,
+    Survey,
+    SurveyParticipation,
+    SurveySection,
+)
+from surveys import analytics
+from surveys.cache import survey_cache_key
+from surveys.rates import compact_response_rates
+from surveys.scheduling import close_due_surveys, open_due_surveys
+from surveys.snapshots import load_snapshot, snapshot_path
+from user.models import User
+
+
+def create_user(username="creator"):
+    return User.objects.create_user(
+        f"{username}@example.com", username, "First", "Last", "password"
+    )
+
+
+def create_survey_tree(creator, sections=1, questions=1, answer_options=2):
+    """
+    Creates a Survey with the given number of sections, questions per section
+    and answer options per question, using bulk inserts to keep the tests fast
+    """
+    survey = Survey.objects.create(creator=creator, title="Test Survey")
+    section_objs = SurveySection.objects.bulk_create(
+        SurveySection(survey=survey, name=f"Section {s}", subheading="", order=s + 1)
+        for s in range(sections)
+    )
+    question_objs = Question.objects.bulk_create(
+        Question(
+            section=section,
+            question=f"Question {q}",
+            subheading="",
+            question_type=Question.QuestionType.MULTIPLE_CHOICE_SINGLE,
+            order=q + 1,
+        )
+        for section in section_objs
+        for q in range(questions)
+    )
+    AnswerOption.objects.bulk_create(
+        AnswerOption(question=question, text=f"Option {a}", order=a + 1)
+        for question in question_objs
+        for a in range(answer_options)
+    )
+    return survey
+
+
+class FormDetailTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+
+    def get_query_count(self, survey):
+        url = reverse("surveys_api:formdetail", kwargs={"pk": survey.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_returns_tree_in_order(self):
+        survey = create_survey_tree(self.creator, sections=2, questions=3)
+        # shuffle the stored orders so the test doesn't pass by accident
+        Question.objects.filter(order=1).update(order=10)
+        _, data = self.get_query_count(survey)
+        self.assertEqual([s["order"] for s in data["sections"]], [1, 2])
+        for section in data["sections"]:
+            self.assertEqual(
+                [q["question"] for q in section["questions"]],
+                ["Question 1", "Question 2", "Question 0"],
+            )
+            # stored orders are not exposed, clients always see 1..n
+            self.assertEqual([q["order"] for q in section["questions"]], [1, 2, 3])
+            for question in section["questions"]:
+                self.assertEqual(
+                    [a["text"] for a in question["answer_options"]],
+                    ["Option 0", "Option 1"],
+                )
+
+    def test_query_count_is_constant(self):
+        small = create_survey_tree(self.creator, sections=1, questions=1)
+        large = create_survey_tree(self.creator, sections=10, questions=50)
+        small_count, _ = self.get_query_count(small)
+        large_count, data = self.get_query_count(large)
+        self.assertEqual(sum(len(s["questions"]) for s in data["sections"]), 500)
+        self.assertEqual(small_count, large_count)
+
+    def test_unknown_survey_returns_404(self):
+        url = reverse(
+            "surveys_api:formdetail",
+            kwargs={"pk": "00000000-0000-0000-0000-000000000000"},
+        )
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class FormSubmitTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.survey = create_survey_tree(self.creator, sections=1, questions=3)
+        self.questions = list(
+            Question.objects.filter(section__survey=self.survey).order_by("order")
+        )
+        self.url = reverse("surveys_api:formsubmit", kwargs={"pk": self.survey.pk})
+
+    def first_option(self, question):
+        return question.answer_options.order_by("order").first()
+
+    def full_payload(self):
+        return {
+            "answers": [
+                {"question": str(q.id), "answer_option": str(self.first_option(q).id)}
+                for q in self.questions
+            ]
+        }
+
+    def submit(self, payload):
+        return self.client.post(self.url, payload, content_type="application/json")
+
+    def test_survey_with_dependency_cycle_is_rejected(self):
+        first, second = self.questions[:2]
+        # written around Question.save(), which rejects cycles
+        Question.objects.filter(pk=first.pk).update(dependency_question=second)
+        Question.objects.filter(pk=second.pk).update(dependency_question=first)
+        Survey.objects.filter(pk=self.survey.pk).bump_version()
+        response = self.submit(self.full_payload())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cycle", response.json()["non_field_errors"][0])
+
+    def test_anonymous_submission(self):
+        response = self.submit(self.full_payload())
+        self.assertEqual(response.status_code, 201, response.content)
+        participation = SurveyParticipation.objects.get()
+        self.assertIsNone(participation.user_account)
+        self.assertIsNotNone(participation.user_session)
+        self.assertEqual(participation.choice_answers.count(), 3)
+
+    def test_logged_in_submission(self):
+        respondent = create_user("respondent")
+        self.client.force_login(respondent)
+        response = self.submit(self.full_payload())
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(SurveyParticipation.objects.get().user_account, respondent)
+
+    def test_resubmission_replaces_answers(self):
+        self.submit(self.full_payload())
+        self.submit(self.full_payload())
+        self.assertEqual(SurveyParticipation.objects.count(), 1)
+        self.assertEqual(ChoiceAnswer.objects.count(), 3)
+
+    def test_resubmission_without_edits(self):
+        Survey.objects.filter(pk=self.survey.pk).update(allow_edits_after_submit=False)
+        self.assertEqual(self.submit(self.full_payload()).status_code, 201)
+        self.assertEqual(self.submit(self.full_payload()).status_code, 403)
+
+    def test_anonymous_not_allowed(self):
+        Survey.objects.filter(pk=self.survey.pk).update(allow_anonymous_responses=False)
+        self.assertEqual(self.submit(self.full_payload()).status_code, 403)
+
+    def test_inactive_survey(self):
+        self.survey.is_active = False
+        self.survey.save()
+        self.assertEqual(self.submit(self.full_payload()).status_code, 403)
+
+    def test_option_of_other_question(self):
+        payload = self.full_payload()
+        payload["answers"][0]["answer_option"] = payload["answers"][1]["answer_option"]
+        response = self.submit(payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ChoiceAnswer.objects.exists())
+
+    def test_missing_required_answer(self):
+        payload = self.full_payload()
+        payload["answers"].pop()
+        self.assertEqual(self.submit(payload).status_code, 400)
+        payload["is_complete"] = False
+        self.assertEqual(self.submit(payload).status_code, 201)
+
+    def test_single_choice_takes_one_option(self):
+        payload = self.full_payload()
+        question = self.questions[0]
+        second = question.answer_options.order_by("order")[1]
+        payload["answers"].append(
+            {"question": str(question.id), "answer_option": str(second.id)}
+        )
+        self.assertEqual(self.submit(payload).status_code, 400)
+
+    def test_text_answers_are_stored_apart_from_choices(self):
+        text_question = Question.objects.create(
+            section=self.questions[0].section,
+            question="Comments",
+            question_type=Question.QuestionType.TEXT_RESPONSE,
+            is_required=False,
+        )
+        payload = self.full_payload()
+        payload["answers"].append({"question": str(text_question.id), "answer_text": "Hi"})
+        self.assertEqual(self.submit(payload).status_code, 201)
+        self.assertEqual(ChoiceAnswer.objects.count(), 3)
+        answer = Answer.objects.get()
+        self.assertEqual((answer.question, answer.answer_text), (text_question, "Hi"))
+
+    def test_query_count_does_not_depend_on_answer_count(self):
+        small = create_survey_tree(self.creator, sections=1, questions=1)
+        large = create_survey_tree(self.creator, sections=2, questions=25)
+        counts = []
+        for survey in (small, large):
+            self.client.logout()
+            payload = {
+                "answers": [
+                    {"question": str(q.id), "answer_option": str(self.first_option(q).id)}
+                    for q in Question.objects.filter(section__survey=survey)
+                ]
+            }
+            url = reverse("surveys_api:formsubmit", kwargs={"pk": survey.pk})
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, payload, content_type="application/json")
+            self.assertEqual(response.status_code, 201, response.content)
+            counts.append(len(queries))
+        self.assertEqual(
+            ChoiceAnswer.objects.filter(survey_participation__survey=large).count(), 50
+        )
+        self.assertEqual(counts[0], counts[1])
+
+
+class FormResultsTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.survey = create_survey_tree(self.creator, sections=1, questions=2)
+        self.questions = list(
+            Question.objects.filter(section__survey=self.survey).order_by("order")
+        )
+        self.submit_url = reverse("surveys_api:formsubmit", kwargs={"pk": self.survey.pk})
+        self.results_url = reverse("surveys_api:formresults", kwargs={"pk": self.survey.pk})
+
+    def submit(self, option_index, client=None):
+        payload = {
+            "answers": [
+                {
+                    "question": str(q.id),
+                    "answer_option": str(
+                        q.answer_options.order_by("order")[option_index].id
+                    ),
+                }
+                for q in self.questions
+            ]
+        }
+        response = (client or self.client).post(
+            self.submit_url, payload, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def get_results(self):
+        self.client.force_login(self.creator)
+        response = self.client.get(self.results_url)
+        self.client.logout()
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def option_counts(self, results):
+        return [
+            [option["count"] for option in question["answer_options"]]
+            for question in results["questions"]
+        ]
+
+    def test_counts_submissions(self):
+        self.submit(0, client=self.client_class())
+        self.submit(0, client=self.client_class())
+        self.submit(1, client=self.client_class())
+        results = self.get_results()
+        self.assertEqual(results["participations"], 3)
+        self.assertEqual(results["completed"], 3)
+        self.assertEqual([q["responses"] for q in results["questions"]], [3, 3])
+        self.assertEqual(self.option_counts(results), [[2, 1], [2, 1]])
+
+    def test_edits_move_counts(self):
+        client = self.client_class()
+        self.submit(0, client=client)
+        self.submit(1, client=client)
+        results = self.get_results()
+        self.assertEqual(results["participations"], 1)
+        self.assertEqual(self.option_counts(results), [[0, 1], [0, 1]])
+
+    def test_delete_participation(self):
+        self.submit(0, client=self.client_class())
+        self.submit(1, client=self.client_class())
+        SurveyParticipation.objects.order_by("last_interaction").first().delete()
+        results = self.get_results()
+        self.assertEqual(results["participations"], 1)
+        self.assertEqual(sum(map(sum, self.option_counts(results))), 2)
+
+    def test_rebuild_matches_incremental_counts(self):
+        self.submit(0, client=self.client_class())
+        self.submit(1, client=self.client_class())
+        expected = self.get_results()
+        AnswerOptionResponseCount.objects.update(count=99)
+        call_command("rebuild_response_counts", stdout=StringIO())
+        self.assertEqual(self.get_results(), expected)
+
+    def test_only_creator_sees_results(self):
+        self.assertEqual(self.client.get(self.results_url).status_code, 401)
+        self.client.force_login(create_user("other"))
+        self.assertEqual(self.client.get(self.results_url).status_code, 403)
+
+
+class FormExportTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.survey = create_survey_tree(self.creator, sections=1, questions=2)
+        self.questions = list(
+            Question.objects.filter(section__survey=self.survey).order_by("order")
+        )
+        self.url = reverse("surveys_api:formexport", kwargs={"pk": self.survey.pk})
+        for option_index in (0, 1):
+            response = self.client_class().post(
+                reverse("surveys_api:formsubmit", kwargs={"pk": self.survey.pk}),
+                {
+                    "answers": [
+                        {
+                            "question": str(q.id),
+                            "answer_option": str(
+                                q.answer_options.order_by("order")[option_index].id
+                            ),
+                        }
+                        for q in self.questions
+                    ]
+                },
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 201, response.content)
+        self.client.force_login(self.creator)
+
+    def get_export(self, output):
+        response = self.client.get(self.url, {"output": output})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        rows = list(csv.reader(self.get_export("csv").splitlines()))
+        self.assertEqual(rows[0][-2:], ["Question 0", "Question 1"])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(
+            sorted(row[-2:] for row in rows[1:]),
+            [["Option 0", "Option 0"], ["Option 1", "Option 1"]],
+        )
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.get_export("ndjson").splitlines()]
+        self.assertEqual(len(rows), 2)
+        for row in rows:
+            self.assertEqual(
+                list(row["answers"]), [str(q.id) for q in self.questions]
+            )
+
+    def test_unknown_output(self):
+        response = self.client.get(self.url, {"output": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_creator_can_export(self):
+        self.client.force_login(create_user("other"))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class SurveyCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.creator = create_user()
+        self.survey = create_survey_tree(self.creator, sections=1, questions=2)
+        self.section = self.survey.sections.get()
+        self.url = reverse("surveys_api:formdetail", kwargs={"pk": self.survey.pk})
+
+    def get_tree(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get_question_texts(self):
+        return [q["question"] for q in self.get_tree()["sections"][0]["questions"]]
+
+    def test_second_read_is_served_from_cache(self):
+        self.get_tree()
+        with self.assertNumQueries(1):
+            self.get_tree()
+
+    def test_create_invalidates(self):
+        self.get_tree()
+        Question.objects.create(
+            section=self.section,
+            question="New",
+            question_type=Question.QuestionType.TEXT_RESPONSE,
+            order=1,
+        )
+        self.assertEqual(self.get_question_texts(), ["New", "Question 0", "Question 1"])
+
+    def test_move_invalidates(self):
+        self.get_tree()
+        Question.objects.move(Question.objects.get(question="Question 1"), 1)
+        self.assertEqual(self.get_question_texts(), ["Question 1", "Question 0"])
+
+    def test_delete_invalidates(self):
+        self.get_tree()
+        Question.objects.get(question="Question 0").delete()
+        self.assertEqual(self.get_question_texts(), ["Question 1"])
+
+    def test_answer_option_edit_invalidates(self):
+        self.get_tree()
+        option = AnswerOption.objects.filter(question__question="Question 0").first()
+        option.text = "Edited"
+        option.save()
+        options = self.get_tree()["sections"][0]["questions"][0]["answer_options"]
+        self.assertIn("Edited", [o["text"] for o in options])
+
+    def test_survey_edit_invalidates(self):
+        self.get_tree()
+        self.survey.title = "Renamed"
+        self.survey.save()
+        self.assertEqual(self.survey.version, 2)
+        self.assertEqual(self.get_tree()["title"], "Renamed")
+
+    def test_survey_edit_with_update_fields_invalidates(self):
+        self.get_tree()
+        self.survey.title = "Renamed"
+        self.survey.save(update_fields=["title"])
+        self.assertEqual(self.survey.version, 2)
+        self.assertEqual(self.get_tree()["title"], "Renamed")
+
+    def test_moving_to_another_survey_invalidates_both(self):
+        other = create_survey_tree(self.creator, sections=1, questions=0)
+        other_url = reverse("surveys_api:formdetail", kwargs={"pk": other.pk})
+        self.get_tree()
+        self.client.get(other_url)
+        question = Question.objects.get(question="Question 1")
+        question.section = other.sections.get()
+        question.save()
+        self.assertEqual(self.get_question_texts(), ["Question 0"])
+        moved = self.client.get(other_url).json()["sections"][0]["questions"]
+        self.assertEqual([q["question"] for q in moved], ["Question 1"])
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.survey = create_survey_tree(self.creator, sections=1, questions=2)
+        self.url = reverse("surveys_api:formdetail", kwargs={"pk": self.survey.pk})
+
+    def test_matching_etag_returns_304_with_one_query(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url)["Last-Modified"]
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed_survey_returns_new_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        question = Question.objects.filter(section__survey=self.survey).first()
+        question.question = "Edited"
+        question.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn(
+            "Edited",
+            [q["question"] for q in response.json()["sections"][0]["questions"]],
+        )
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.survey = create_survey_tree(self.creator, sections=1, questions=2)
+        self.detail_url = reverse("surveys_api:formdetail_async", kwargs={"pk": self.survey.pk})
+        self.submit_url = reverse("surveys_api:formsubmit_async", kwargs={"pk": self.survey.pk})
+
+    def full_payload(self):
+        return {
+            "answers": [
+                {
+                    "question": str(q.id),
+                    "answer_option": str(q.answer_options.order_by("order").first().id),
+                }
+                for q in Question.objects.filter(section__survey=self.survey)
+            ]
+        }
+
+    def submit(self, payload):
+        return self.client.post(self.submit_url, payload, content_type="application/json")
+
+    def test_detail_matches_sync_view(self):
+        sync_url = reverse("surveys_api:formdetail", kwargs={"pk": self.survey.pk})
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self.client.get(sync_url).json())
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_survey_returns_404(self):
+        url = reverse(
+            "surveys_api:formdetail_async",
+            kwargs={"pk": "00000000-0000-0000-0000-000000000000"},
+        )
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_submission(self):
+        response = self.submit(self.full_payload())
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(response.json()["is_complete"])
+        self.submit(self.full_payload())
+        participation = SurveyParticipation.objects.get()
+        self.assertIsNotNone(participation.user_session)
+        self.assertEqual(participation.choice_answers.count(), 2)
+
+    def test_logged_in_submission(self):
+        respondent = create_user("respondent")
+        self.client.force_login(respondent)
+        self.assertEqual(self.submit(self.full_payload()).status_code, 201)
+        self.assertEqual(SurveyParticipation.objects.get().user_account, respondent)
+
+    def test_errors_match_sync_view(self):
+        payload = self.full_payload()
+        payload["answers"].pop()
+        response = self.submit(payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("answers", response.json())
+        self.survey.is_active = False
+        self.survey.save()
+        response = self.submit(self.full_payload())
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(
+            response.json(), {"detail": "This survey is not accepting responses."}
+        )
+        self.assertEqual(self.client.get(self.submit_url).status_code, 405)
+
+
+@override_settings(SURVEYS_INGESTION_QUEUE=True)
+class IngestionQueueTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.survey = create_survey_tree(self.creator, sections=1, questions=2)
+        self.questions = list(
+            Question.objects.filter(section__survey=self.survey).order_by("order")
+        )
+        self.url = reverse("surveys_api:formsubmit", kwargs={"pk": self.survey.pk})
+
+    def submit(self, option_index=0, client=None, **headers):
+        payload = {
+            "answers": [
+                {
+                    "question": str(q.id),
+                    "answer_option": str(
+                        q.answer_options.order_by("order")[option_index].id
+                    ),
+                }
+                for q in self.questions
+            ]
+        }
+        return (client or self.client).post(
+            self.url, payload, content_type="application/json", **headers
+        )
+
+    def drain(self):
+        call_command("drain_submissions", stdout=StringIO())
+
+    def test_submission_is_queued(self):
+        response = self.submit()
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(response.json()["status"], "queued")
+        self.assertEqual(QueuedSubmission.objects.get().idempotency_key, response.json()["id"])
+        self.assertFalse(SurveyParticipation.objects.exists())
+
+    def test_invalid_and_closed_submissions_are_not_queued(self):
+        response = self.client.post(
+            self.url, {"answers": []}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.survey.is_active = False
+        self.survey.save()
+        self.assertEqual(self.submit().status_code, 403)
+        self.assertFalse(QueuedSubmission.objects.exists())
+
+    def test_drain_writes_participations_and_counts(self):
+        for option_index in (0, 0, 1):
+            self.submit(option_index, client=self.client_class())
+        self.drain()
+        self.assertEqual(SurveyParticipation.objects.count(), 3)
+        self.assertEqual(ChoiceAnswer.objects.count(), 6)
+        self.assertFalse(QueuedSubmission.objects.filter(processed__isnull=True).exists())
+        counts = dict(AnswerOptionResponseCount.objects.values_list("answer_option", "count"))
+        call_command("rebuild_response_counts", stdout=StringIO())
+        self.assertEqual(
+            dict(AnswerOptionResponseCount.objects.values_list("answer_option", "count")),
+            counts,
+        )
+        self.assertEqual(sorted(counts.values()), [1, 1, 2, 2])
+
+    def test_retries_are_written_once(self):
+        for _ in range(2):
+            self.submit(HTTP_IDEMPOTENCY_KEY="retry")
+        self.drain()
+        self.submit(HTTP_IDEMPOTENCY_KEY="retry")
+        self.drain()
+        self.assertEqual(QueuedSubmission.objects.count(), 1)
+        self.assertEqual(SurveyParticipation.objects.count(), 1)
+        self.assertEqual(self.survey.response_count.count, 1)
+
+    def test_keys_are_scoped_to_the_respondent(self):
+        for client in (self.client, self.client_class()):
+            response = self.submit(client=client, HTTP_IDEMPOTENCY_KEY="1")
+            self.assertEqual(response.status_code, 202, response.content)
+        self.drain()
+        self.assertEqual(SurveyParticipation.objects.count(), 2)
+
+    def test_key_reused_for_another_submission_is_rejected(self):
+        self.assertEqual(self.submit(0, HTTP_IDEMPOTENCY_KEY="1").status_code, 202)
+        response = self.submit(1, HTTP_IDEMPOTENCY_KEY="1")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(QueuedSubmission.objects.count(), 1)
+
+    def test_repeated_response_replaces_earlier_one(self):
+        self.submit(0)
+        self.drain()
+        self.submit(1)
+        self.submit(0)
+        self.submit(1)
+        self.drain()
+        participation = SurveyParticipation.objects.get()
+        self.assertEqual(
+            set(participation.choice_answers.values_list("answer_option__order", flat=True)),
+            {2},
+        )
+        self.assertEqual(self.survey.response_count.count, 1)
+
+    def test_survey_edited_after_queueing(self):
+        self.submit(0, client=self.client_class())
+        self.submit(1, client=self.client_class())
+        self.questions[0].answer_options.order_by("order")[1].delete()
+        self.drain()
+        self.assertEqual(SurveyParticipation.objects.count(), 1)
+        self.assertFalse(QueuedSubmission.objects.filter(processed__isnull=True).exists())
+        [dropped] = QueuedSubmission.objects.exclude(error="")
+        self.assertIn("does not belong to question", dropped.error)
+
+    def test_drain_query_count_does_not_depend_on_queue_size(self):
+        counts = []
+        for size in (1, 20):
+            for _ in range(size):
+                self.submit(client=self.client_class())
+            with CaptureQueriesContext(connection) as queries:
+                self.drain()
+            counts.append(len(queries))
+        self.assertEqual(SurveyParticipation.objects.count(), 21)
+        self.assertEqual(counts[0], counts[1])
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Uses a second SQLite file as the replica, which is only updated by `replicate()`
+    (SQLite can't back up a database from inside a transaction, hence TransactionTestCase)
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # added after the test databases are set up, so queries to it are allowed
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings["replica"] = {
+            **connections.settings["default"],
+            "NAME": str(Path(cls.directory.name) / "replica.sqlite3"),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.creator = create_user()
+        self.survey = create_survey_tree(self.creator, sections=1, questions=2)
+        self.questions = list(
+            Question.objects.filter(section__survey=self.survey).order_by("order")
+        )
+        self.submit()
+        self.replicate()
+        # the replica lags behind by this submission
+        self.submit()
+        self.client.force_login(self.creator)
+
+    def submit(self):
+        payload = {
+            "answers": [
+                {
+                    "question": str(q.id),
+                    "answer_option": str(q.answer_options.order_by("order").first().id),
+                }
+                for q in self.questions
+            ]
+        }
+        response = self.client_class().post(
+            reverse("surveys_api:formsubmit", kwargs={"pk": self.survey.pk}),
+            payload,
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def replicate(self):
+        replica = connections["replica"]
+        replica.ensure_connection()
+        connection.ensure_connection()
+        connection.connection.backup(replica.connection)
+
+    def get_participations(self):
+        url = reverse("surveys_api:formresults", kwargs={"pk": self.survey.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["participations"]
+
+    def test_results_are_read_from_replica(self):
+        self.assertEqual(self.get_participations(), 1)
+
+    def test_export_streams_from_replica(self):
+        url = reverse("surveys_api:formexport", kwargs={"pk": self.survey.pk})
+        response = self.client.get(url, {"output": "ndjson"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 1)
+
+    def test_owner_reads_own_writes(self):
+        url = reverse("surveys_api:formdetail", kwargs={"pk": self.survey.pk})
+        response = self.client.patch(url, {"title": "Renamed"}, content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get_participations(), 2)
+
+
+class FormCreateTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.client.force_login(self.creator)
+        self.url = reverse("surveys_api:formcreate")
+
+    def document(self, sections=2, questions=3):
+        return {
+            "title": "Imported",
+            "sections": [
+                {
+                    "name": f"Section {s}",
+                    "questions": [
+                        {
+                            "temp_id": f"q{s}-{q}",
+                            "question": f"Question {q}",
+                            "question_type": "MCS",
+                            "answer_options": [
+                                {"temp_id": f"o{s}-{q}-{a}", "text": f"Option {a}"}
+                                for a in range(2)
+                            ],
+                        }
+                        for q in range(questions)
+                    ],
+                }
+                for s in range(sections)
+            ],
+        }
+
+    def create(self, document):
+        return self.client.post(self.url, document, content_type="application/json")
+
+    def test_creates_tree_in_document_order(self):
+        response = self.create(self.document())
+        self.assertEqual(response.status_code, 201, response.content)
+        survey = Survey.objects.get()
+        self.assertEqual(survey.creator, self.creator)
+        detail_url = reverse("surveys_api:formdetail", kwargs={"pk": survey.pk})
+        self.assertEqual(self.client.get(detail_url).json(), response.json())
+        sections = response.json()["sections"]
+        self.assertEqual([s["name"] for s in sections], ["Section 0", "Section 1"])
+        self.assertEqual(
+            [q["question"] for q in sections[1]["questions"]],
+            ["Question 0", "Question 1", "Question 2"],
+        )
+        orders = (
+            Question.objects.filter(section__name="Section 1")
+            .order_by("order")
+            .values_list("order", flat=True)
+        )
+        self.assertEqual(list(orders), [1, 2, 3])
+
+    @override_settings(SURVEYS_SPARSE_ORDERING=True, SURVEYS_ORDER_GAP=100)
+    def test_sparse_orders(self):
+        self.assertEqual(self.create(self.document(sections=1)).status_code, 201)
+        self.assertEqual(
+            list(Question.objects.order_by("order").values_list("order", flat=True)),
+            [100, 200, 300],
+        )
+
+    def test_dependencies_use_temp_ids(self):
+        document = self.document(sections=1)
+        # depends on an option of a later question, and on a question without options
+        document["sections"][0]["questions"][0]["dependency_answer_option"] = "o0-2-1"
+        document["sections"][0]["questions"][1]["dependency_question"] = "q0-0"
+        self.assertEqual(self.create(document).status_code, 201)
+        first = Question.objects.get(question="Question 0")
+        second = Question.objects.get(question="Question 1")
+        self.assertEqual(first.dependency_answer_option.text, "Option 1")
+        self.assertEqual(first.dependency_answer_option.question.question, "Question 2")
+        self.assertEqual(second.dependency_question, first)
+
+    def test_query_count_does_not_depend_on_size(self):
+        counts = []
+        # small enough that no level needs more than one INSERT on SQLite
+        for questions in (1, 20):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.create(self.document(questions=questions))
+                self.assertEqual(response.status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(Question.objects.count(), 42)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_dependencies(self):
+        cases = [
+            ("dependency_question", "missing", "Unknown dependency_question"),
+            ("dependency_answer_option", "missing", "Unknown dependency_answer_option"),
+        ]
+        for field, value, error in cases:
+            document = self.document(sections=1)
+            document["sections"][0]["questions"][0][field] = value
+            response = self.create(document)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(error, response.json()["sections"][0])
+
+        document = self.document(sections=1)
+        question = document["sections"][0]["questions"][0]
+        question["dependency_question"] = "q0-1"
+        question["dependency_answer_option"] = "o0-2-0"
+        self.assertEqual(self.create(document).status_code, 400)
+
+        document = self.document(sections=1)
+        document["sections"][0]["questions"][1]["temp_id"] = "q0-0"
+        self.assertEqual(self.create(document).status_code, 400)
+        self.assertFalse(Survey.objects.exists())
+
+    def test_dependency_cycle(self):
+        document = self.document(sections=1)
+        questions = document["sections"][0]["questions"]
+        questions[0]["dependency_answer_option"] = "o0-1-0"
+        questions[1]["dependency_answer_option"] = "o0-0-0"
+        response = self.create(document)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cycle", response.json()["sections"][0])
+
+    def test_anonymous_cannot_create(self):
+        self.client.logout()
+        self.assertEqual(self.create(self.document()).status_code, 401)
+
+
+class FormCloneTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.client.force_login(self.creator)
+
+    def clone(self, survey, data=None):
+        url = reverse("surveys_api:formclone", kwargs={"pk": survey.pk})
+        return self.client.post(url, data or {}, content_type="application/json")
+
+    def add_dependency(self, survey):
+        questions = Question.objects.filter(section__survey=survey)
+        first, second = questions.order_by("section__order", "order")[:2]
+        second.dependency_question = first
+        second.dependency_answer_option = first.answer_options.last()
+        second.save()
+        return second
+
+    def test_copies_tree_with_remapped_dependencies(self):
+        survey = create_survey_tree(self.creator, sections=2, questions=2)
+        dependent = self.add_dependency(survey)
+        response = self.clone(survey)
+        self.assertEqual(response.status_code, 201, response.content)
+        copy = Survey.objects.exclude(pk=survey.pk).get()
+        self.assertEqual(copy.title, "Copy of Test Survey")
+        self.assertEqual(response.json()["id"], str(copy.pk))
+
+        original_url = reverse("surveys_api:formdetail", kwargs={"pk": survey.pk})
+        original_tree = self.client.get(original_url).json()
+
+        def question_texts(tree):
+            return [[q["question"] for q in s["questions"]] for s in tree["sections"]]
+
+        self.assertEqual(question_texts(response.json()), question_texts(original_tree))
+        copied = Question.objects.get(
+            section__survey=copy, question=dependent.question, section__name="Section 0"
+        )
+        dependency_question = copied.dependency_question
+        dependency_answer_option = copied.dependency_answer_option
+        self.assertEqual(dependency_question.section.survey, copy)
+        self.assertEqual(
+            dependency_question.question, dependent.dependency_question.question
+        )
+        self.assertEqual(dependency_answer_option.question, dependency_question)
+        self.assertEqual(
+            dependency_answer_option.text, dependent.dependency_answer_option.text
+        )
+
+        # the copy is independent of the original
+        copy.sections.all().delete()
+        self.assertEqual(SurveySection.objects.filter(survey=survey).count(), 2)
+
+    def test_query_count_is_constant(self):
+        def query_count(sections, questions):
+            survey = create_survey_tree(
+                self.creator, sections=sections, questions=questions
+            )
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.clone(survey).status_code, 201)
+            return len(queries)
+
+        self.assertEqual(query_count(1, 1), query_count(3, 5))
+
+    def test_model_clone_keeps_creator_and_overrides(self):
+        survey = create_survey_tree(self.creator)
+        copy = survey.clone(title="Template copy", is_active=False)
+        self.assertEqual(copy.creator, self.creator)
+        self.assertEqual(copy.title, "Template copy")
+        self.assertFalse(copy.is_active)
+        self.assertEqual(Question.objects.filter(section__survey=copy).count(), 1)
+
+    def test_only_creator_can_clone_unless_template(self):
+        survey = create_survey_tree(self.creator)
+        other = create_user("other")
+        self.client.force_login(other)
+        self.assertEqual(self.clone(survey).status_code, 403)
+
+        Survey.objects.filter(pk=survey.pk).update(is_template=True)
+        response = self.clone(survey, {"title": "Mine"})
+        self.assertEqual(response.status_code, 201)
+        copy = Survey.objects.get(pk=response.json()["id"])
+        self.assertEqual(
+            (copy.creator, copy.title, copy.is_template), (other, "Mine", False)
+        )
+
+        self.client.logout()
+        self.assertEqual(self.clone(survey).status_code, 401)
+
+    def test_rejects_long_title(self):
+        survey = create_survey_tree(self.creator)
+        self.assertEqual(self.clone(survey, {"title": "x" * 201}).status_code, 400)
+
+
+class FormParticipationsTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.client.force_login(self.creator)
+        self.survey = create_survey_tree(self.creator, questions=2)
+        self.url = reverse(
+            "surveys_api:formparticipations", kwargs={"pk": self.survey.pk}
+        )
+        self.start = timezone.now() - timedelta(days=1)
+
+    def create_participations(self, count):
+        participations = SurveyParticipation.objects.bulk_create(
+            SurveyParticipation(
+                survey=self.survey, user_session=f"session{i}", is_complete=i % 3 != 0
+            )
+            for i in range(count)
+        )
+        # pairs of participations share a timestamp, so that ties are broken by id
+        for i, participation in enumerate(participations):
+            participation.last_interaction = self.start + timedelta(minutes=i // 2)
+        SurveyParticipation.objects.bulk_update(participations, ["last_interaction"])
+        return sorted(participations, key=lambda p: (p.last_interaction, str(p.pk)))
+
+    def page_through(self, params):
+        ids, url = [], self.url
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids.extend(row["id"] for row in response.json()["results"])
+            url, params = response.json()["next"], None
+        return ids
+
+    def test_pages_through_all_in_order(self):
+        ids = [str(p.pk) for p in self.create_participations(11)]
+        self.assertEqual(self.page_through({"page_size": 3}), ids)
+        self.assertEqual(self.page_through({"page_size": 11}), ids)
+
+    def test_filters(self):
+        participations = self.create_participations(12)
+        complete = [str(p.pk) for p in participations if p.is_complete]
+        self.assertEqual(
+            self.page_through({"page_size": 2, "is_complete": "true"}), complete
+        )
+        since = (self.start + timedelta(minutes=2)).isoformat()
+        until = (self.start + timedelta(minutes=3)).isoformat()
+        self.assertEqual(
+            self.page_through({"page_size": 1, "since": since, "until": until}),
+            [str(p.pk) for p in participations[4:8]],
+        )
+
+    def test_deep_pages_cost_the_same(self):
+        self.create_participations(20)
+
+        def get(url, params=None):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            return response.json()["next"], queries
+
+        url, first = get(self.url, {"page_size": 2, "answers": "1"})
+        for _ in range(7):
+            url, deep = get(url)
+        self.assertEqual(len(deep), len(first))
+        self.assertFalse(
+            any("OFFSET" in query["sql"] for query in deep.captured_queries)
+        )
+
+    def test_includes_answers(self):
+        questions = list(
+            Question.objects.filter(section__survey=self.survey).order_by("order")
+        )
+        option = questions[0].answer_options.first()
+        participation = self.create_participations(1)[0]
+        ChoiceAnswer.objects.create(
+            survey_participation=participation,
+            question=questions[0],
+            answer_option=option,
+        )
+        Answer.objects.create(
+            survey_participation=participation, question=questions[1], answer_text="Hi"
+        )
+
+        row = self.client.get(self.url, {"answers": "true"}).json()["results"][0]
+        self.assertEqual(
+            row["answers"],
+            [
+                {"question": str(questions[0].pk), "answer_option": str(option.pk)},
+                {"question": str(questions[1].pk), "answer_text": "Hi"},
+            ],
+        )
+        self.assertNotIn("answers", self.client.get(self.url).json()["results"][0])
+
+    def test_rejects_bad_parameters_and_other_users(self):
+        self.assertEqual(self.client.get(self.url, {"cursor": "nope"}).status_code, 400)
+        cursor = base64.urlsafe_b64encode(
+            json.dumps([timezone.now().isoformat(), "not-a-uuid"]).encode()
+        ).decode()
+        self.assertEqual(self.client.get(self.url, {"cursor": cursor}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"page_size": 501}).status_code, 400)
+        self.client.force_login(create_user("other"))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class FormAnalyticsTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.client.force_login(self.creator)
+        self.survey = create_survey_tree(self.creator, questions=3, answer_options=3)
+        self.questions = list(
+            Question.objects.filter(section__survey=self.survey).order_by("order")
+        )
+        self.options = [
+            list(q.answer_options.order_by("order")) for q in self.questions
+        ]
+        Question.objects.filter(pk=self.questions[2].pk).update(
+            question_type=Question.QuestionType.MULTIPLE_CHOICE_MULTI
+        )
+        # picks of questions 0 and 1, and the options picked on multi choice question 2
+        self.picks = [
+            (0, 0, [0]),
+            (0, 1, [0, 1]),
+            (0, 1, []),
+            (1, 1, [2]),
+            (2, 0, [0, 2]),
+            (0, 1, [1]),
+        ]
+        participations = SurveyParticipation.objects.bulk_create(
+            SurveyParticipation(
+                survey=self.survey, user_session=f"session{i}", is_complete=i % 2 == 0
+            )
+            for i in range(len(self.picks))
+        )
+        ChoiceAnswer.objects.bulk_create(
+            ChoiceAnswer(
+                survey_participation=participation,
+                question=self.questions[q],
+                answer_option=self.options[q][a],
+            )
+            for participation, (first, second, multi) in zip(participations, self.picks)
+            for q, a in [(0, first), (1, second), *((2, m) for m in multi)]
+        )
+        kwargs = {"pk": self.survey.pk}
+        self.results_url = reverse("surveys_api:formresults", kwargs=kwargs)
+        self.crosstab_url = reverse("surveys_api:formcrosstab", kwargs=kwargs)
+
+    def structure_changed(self):
+        """
+        Called after a test changes the survey's structure
+        """
+
+    def crosstab(self, rows, columns, options=()):
+        response = self.client.get(
+            self.crosstab_url,
+            {
+                "rows": self.questions[rows].pk,
+                "columns": self.questions[columns].pk,
+                "option": list(options),
+            },
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_crosstab(self):
+        result = self.crosstab(0, 1)
+        self.assertEqual(result["rows"]["id"], str(self.questions[0].pk))
+        self.assertEqual(
+            [o["text"] for o in result["columns"]["answer_options"]],
+            ["Option 0", "Option 1", "Option 2"],
+        )
+        self.assertEqual(result["counts"], [[1, 3, 0], [0, 1, 0], [1, 0, 0]])
+        # multiple answers count once per picked option
+        self.assertEqual(
+            self.crosstab(2, 1)["counts"], [[2, 1, 0], [0, 2, 0], [1, 1, 0]]
+        )
+
+    def test_crosstab_with_filter(self):
+        result = self.crosstab(0, 1, [self.options[2][0].pk])
+        self.assertEqual(result["counts"], [[1, 1, 0], [0, 0, 0], [1, 0, 0]])
+        result = self.crosstab(0, 1, [self.options[2][0].pk, self.options[2][1].pk])
+        self.assertEqual(result["counts"], [[0, 1, 0], [0, 0, 0], [0, 0, 0]])
+
+    def test_filtered_results(self):
+        response = self.client.get(self.results_url, {"option": self.options[1][1].pk})
+        self.assertEqual(response.status_code, 200, response.content)
+        results = response.json()
+        self.assertEqual((results["participations"], results["completed"]), (4, 1))
+        self.assertEqual(
+            [[o["count"] for o in q["answer_options"]] for q in results["questions"]],
+            [[3, 1, 0], [0, 4, 0], [1, 2, 1]],
+        )
+        self.assertEqual([q["responses"] for q in results["questions"]], [4, 4, 3])
+
+    def test_filter_by_option_of_text_question(self):
+        text_question = Question.objects.create(
+            section=self.questions[0].section,
+            question="Why?",
+            question_type=Question.QuestionType.TEXT_RESPONSE,
+        )
+        option = AnswerOption.objects.create(question=text_question, text="Unused")
+        self.structure_changed()
+        response = self.client.get(self.results_url, {"option": option.pk})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["participations"], 0)
+        self.assertEqual(self.crosstab(0, 1, [option.pk])["counts"], [[0, 0, 0]] * 3)
+
+    def test_query_count_does_not_depend_on_filters(self):
+        def query_count(options):
+            with CaptureQueriesContext(connection) as queries:
+                self.crosstab(0, 2, options)
+            return len(queries)
+
+        self.assertEqual(query_count([]), query_count([o[0].pk for o in self.options]))
+
+    def test_rejects_unknown_and_text_questions(self):
+        text_question = Question.objects.filter(pk=self.questions[1].pk)
+        text_question.update(question_type=Question.QuestionType.TEXT_RESPONSE)
+        other = create_survey_tree(self.creator)
+        other_option = AnswerOption.objects.filter(
+            question__section__survey=other
+        ).first()
+        rows = self.questions[0].pk
+        for params in (
+            {"rows": rows},
+            {"rows": rows, "columns": self.questions[1].pk},
+            {"rows": rows, "columns": other_option.question_id},
+            {"rows": rows, "columns": self.questions[2].pk, "option": other_option.pk},
+        ):
+            response = self.client.get(self.crosstab_url, params)
+            self.assertEqual(response.status_code, 400, params)
+        response = self.client.get(self.results_url, {"option": "nope"})
+        self.assertEqual(response.status_code, 400)
+        self.client.force_login(create_user("other"))
+        self.assertEqual(self.client.get(self.crosstab_url).status_code, 403)
+
+
+@skipUnless(find_spec("numpy"), "numpy is not installed")
+class SnapshotTest(FormAnalyticsTest):
+    """
+    Runs the analytics tests against a snapshot of the closed survey
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SURVEYS_SNAPSHOT_DIR=Path(directory.name))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        Survey.objects.filter(pk=self.survey.pk).update(
+            is_active=False,
+            is_open=False,
+            survey_end_date=timezone.now() - timedelta(days=1),
+        )
+        call_command("snapshot_surveys", stdout=StringIO())
+        self.assertIsNotNone(self.load())
+
+    def load(self):
+        return load_snapshot(Survey.objects.get(pk=self.survey.pk))
+
+    def structure_changed(self):
+        call_command("snapshot_surveys", stdout=StringIO())
+        self.assertIsNotNone(self.load())
+
+    def test_results_match_the_database_without_reading_answers(self):
+        survey = Survey.objects.with_tree().get(pk=self.survey.pk)
+        expected = analytics.filtered_results(survey)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.results_url)
+        self.assertEqual(response.json(), json.loads(json.dumps(expected, default=str)))
+        self.assertFalse(
+            any("choiceanswer" in query["sql"] for query in queries.captured_queries)
+        )
+
+    def test_text_questions(self):
+        text_question = Question.objects.create(
+            section=self.questions[0].section,
+            question="Why?",
+            question_type=Question.QuestionType.TEXT_RESPONSE,
+        )
+        participation = (
+            SurveyParticipation.objects.filter(survey=self.survey).order_by("pk").last()
+        )
+        Answer.objects.create(
+            survey_participation=participation,
+            question=text_question,
+            answer_text="Because",
+        )
+        # adding the question changed the survey, so the old snapshot is ignored
+        self.assertIsNone(self.load())
+        call_command("snapshot_surveys", stdout=StringIO())
+        results = self.client.get(self.results_url).json()
+        self.assertEqual(results["questions"][-1]["responses"], 1)
+        texts = json.loads((snapshot_path(self.survey) / "texts.json").read_text())
+        self.assertEqual(
+            texts, [[len(self.picks) - 1, str(text_question.pk), "Because"]]
+        )
+
+    def test_responses_written_after_the_snapshot(self):
+        QueuedSubmission.objects.create(
+            idempotency_key="late",
+            survey=self.survey,
+            user_session="late",
+            answers=[
+                {
+                    "question": str(question.pk),
+                    "answer_option": str(options[0].pk),
+                    "answer_text": "",
+                }
+                for question, options in zip(self.questions, self.options)
+            ],
+        )
+        call_command("drain_submissions", stdout=StringIO())
+        # the snapshot is ignored, so the late response is counted
+        self.assertIsNone(self.load())
+        self.assertEqual(self.crosstab(0, 1)["counts"][0], [2, 3, 0])
+
+    def test_only_closed_surveys(self):
+        Survey.objects.filter(pk=self.survey.pk).update(
+            survey_end_date=timezone.now() + timedelta(days=1)
+        )
+        self.assertIsNone(self.load())
+        out = StringIO()
+        call_command("snapshot_surveys", "--force", stdout=out)
+        self.assertIn("Wrote 0 snapshot(s)", out.getvalue())
+
+
+class ResponseRatesTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.survey = create_survey_tree(self.creator)
+        self.question = Question.objects.get(section__survey=self.survey)
+        self.url = reverse(
+            "surveys_api:formresponserates", kwargs={"pk": self.survey.pk}
+        )
+
+    def submit(self, is_complete=True, client=None):
+        option = self.question.answer_options.first()
+        payload = {
+            "is_complete": is_complete,
+            "answers": [
+                {"question": str(self.question.id), "answer_option": str(option.id)}
+            ],
+        }
+        response = (client or self.client).post(
+            reverse("surveys_api:formsubmit", kwargs={"pk": self.survey.pk}),
+            payload,
+            content_type="application/json",
+        )
+        self.assertIn(response.status_code, (201, 202), response.content)
+
+    def buckets(self):
+        return list(
+            ResponseRateBucket.objects.order_by("start").values_list(
+                "granularity", "start", "started", "completed"
+            )
+        )
+
+    def add_bucket(self, granularity, start, started, completed=0):
+        ResponseRateBucket.objects.create(
+            survey=self.survey,
+            granularity=granularity,
+            start=start,
+            started=started,
+            completed=completed,
+        )
+
+    def test_submissions_are_counted_per_minute(self):
+        respondent = create_user("respondent")
+        self.client.force_login(respondent)
+        self.submit(is_complete=False)
+        self.submit(is_complete=True)
+        self.client.logout()
+        self.submit()
+        [(granularity, start, started, completed)] = self.buckets()
+        self.assertEqual((granularity, started, completed), ("minute", 2, 2))
+        self.assertEqual((start.second, start.microsecond), (0, 0))
+
+    @override_settings(SURVEYS_INGESTION_QUEUE=True)
+    def test_queued_submissions_are_counted_when_written(self):
+        self.submit()
+        self.submit(is_complete=False, client=self.client_class())
+        self.assertEqual(self.buckets(), [])
+        call_command("drain_submissions", stdout=StringIO())
+        self.assertEqual([bucket[2:] for bucket in self.buckets()], [(2, 1)])
+
+    def test_compaction(self):
+        now = timezone.now().replace(minute=30, second=0, microsecond=0)
+        two_days_ago = now - timedelta(days=2)
+        self.add_bucket("minute", two_days_ago, 1, 1)
+        self.add_bucket("minute", two_days_ago + timedelta(minutes=5), 2)
+        self.add_bucket("minute", now - timedelta(minutes=1), 3, 3)
+        forty_days_ago = (now - timedelta(days=40)).replace(minute=0)
+        self.add_bucket("hour", forty_days_ago.replace(hour=1), 4, 1)
+        self.add_bucket("hour", forty_days_ago.replace(hour=5), 5, 2)
+
+        self.assertEqual(compact_response_rates(now=now), 4)
+        self.assertEqual(
+            self.buckets(),
+            [
+                ("day", forty_days_ago.replace(hour=0), 9, 3),
+                ("hour", two_days_ago.replace(minute=0), 3, 1),
+                ("minute", now - timedelta(minutes=1), 3, 3),
+            ],
+        )
+        self.assertEqual(compact_response_rates(now=now), 0)
+
+    def test_chart(self):
+        now = timezone.now().replace(minute=30, second=0, microsecond=0)
+        self.add_bucket("minute", now, 1, 1)
+        self.add_bucket("minute", now + timedelta(minutes=1), 2, 1)
+        self.add_bucket("hour", now.replace(minute=0) - timedelta(hours=3), 4, 2)
+        self.client.force_login(self.creator)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["granularity"], "hour")
+        self.assertEqual(
+            [(b["started"], b["completed"]) for b in response.json()["buckets"]],
+            [(4, 2), (3, 2)],
+        )
+        response = self.client.get(
+            self.url, {"granularity": "minute", "since": now.isoformat()}
+        )
+        self.assertEqual([b["started"] for b in response.json()["buckets"]], [1, 2])
+        response = self.client.get(self.url, {"granularity": "day"})
+        self.assertEqual([b["started"] for b in response.json()["buckets"]], [7])
+
+        response = self.client.get(self.url, {"granularity": "week"})
+        self.assertEqual(response.status_code, 400)
+        self.client.force_login(create_user("other"))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class SchedulingTest(TestCase):
+    def setUp(self):
+        self.creator = create_user()
+        self.survey = create_survey_tree(self.creator)
+        self.now = timezone.now()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SURVEYS_SNAPSHOT_DIR=Path(directory.name))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def schedule(self, now):
+        opened = open_due_surveys(now)
+        closed = close_due_surveys(now)
+        return [survey.pk for survey in opened], [survey.pk for survey in closed]
+
+    def submit(self):
+        question = Question.objects.get(section__survey=self.survey)
+        option = question.answer_options.first()
+        payload = {
+            "answers": [{"question": str(question.id), "answer_option": str(option.id)}]
+        }
+        url = reverse("surveys_api:formsubmit", kwargs={"pk": self.survey.pk})
+        return self.client_class().post(url, payload, content_type="application/json")
+
+    def test_save_computes_is_open(self):
+        self.assertTrue(self.survey.is_open)
+        self.survey.survey_start_date = self.now + timedelta(hours=1)
+        self.survey.save(update_fields=["survey_start_date"])
+        self.assertFalse(Survey.objects.get(pk=self.survey.pk).is_open)
+        self.survey.survey_start_date = self.now
+        self.survey.is_active = False
+        self.survey.save()
+        self.assertFalse(Survey.objects.get(pk=self.survey.pk).is_open)
+
+    def test_submissions_only_check_the_flag(self):
+        Survey.objects.filter(pk=self.survey.pk).update(is_open=False)
+        self.assertEqual(self.submit().status_code, 403)
+        # past its end date, but not closed by the scheduler yet
+        Survey.objects.filter(pk=self.survey.pk).update(
+            is_open=True, survey_end_date=self.now - timedelta(seconds=1)
+        )
+        self.assertEqual(self.submit().status_code, 201)
+
+    def test_opens_due_surveys_and_warms_cache(self):
+        self.survey.survey_start_date = self.now + timedelta(hours=1)
+        self.survey.survey_end_date = self.now + timedelta(hours=2)
+        self.survey.save()
+        inactive = create_survey_tree(self.creator)
+        inactive.is_active = False
+        inactive.save()
+        ended = create_survey_tree(self.creator)
+        Survey.objects.filter(pk=ended.pk).update(
+            is_open=False, survey_end_date=self.now
+        )
+        cache.clear()
+
+        self.assertEqual(self.schedule(self.now + timedelta(minutes=30)), ([], []))
+        self.assertEqual(
+            self.schedule(self.now + timedelta(minutes=90)), ([self.survey.pk], [])
+        )
+        survey = Survey.objects.get(pk=self.survey.pk)
+        self.assertTrue(survey.is_open)
+        self.assertEqual(survey.version, self.survey.version + 1)
+        for kind in ("tree", "schema", "dependency_graph"):
+            key = survey_cache_key(kind, survey.pk, survey.version)
+            self.assertIsNotNone(cache.get(key), kind)
+        tree = cache.get(survey_cache_key("tree", survey.pk, survey.version))
+        self.assertTrue(tree["is_open"])
+        self.assertFalse(Survey.objects.get(pk=inactive.pk).is_open)
+        self.assertFalse(Survey.objects.get(pk=ended.pk).is_open)
+
+    def test_closes_ended_surveys(self):
+        self.survey.survey_end_date = self.now + timedelta(hours=1)
+        self.survey.save()
+        self.assertEqual(self.submit().status_code, 201)
+        self.assertEqual(self.schedule(self.now + timedelta(minutes=30)), ([], []))
+        self.assertEqual(
+            self.schedule(self.now + timedelta(minutes=90)), ([], [self.survey.pk])
+        )
+        self.assertFalse(Survey.objects.get(pk=self.survey.pk).is_open)
+        self.assertEqual(self.submit().status_code, 403)
+
+    @skipUnless(find_spec("numpy"), "numpy is not installed")
+    def test_closing_writes_snapshot(self):
+        self.assertEqual(self.submit().status_code, 201)
+        Survey.objects.filter(pk=self.survey.pk).update(
+            survey_end_date=self.now - timedelta(seconds=1)
+        )
+        out = StringIO()
+        call_command("schedule_surveys", stdout=out)
+        self.assertIn("Opened 0 survey(s), closed 1", out.getvalue())
+        snapshot = load_snapshot(Survey.objects.get(pk=self.survey.pk))
+        self.assertIsNotNone(snapshot)
+        self.assertEqual(len(snapshot.complete), 1)
+
+    @skipUnless(find_spec("numpy"), "numpy is not installed")
+    @override_settings(SURVEYS_INGESTION_QUEUE=True)
+    def test_snapshot_waits_for_queued_submissions(self):
+        self.assertEqual(self.submit().status_code, 202)
+        Survey.objects.filter(pk=self.survey.pk).update(
+            survey_end_date=self.now - timedelta(seconds=1)
+        )
+        self.assertEqual(self.schedule(self.now), ([], [self.survey.pk]))
+        self.assertIsNone(load_snapshot(Survey.objects.get(pk=self.survey.pk)))
+        out = StringIO()
+        call_command("snapshot_surveys", stdout=out)
+        self.assertIn("Wrote 0 snapshot(s)", out.getvalue())
+        call_command("drain_submissions", stdout=StringIO())
+        call_command("snapshot_surveys", stdout=out)
+        snapshot = load_snapshot(Survey.objects.get(pk=self.survey.pk))
+        self.assertEqual(len(snapshot.complete), 1)
+
+    @skipUnless(find_spec("numpy"), "numpy is not installed")
+    def test_ended_surveys_are_snapshotted_once_closed(self):
+        # past its end date, but still taking responses until the scheduler closes it
+        Survey.objects.filter(pk=self.survey.pk).update(
+            survey_end_date=self.now - timedelta(seconds=1)
+        )
+        out = StringIO()
+        call_command("snapshot_surveys", stdout=out)
+        self.assertIn("Wrote 0 snapshot(s)", out.getvalue())
+        self.assertIsNone(load_snapshot(Survey.objects.get(pk=self.survey.pk)))
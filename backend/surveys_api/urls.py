@@ -1,8 +1,30 @@
 from django.urls import path
-from .views import FormDetail
+from . import async_views
+from .views import (
+    FormClone,
+    FormCreate,
+    FormCrosstab,
+    FormDetail,
+    FormExport,
+    FormParticipations,
+    FormResponseRates,
+    FormResults,
+    FormSubmit,
+)
 
 app_name = "surveys_api"
 
 urlpatterns = [
-    path('form/<int:pk>/', FormDetail.as_view(), name="formdetail"),
-]
\ No newline at end of file
+    path('form/', FormCreate.as_view(), name="formcreate"),
+    path('form/<uuid:pk>/', FormDetail.as_view(), name="formdetail"),
+    path('form/<uuid:pk>/submit/', FormSubmit.as_view(), name="formsubmit"),
+    path('form/<uuid:pk>/clone/', FormClone.as_view(), name="formclone"),
+    path('form/<uuid:pk>/results/', FormResults.as_view(), name="formresults"),
+    path('form/<uuid:pk>/crosstab/', FormCrosstab.as_view(), name="formcrosstab"),
+    path('form/<uuid:pk>/response-rates/', FormResponseRates.as_view(), name="formresponserates"),
+    path('form/<uuid:pk>/participations/', FormParticipations.as_view(), name="formparticipations"),
+    path('form/<uuid:pk>/export/', FormExport.as_view(), name="formexport"),
+    # async versions of the respondent endpoints, for ASGI deployments
+    path('async/form/<uuid:pk>/', async_views.form_detail, name="formdetail_async"),
+    path('async/form/<uuid:pk>/submit/', async_views.form_submit, name="formsubmit_async"),
+]
@@ -1,11 +1,38 @@
-from django.shortcuts import render
-from rest_framework import generics
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 
-# from forms.models import Form
+from surveys.cache import get_survey_schema, get_survey_tree
+from surveys import analytics, ingestion
+from surveys.counters import survey_results
+from surveys.export import EXPORT_FORMATS
+from surveys.listing import participation_page
+from surveys.logic import DependencyCycleError
+from surveys.models import Survey
+from surveys.rates import response_rates
+from surveys.replicas import iter_on_replica, replica_reads
+from surveys.serializers import (
+    CrosstabQuerySerializer,
+    ParticipationListQuerySerializer,
+    ParticipationSerializer,
+    ParticipationWithAnswersSerializer,
+    ResponseRatesQuerySerializer,
+    ResultsQuerySerializer,
+    SubmissionSerializer,
+    SurveyDocumentSerializer,
+    SurveySerializer,
+)
+from surveys.snapshots import load_snapshot
+from surveys.submissions import submit_participation
 from rest_framework.permissions import (
     SAFE_METHODS,
     BasePermission,
     IsAdminUser,
+    IsAuthenticated,
     DjangoModelPermissionsOrAnonReadOnly,
 )
 
@@ -19,8 +46,340 @@ class FormUserWritePermission(BasePermission):
         if request.method in SAFE_METHODS:  # GET, OPTIONS, HEAD
             return True
 
-        return obj.author == request.user
+        return obj.creator == request.user
+
+
+class FormClonePermission(BasePermission):
+    """Forms can only be cloned by their author, unless they are templates"""
+
+    message = "Cloning forms is restricted to the author, except for templates."
+
+    def has_object_permission(self, request, view, obj):
+        return obj.is_template or obj.creator == request.user
+
+
+class FormCreatorPermission(BasePermission):
+    """Results of a form can only be seen by its author"""
+
+    message = "Viewing results is restricted to the author only."
+
+    def has_object_permission(self, request, view, obj):
+        return obj.creator == request.user
+
+
+def get_survey_validators(survey):
+    """
+    Returns the ETag and Last-Modified timestamp of a Survey's current version
+    """
+    return quote_etag(f"{survey.pk}-{survey.version}"), int(survey.modified.timestamp())
+
+
+def add_survey_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    # caches may keep the survey, but have to revalidate it on every use
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def get_respondent(request):
+    """
+    Returns the (user, session_key) pair a submission is recorded under
+    Anonymous respondents are identified by their session, which is created if needed
+    """
+    if request.user.is_authenticated:
+        return request.user, None
+    if not request.session.session_key:
+        request.session.save()
+    return None, request.session.session_key
+
+
+def get_idempotency_key(request):
+    key = request.headers.get("Idempotency-Key")
+    if key is not None and not 0 < len(key) <= 100:
+        raise ValidationError({"Idempotency-Key": "Must be 1 to 100 characters long."})
+    return key
+
+
+def get_submission_schema(survey):
+    """
+    Returns the `SurveySchema` submissions to a Survey are validated against
+    A Survey whose conditional logic has a cycle (which saving its questions and answer
+    options rejects) takes no submissions until it is fixed
+    """
+    try:
+        return get_survey_schema(survey)
+    except DependencyCycleError as exc:
+        raise ValidationError({"non_field_errors": exc.messages})
+
+
+def save_submission(request, survey, data):
+    """
+    Writes validated submission data, or queues it if SURVEYS_INGESTION_QUEUE is on
+    Returns the response body and status
+    """
+    user, session_key = get_respondent(request)
+    if ingestion.is_enabled():
+        try:
+            key = ingestion.enqueue_submission(
+                survey,
+                data["answers"],
+                user=user,
+                session_key=session_key,
+                is_complete=data["is_complete"],
+                idempotency_key=get_idempotency_key(request),
+            )
+        except ingestion.IdempotencyKeyReused as exc:
+            return {"detail": str(exc)}, status.HTTP_409_CONFLICT
+        return {"id": key, "status": "queued"}, status.HTTP_202_ACCEPTED
+    participation = submit_participation(
+        survey,
+        data["answers"],
+        user=user,
+        session_key=session_key,
+        is_complete=data["is_complete"],
+    )
+    return (
+        {"id": participation.id, "is_complete": participation.is_complete},
+        status.HTTP_201_CREATED,
+    )
+
+
+class FormCreate(generics.CreateAPIView):
+    """
+    Creates a Survey with all of its sections, questions and answer options from one
+    nested document (see `SurveyDocumentSerializer`), with one insert per level
+    Returns the created Survey like `FormDetail` does
+    """
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = SurveyDocumentSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        survey = serializer.save(creator=request.user)
+        return Response(get_survey_tree(survey), status=status.HTTP_201_CREATED)
 
 
 class FormDetail(generics.RetrieveUpdateDestroyAPIView):
-    pass
+    """
+    Returns a Survey with all of its sections, questions and answer options
+    The tree comes from the versioned survey cache, and is otherwise loaded with a
+    fixed number of queries (see `SurveyQuerySet.with_tree`)
+    GET requests are conditional: ETag and Last-Modified come from the Survey's version,
+    so an unchanged survey gets a 304 without its tree being loaded or serialized
+    """
+
+    permission_classes = [FormUserWritePermission]
+    serializer_class = SurveySerializer
+
+    def get_queryset(self):
+        if self.request.method == "GET":
+            return Survey.objects.all()
+        return Survey.objects.with_tree()
+
+    def retrieve(self, request, *args, **kwargs):
+        survey = self.get_object()
+        etag, last_modified = get_survey_validators(survey)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(get_survey_tree(survey))
+        return add_survey_validators(response, etag, last_modified)
+
+
+class FormClone(generics.GenericAPIView):
+    """
+    Copies a Survey with all of its sections, questions and answer options for the
+    requesting user, in a fixed number of queries (see `Survey.clone`)
+    The copy is titled "Copy of ..." unless a `title` is posted, and is never a template
+    Returns the copy like `FormDetail` does
+    """
+
+    permission_classes = [IsAuthenticated, FormClonePermission]
+    queryset = Survey.objects.all()
+
+    def post(self, request, pk):
+        survey = self.get_object()
+        title = request.data.get("title") or f"Copy of {survey.title}"
+        max_length = Survey._meta.get_field("title").max_length
+        if not isinstance(title, str) or len(title) > max_length:
+            raise ValidationError(
+                {"title": f"Must be a string of at most {max_length} characters."}
+            )
+        copy = survey.clone(creator=request.user, title=title, is_template=False)
+        return Response(get_survey_tree(copy), status=status.HTTP_201_CREATED)
+
+
+class FormSubmit(generics.GenericAPIView):
+    """
+    Takes every answer of a respondent's SurveyParticipation in one request,
+    validates them against the Survey and writes them in a single transaction
+    With SURVEYS_INGESTION_QUEUE on, valid submissions are queued instead (202), and
+    an Idempotency-Key header keeps retried requests from being queued twice. Reusing a
+    key for a different submission is a 409
+    """
+
+    serializer_class = SubmissionSerializer
+
+    def post(self, request, pk):
+        survey = get_object_or_404(Survey, pk=pk)
+        context = self.get_serializer_context()
+        context["schema"] = get_submission_schema(survey)
+        serializer = self.get_serializer(data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+
+        data, status_code = save_submission(request, survey, serializer.validated_data)
+        return Response(data, status=status_code)
+
+
+def get_analytics_params(request, survey, serializer_class, questions=()):
+    """
+    Returns the validated analytics query parameters of a request, after checking that
+    its answer options and `questions` parameters belong to the Survey
+    """
+    params = serializer_class(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    data = params.validated_data
+    errors = analytics.check_filters(
+        survey, data["option"], [data[question] for question in questions]
+    )
+    if errors:
+        raise ValidationError({"non_field_errors": errors})
+    return data
+
+
+class FormResults(generics.RetrieveAPIView):
+    """
+    Returns how many people responded to a Survey, and how many picked each answer option
+    Reads the precomputed counters from `surveys.counters` instead of counting Answers,
+    from the read replica if there is one
+    With `option` parameters, only the participations that picked all of those answer
+    options are counted, live from the answers (see `surveys.analytics`)
+    Closed surveys with a snapshot are counted from it instead (see `surveys.snapshots`)
+    """
+
+    permission_classes = [FormCreatorPermission]
+    queryset = Survey.objects.with_tree()
+
+    def retrieve(self, request, *args, **kwargs):
+        with replica_reads(request.user):
+            survey = self.get_object()
+            options = get_analytics_params(request, survey, ResultsQuerySerializer)["option"]
+            snapshot = load_snapshot(survey)
+            if snapshot is not None:
+                return Response(snapshot.results(survey, options))
+            if options:
+                return Response(analytics.filtered_results(survey, options))
+            return Response(survey_results(survey))
+
+
+class FormCrosstab(generics.RetrieveAPIView):
+    """
+    Cross-tabulates two multiple choice questions of a Survey (`rows` and `columns`):
+    how many participations picked each pair of their answer options
+    Takes `option` parameters, and uses snapshots of closed surveys, like `FormResults`
+    """
+
+    permission_classes = [FormCreatorPermission]
+    queryset = Survey.objects.with_tree()
+
+    def retrieve(self, request, *args, **kwargs):
+        with replica_reads(request.user):
+            survey = self.get_object()
+            params = get_analytics_params(
+                request, survey, CrosstabQuerySerializer, questions=("rows", "columns")
+            )
+            snapshot = load_snapshot(survey)
+            args = (params["rows"], params["columns"], params["option"])
+            if snapshot is None:
+                return Response(analytics.crosstab(survey, *args))
+            return Response(snapshot.crosstab(survey, *args))
+
+
+class FormResponseRates(generics.RetrieveAPIView):
+    """
+    Returns how many participations of a Survey were started and completed per minute,
+    hour (default) or day, for a responses over time chart
+    Reads the rollup buckets of `surveys.rates`, from the read replica if there is one.
+    Takes `granularity`, `since` and `until` parameters
+    """
+
+    permission_classes = [FormCreatorPermission]
+    queryset = Survey.objects.all()
+
+    def retrieve(self, request, *args, **kwargs):
+        params = ResponseRatesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        with replica_reads(request.user):
+            survey = self.get_object()
+            buckets = response_rates(survey, **params.validated_data)
+        return Response(
+            {"granularity": params.validated_data["granularity"], "buckets": buckets}
+        )
+
+
+class FormParticipations(generics.RetrieveAPIView):
+    """
+    Lists the SurveyParticipations of a Survey by (last_interaction, id), one keyset
+    page at a time, from the read replica if there is one
+    Takes `cursor` (from the previous page's `next`), `page_size`, `is_complete`,
+    `since`, `until` and `answers` (include every participation's answers) parameters
+    """
+
+    permission_classes = [FormCreatorPermission]
+    queryset = Survey.objects.all()
+
+    def retrieve(self, request, *args, **kwargs):
+        params = ParticipationListQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        options = dict(params.validated_data)
+        cursor = options.pop("cursor", None)
+        include_answers = options.pop("answers")
+        with replica_reads(request.user):
+            survey = self.get_object()
+            participations, next_cursor = participation_page(
+                survey, cursor=cursor, include_answers=include_answers, **options
+            )
+        serializer_class = (
+            ParticipationWithAnswersSerializer if include_answers else ParticipationSerializer
+        )
+        next_url = None
+        if next_cursor is not None:
+            query = request.query_params.copy()
+            query["cursor"] = next_cursor
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+        return Response(
+            {
+                "results": serializer_class(participations, many=True).data,
+                "next": next_url,
+            }
+        )
+
+
+class FormExport(generics.RetrieveAPIView):
+    """
+    Streams every SurveyParticipation of a Survey with its answers, as csv (default)
+    or ndjson (`?output=ndjson`), from the read replica if there is one
+    """
+
+    permission_classes = [FormCreatorPermission]
+    queryset = Survey.objects.all()
+
+    def retrieve(self, request, *args, **kwargs):
+        with replica_reads(request.user):
+            survey = self.get_object()
+        output = request.query_params.get("output", "csv")
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {"output": f"Must be one of {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        rows, content_type = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(
+            iter_on_replica(rows(survey), request.user), content_type=content_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="{survey.pk}.{output}"'
+        return response